@@ -0,0 +1,118 @@
+"""
+Compare the database work done for landmines points on every message: saving the player data after each message (the
+previous implementation of Event2021.on_message) and accruing the points in LANDMINES_POINTS, flushed in batches.
+
+Run from the src directory: python benchmarks/landmines_points.py [database URL]
+The default is an in-memory SQLite database. Pass a postgres:// URL to measure the UPDATE ... FROM (VALUES ...)
+statements that are used in production.
+"""
+import asyncio
+import pathlib
+import random
+import sys
+import time
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from tortoise import Tortoise  # noqa: E402
+
+from utils import models  # noqa: E402
+from utils.landmines_points import LANDMINES_POINTS  # noqa: E402
+
+MESSAGES = 20_000
+MEMBERS = 500
+# Messages received between two flushes, about 5 seconds of a busy landmines event
+FLUSH_EVERY = 1_000
+
+SENTENCES = [
+    "hello there",
+    "did anyone see the last duck that spawned here",
+    "lol",
+    "I think I just stepped on a landmine again, that's the third time today",
+    "gg",
+]
+
+
+async def create_members():
+    db_guild = await models.DiscordGuild.create(discord_id=1, name="Benchmark")
+    db_members = []
+    for i in range(MEMBERS):
+        db_user = await models.DiscordUser.create(
+            discord_id=i + 1, name=f"user-{i}", discriminator="0000"
+        )
+        db_members.append(
+            await models.DiscordMember.create(guild=db_guild, user=db_user)
+        )
+    return db_members
+
+
+async def legacy_on_message(db_member, content):
+    async with models.DB_LOCKS[(models.LandminesUserData, db_member.pk)]:
+        db_target, created = await models.LandminesUserData.get_or_create(
+            member_id=db_member.pk
+        )
+
+    if db_target.add_points_for_message(content):
+        # Don't accrue, that's what we compare to.
+        LANDMINES_POINTS._pending.pop(db_target.pk, None)
+        LANDMINES_POINTS._instances.pop(db_target.pk, None)
+        await db_target.save()
+
+
+async def buffered_on_message(db_member, content):
+    db_target = await models.get_member_landminesdata(db_member)
+    db_target.add_points_for_message(content)
+
+
+async def run(function, messages) -> float:
+    start = time.perf_counter()
+    for i, (db_member, content) in enumerate(messages):
+        await function(db_member, content)
+        if function is buffered_on_message and i % FLUSH_EVERY == FLUSH_EVERY - 1:
+            await LANDMINES_POINTS.flush()
+    await LANDMINES_POINTS.flush()
+    return time.perf_counter() - start
+
+
+async def total_messages() -> int:
+    return sum(
+        await models.LandminesUserData.all().values_list("messages_sent", flat=True)
+    )
+
+
+async def main(db_url: str):
+    await Tortoise.init(db_url=db_url, modules={"models": ["utils.models"]})
+    await Tortoise.generate_schemas()
+
+    try:
+        random.seed(42)
+        db_members = await create_members()
+        messages = [
+            (random.choice(db_members), random.choice(SENTENCES)) for _ in range(MESSAGES)
+        ]
+
+        # Messages with no long enough word don't give points.
+        scored = sum(1 for _, content in messages if models.get_valid_words(content))
+
+        print(f"{MESSAGES} messages from {MEMBERS} members, on {db_url}")
+
+        results = {}
+        for name, function in (
+            ("Save after every message (previous)", legacy_on_message),
+            ("Accrued, batched flushes", buffered_on_message),
+        ):
+            before = await total_messages()
+            results[name] = await run(function, messages)
+            assert await total_messages() - before == scored, "Points were lost"
+
+        for name, duration in results.items():
+            print(
+                f"{name:<36}: {duration:6.2f} s ({MESSAGES / duration:8.0f} messages/s)"
+            )
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "sqlite://:memory:"))
@@ -0,0 +1,123 @@
+"""
+How many log lines per second the event loop can emit, and how long it is blocked meanwhile, with the handlers
+attached to the logger (the previous implementation of init_logger, writing from the event loop), behind the
+logging queue, and with the DEBUG level disabled.
+
+A task logs lines as fast as it can, in bursts, while another one measures how late it wakes up from short sleeps.
+
+Run from the src directory: python benchmarks/logging_throughput.py
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils import logger as logger_module  # noqa: E402
+
+LINES = 100_000
+BURST = 500  # Lines logged between two yields to the event loop
+HEARTBEAT = 0.005
+
+
+class Guild:
+    id = 734810932529856652
+    name = "DuckHunt Support Server"
+
+
+class Channel:
+    id = 851554104710922240
+    name = "ducks-spawning"
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(time.perf_counter() - start - HEARTBEAT)
+
+
+async def emit(fake_logger: logger_module.FakeLogger) -> float:
+    guild, channel = Guild(), Channel()
+    start = time.perf_counter()
+    for i in range(LINES):
+        fake_logger.debug(
+            "Ducks spawning loop : [%d ducks left, %d seconds]", i, i % 60, guild=guild, channel=channel
+        )
+        if i % BURST == 0:
+            await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def run(name: str, base_logger: logging.Logger, drain, level: int = logging.DEBUG):
+    fake_logger = logger_module.FakeLogger(base_logger)
+    fake_logger.set_level(level)
+
+    lags = []
+    stop = asyncio.Event()
+    heartbeat_task = asyncio.create_task(heartbeat(lags, stop))
+
+    duration = await emit(fake_logger)
+    stop.set()
+    await heartbeat_task
+
+    start = time.perf_counter()
+    drain()
+    drain_duration = time.perf_counter() - start
+
+    lags.sort()
+    print(
+        f"{name:<32} {LINES / duration:>10,.0f} lines/s  "
+        f"loop lag p50 {lags[len(lags) // 2] * 1000:>6.2f}ms, max {lags[-1] * 1000:>7.2f}ms  "
+        f"(then {drain_duration:.2f}s to write what was queued)"
+    )
+
+
+def reset_loggers():
+    logger_module.stop_logger()
+    for name in ("matchmaking", "slow_queries", "discord"):
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+
+async def main():
+    # Attached to the logger, like init_logger used to
+    base_logger = logging.getLogger("matchmaking")
+    base_logger.setLevel(logging.DEBUG)
+    for handler in logger_module.make_handlers():
+        base_logger.addHandler(handler)
+    await run("synchronous handlers", base_logger, lambda: None)
+    reset_loggers()
+
+    for json_lines in (False, True):
+        for queue_size in (logger_module.QUEUE_SIZE, LINES):
+            base_logger = logger_module.init_logger(json_lines=json_lines, queue_size=queue_size)
+            await run(
+                f"queue of {queue_size}{', JSON lines' if json_lines else ''}",
+                base_logger,
+                logger_module.stop_logger,
+            )
+            print(f"{'':<32} {logger_module.LOG_QUEUE_HANDLER.dropped:,} lines dropped")
+            reset_loggers()
+
+    # The lines aren't even built
+    base_logger = logger_module.init_logger()
+    await run("queue, DEBUG disabled", base_logger, logger_module.stop_logger, level=logging.INFO)
+    reset_loggers()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        os.chdir(directory)
+        os.mkdir("cache")
+        # The console handlers write to stderr
+        with contextlib.redirect_stderr(devnull):
+            asyncio.run(main())
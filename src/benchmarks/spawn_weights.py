@@ -0,0 +1,147 @@
+"""
+Compare picking the class of the ducks to spawn with random.choices on freshly built weights (the previous
+implementation of get_random_weighted_duck) and with the cached alias samplers.
+
+Run from the src directory: python benchmarks/spawn_weights.py
+"""
+import asyncio
+import pathlib
+import random
+import sys
+import time
+import types
+import typing
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils import ducks  # noqa: E402
+from utils.events import Events  # noqa: E402
+from utils.models import DiscordChannel, SunState  # noqa: E402
+
+SPAWNS = 50_000  # About an hour of spawns on a big shard
+CHANNELS = 2_000
+
+
+async def legacy_get_random_weighted_duck(bot, channel, db_channel, sun):
+    if sun == SunState.DAY:
+        weights = [
+            getattr(db_channel, f"spawn_weight_{category}_ducks", 0)
+            for category in ducks.DUCKS_DAYTIME_CATEGORIES
+        ]
+        ducks_classes = ducks.RANDOM_DAYTIME_SPAWN_DUCKS_CLASSES
+    else:
+        weights = [
+            getattr(db_channel, f"spawn_weight_{category}_ducks", 0)
+            for category in ducks.DUCKS_NIGHTTIME_CATEGORIES
+        ]
+        ducks_classes = ducks.RANDOM_NIGHTTIME_SPAWN_DUCKS_CLASSES
+
+    if bot.current_event == Events.STEROIDS and ducks.SuperDuck in ducks_classes:
+        weights[ducks_classes.index(ducks.SuperDuck)] *= 2
+
+    if sum(weights) <= 0:
+        return ducks.Duck(bot, channel)
+
+    DuckClass = random.choices(ducks_classes, weights)[0]
+    return DuckClass(bot, channel)
+
+
+def legacy_pick(bot, db_channel, sun):
+    if sun == SunState.DAY:
+        categories = ducks.DUCKS_DAYTIME_CATEGORIES
+        ducks_classes = ducks.RANDOM_DAYTIME_SPAWN_DUCKS_CLASSES
+    else:
+        categories = ducks.DUCKS_NIGHTTIME_CATEGORIES
+        ducks_classes = ducks.RANDOM_NIGHTTIME_SPAWN_DUCKS_CLASSES
+
+    weights = [
+        getattr(db_channel, f"spawn_weight_{category}_ducks", 0)
+        for category in categories
+    ]
+    if bot.current_event == Events.STEROIDS and ducks.SuperDuck in ducks_classes:
+        weights[ducks_classes.index(ducks.SuperDuck)] *= 2
+
+    return random.choices(ducks_classes, weights)[0]
+
+
+def sampler_pick(bot, db_channel, sun):
+    if sun == SunState.DAY:
+        categories = ducks.DUCKS_DAYTIME_CATEGORIES
+        ducks_classes = ducks.RANDOM_DAYTIME_SPAWN_DUCKS_CLASSES
+    else:
+        categories = ducks.DUCKS_NIGHTTIME_CATEGORIES
+        ducks_classes = ducks.RANDOM_NIGHTTIME_SPAWN_DUCKS_CLASSES
+
+    event = bot.current_event
+    multipliers = ducks.EVENTS_SPAWN_WEIGHTS_MULTIPLIERS.get(event)
+    sampler = db_channel.get_spawn_sampler(
+        (sun, event if multipliers else None), categories, multipliers
+    )
+    return ducks_classes[sampler.sample()]
+
+
+def run_picks(function: typing.Callable, bot, spawns) -> float:
+    start = time.perf_counter()
+    for _, db_channel, sun in spawns:
+        function(bot, db_channel, sun)
+    return time.perf_counter() - start
+
+
+async def run(function: typing.Callable, bot, spawns) -> float:
+    start = time.perf_counter()
+    for channel, db_channel, sun in spawns:
+        await function(bot, channel, db_channel, sun)
+    return time.perf_counter() - start
+
+
+async def main():
+    random.seed(42)
+    bot = types.SimpleNamespace(current_event=Events.STEROIDS)
+
+    db_channels = []
+    for i in range(CHANNELS):
+        db_channel = DiscordChannel(discord_id=i, name=f"channel-{i}")
+        db_channel.spawn_weight_normal_ducks = random.randint(50, 150)
+        db_channels.append(db_channel)
+
+    spawns = []
+    for _ in range(SPAWNS):
+        db_channel = random.choice(db_channels)
+        sun = SunState.DAY if random.random() < 0.9 else SunState.NIGHT
+        spawns.append((object(), db_channel, sun))
+
+    print(f"{SPAWNS} spawns on {CHANNELS} channels")
+
+    # The first pass builds the samplers, like the first spawns of the day would.
+    results = {
+        "Picking the class, random.choices (previous)": run_picks(legacy_pick, bot, spawns),
+        "Picking the class, alias samplers, cold": run_picks(sampler_pick, bot, spawns),
+        "Picking the class, alias samplers, warm": run_picks(sampler_pick, bot, spawns),
+    }
+
+    for db_channel in db_channels:
+        db_channel._spawn_samplers = None
+
+    results.update(
+        {
+            "get_random_weighted_duck, previous": await run(
+                legacy_get_random_weighted_duck, bot, spawns
+            ),
+            "get_random_weighted_duck, cold": await run(
+                ducks.get_random_weighted_duck, bot, spawns
+            ),
+            "get_random_weighted_duck, warm": await run(
+                ducks.get_random_weighted_duck, bot, spawns
+            ),
+        }
+    )
+
+    for name, duration in results.items():
+        print(
+            f"{name:<46}: {duration * 1000:8.1f} ms ({duration / SPAWNS * 1e6:.2f} µs/spawn)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Compare extracting the landmines words of a message with a character-by-character filter (the previous implementation
+of get_valid_words) and with the compiled regex, cold and when the same message is tokenized a second time.
+
+Run from the src directory: python benchmarks/valid_words.py
+"""
+import pathlib
+import random
+import string
+import sys
+import time
+import typing
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils import models  # noqa: E402
+
+SHORT_MESSAGES = 50_000
+PASTES = 2_000
+
+CHAT_WORDS = [
+    "hello", "duck", "bang", "lol", "I'm", "don't", "!!!", "gg", "c'est", "très", "bien",
+    "<@138751484517941259>", "https://duckhunt.me", "😂", "123456789012345678", "reload", "ok",
+]
+
+
+def legacy_get_valid_words(message_content) -> typing.List[str]:
+    allowed_chars = string.ascii_letters + string.digits + string.whitespace
+
+    cleaned_content = "".join(
+        filter(lambda character: character in allowed_chars, message_content)
+    )
+
+    words = []
+
+    for word in set(cleaned_content.lower().split()):
+        if 3 <= len(word) <= 40 and (
+            len(word) > 25
+            or len(word) < 15
+            or not set(word).issubset(set(string.digits))
+        ):
+            words.append(word)
+
+    return words
+
+
+def short_message() -> str:
+    return " ".join(random.choices(CHAT_WORDS, k=random.randint(1, 12)))
+
+
+def paste() -> str:
+    characters = string.printable + "éàü—😂 "
+    return "".join(random.choices(characters, k=2000))
+
+
+def run(function: typing.Callable, messages: typing.List[str], calls: int = 1) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        for _ in range(calls):
+            function(message)
+    return time.perf_counter() - start
+
+
+def main():
+    random.seed(42)
+    suites = {
+        "short chat messages": [short_message() for _ in range(SHORT_MESSAGES)],
+        "2000 characters pastes": [paste() for _ in range(PASTES)],
+    }
+
+    for suite_name, messages in suites.items():
+        for message in messages:
+            assert sorted(legacy_get_valid_words(message)) == sorted(
+                models.get_valid_words(message)
+            ), message
+
+        models._valid_words.cache_clear()
+        results = {
+            "Character filter (previous), twice": run(legacy_get_valid_words, messages, calls=2),
+            "Compiled regex, once, uncached": run(models._valid_words.__wrapped__, messages),
+            "get_valid_words, twice (points + landmine)": run(models.get_valid_words, messages, calls=2),
+        }
+
+        print(f"{len(messages)} {suite_name}")
+        for name, duration in results.items():
+            print(
+                f"  {name:<44}: {duration * 1000:8.1f} ms ({duration / len(messages) * 1e6:7.2f} µs/message)"
+            )
+
+
+if __name__ == "__main__":
+    main()
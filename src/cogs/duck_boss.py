@@ -7,6 +7,7 @@ from discord.ext import tasks
 from tortoise import timezone
 
 from utils.cog_class import Cog
+from utils.db_instrumentation import attribute_queries
 from utils.inventory_items import FoieGras
 from utils.models import DiscordUser
 
@@ -87,6 +88,7 @@ class DuckBoss(Cog):
 
     @tasks.loop(minutes=1)
     async def background_loop(self):
+        attribute_queries("loop:DuckBoss.background_loop")
         channel = self.bot.get_channel(self.config()["boss_channel_id"])
         latest_messages = [m async for m in channel.history(limit=1)]
 
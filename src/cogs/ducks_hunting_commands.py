@@ -12,6 +12,7 @@ from discord.ext import commands
 from utils import checks
 from utils.coats import Coats
 from utils.cog_class import Cog
+from utils.concurrency import coalesce_saves
 from utils.ctx_class import MyContext
 from utils.events import Events
 from utils.interaction import SmartMemberConverter, get_timedelta
@@ -59,6 +60,7 @@ class DucksHuntingCommands(Cog):
         ]
     )
     @checks.channel_enabled()
+    @coalesce_saves
     async def bang(self, ctx: MyContext, target: Optional[SmartMemberConverter], *args):
         """
         Shoot at the duck that appeared first on the channel.
@@ -610,6 +612,7 @@ class DucksHuntingCommands(Cog):
 
     @commands.command(aliases=["rl"])
     @checks.channel_enabled()
+    @coalesce_saves
     async def reload(self, ctx: MyContext):
         """
         Reload your gun.
@@ -702,6 +705,7 @@ class DucksHuntingCommands(Cog):
 
     @commands.command()
     @checks.channel_enabled()
+    @coalesce_saves
     async def hug(
         self, ctx: MyContext, target: Optional[Union[discord.Member, discord.Role, str]], *args
     ):
@@ -1,30 +1,60 @@
 import asyncio
 import datetime
+import heapq
+import itertools
 import json
 import random
-from time import time
-from typing import Dict
+from time import perf_counter, time
+from typing import Dict, List, Tuple
 
 import discord
 
 from utils import ducks
 from utils.cog_class import Cog
+from utils.db_instrumentation import attribute_queries
 from utils.ducks import deserialize_duck
 from utils.events import Events
-from utils.models import DiscordChannel, DucksLeft, get_enabled_channels
+from utils.latency import RollingLatencySketch
+from utils.metrics import METRICS
+from utils.models import (
+    DiscordChannel,
+    DucksLeft,
+    disable_channels,
+    get_enabled_channels_planning,
+)
+from utils.tick_profiler import TickProfiler
 
 SECOND = 1
 MINUTE = 60 * SECOND
 HOUR = 60 * MINUTE
 DAY = 24 * HOUR
 
+SPAWN_LOOP_TICK_DURATION = METRICS.histogram(
+    "duckhunt_spawn_loop_tick_duration_seconds",
+    "Time spent spawning and removing ducks in an iteration of the spawning loop.",
+)
+SPAWN_LOOP_LAG = METRICS.histogram(
+    "duckhunt_spawn_loop_lag_seconds",
+    "How late the iterations of the spawning loop start.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
 
 class DucksSpawning(Cog):
     hidden = True
+    logger_subsystem = "spawning"
 
     def __init__(self, bot, *args, **kwargs):
         super().__init__(bot, *args, **kwargs)
         self.index = 0
+        # Min-heap of (next spawn timestamp, tie-breaker, DucksLeft), with one entry per enabled channel.
+        # Entries for DucksLeft that are no longer in bot.enabled_channels are skipped when popped.
+        self.spawns_timeline: List[Tuple[int, int, DucksLeft]] = []
+        self.timeline_counter = itertools.count()
+        # Where the time of the loop iterations goes, for the last hour.
+        self.profiler = TickProfiler(["evaluation", "scheduling", "leaves", "daily"], size=HOUR)
+        # Time spent creating the ducks, in the spawn tasks, outside of the loop.
+        self.constructions = RollingLatencySketch(window=HOUR)
 
     async def cog_load(self) -> None:
         self.background_loop = self.bot.loop.create_task(self.loop())
@@ -33,10 +63,11 @@ class DucksSpawning(Cog):
         self.current_iteration_public = 0
 
     async def loop(self):
+        attribute_queries("loop:DucksSpawning.loop")
         try:
             await self.before()
         except:
-            self.bot.logger.exception("Error in before_loop")
+            self.logger.exception("Error in before_loop")
             raise
         now = time()
         current_iteration = int(now)
@@ -47,27 +78,31 @@ class DucksSpawning(Cog):
             self.current_iteration_public = current_iteration
 
             delay = now - current_iteration
+            SPAWN_LOOP_LAG.observe(max(0.0, delay))
             if delay >= 30:
-                self.bot.logger.error(
+                self.logger.error(
                     f"Ignoring iterations to compensate for delays ({delay} seconds)!"
                 )
+                self.profiler.skip((int(now) - current_iteration) // self.interval)
                 current_iteration = int(now)
             elif delay >= 5:
-                self.bot.logger.warning(
+                self.logger.warning(
                     f"Loop running with severe delays ({delay} seconds)!"
                 )
 
-            self.bot.logger.debug(
-                f"Ducks spawning loop : [{int(current_iteration)}/{int(now)}]"
+            self.logger.debug(
+                "Ducks spawning loop : [%d/%d]", current_iteration, now
             )
 
             # Loop part
+            self.profiler.start(current_iteration, max(0.0, delay))
             try:
                 await self.spawn_ducks(current_iteration)
             except Exception as e:
-                self.bot.logger.exception(
+                self.logger.exception(
                     "Ignoring exception inside loop and hoping for the best..."
                 )
+            SPAWN_LOOP_TICK_DURATION.observe(self.profiler.end().duration)
 
             # Loop the loop
             now = time()
@@ -78,105 +113,138 @@ class DucksSpawning(Cog):
         SECONDS_SPENT_TODAY = now % 86400
         SECONDS_LEFT_TODAY = 86400 - SECONDS_SPENT_TODAY
 
+        profiler = self.profiler
+
         if self.bot.allow_ducks_spawning:
             start_spawning = time()
+            evaluation_started_at = perf_counter()
+            spawn_time = 0.0
             ducks_spawned = 0
-            for channel, ducks_left_to_spawn in self.bot.enabled_channels.items():
-                maybe_spawn_type = await ducks_left_to_spawn.maybe_spawn_type(now)
-                if maybe_spawn_type is not None:
+            timeline = self.spawns_timeline
+            while timeline and timeline[0][0] <= now:
+                if ducks_spawned > 20:
+                    self.logger.warning(
+                        f"Tried to make more than {ducks_spawned} ducks spawn at once, "
+                        f"stopping there to protect rate limits..."
+                    )
+                    break
+
+                _, _, ducks_left_to_spawn = heapq.heappop(timeline)
+                channel = ducks_left_to_spawn.channel
+                if self.bot.enabled_channels.get(channel) is not ducks_left_to_spawn:
+                    # Channel disabled or recomputed since.
+                    continue
+
+                for spawn_type in ducks_left_to_spawn.pop_due_spawns(now):
                     if (
                         self.bot.current_event == Events.CONNECTION
                         and random.randint(1, 10) == 10
                     ):
                         continue
 
-                    asyncio.ensure_future(
-                        ducks.spawn_random_weighted_duck(
-                            self.bot,
-                            channel,
-                            ducks_left_to_spawn.db_channel,
-                            sun=maybe_spawn_type,
-                        )
-                    )
+                    spawn_time += self.spawn_duck(ducks_left_to_spawn, spawn_type)
                     ducks_spawned += 1
 
                     if (
                         self.bot.current_event == Events.MIGRATING
                         and random.randint(1, 10) == 10
                     ):
-                        asyncio.ensure_future(
-                            ducks.spawn_random_weighted_duck(
-                                self.bot,
-                                channel,
-                                ducks_left_to_spawn.db_channel,
-                                sun=maybe_spawn_type,
-                            )
-                        )
+                        spawn_time += self.spawn_duck(ducks_left_to_spawn, spawn_type)
                         ducks_spawned += 1
 
-                if ducks_spawned > 20:
-                    self.bot.logger.warning(
-                        f"Tried to make more than {ducks_spawned} ducks spawn at once, "
-                        f"stopping there to protect rate limits..."
-                    )
-                    break
+                self.schedule_spawns(ducks_left_to_spawn)
 
             end_spawning = time()
+            profiler.add("evaluation", perf_counter() - evaluation_started_at - spawn_time)
 
             if end_spawning - start_spawning > 0.7:
                 duration = round(end_spawning - start_spawning, 2)
-                self.bot.logger.error(
+                self.logger.error(
                     f"Spawning {ducks_spawned} ducks took more than {duration} seconds..."
                 )
 
         start_leaving = time()
+        leaves_started_at = perf_counter()
         total_leaves = 0
-        for channel, ducks_queue in self.bot.ducks_spawned.copy().items():
-            for duck in ducks_queue.copy():
-                left = await duck.maybe_leave()
-                if not left:
-                    break
-                else:
-                    total_leaves += 1
+        departures = self.bot.ducks_departures
+        while total_leaves < 25:
+            duck = departures.pop_expired(now)
+            if duck is None:
+                break
 
-            if total_leaves > 25:
-                self.bot.logger.warning(
-                    f"Tried to make more than {total_leaves} ducks leave at once, "
-                    f"stopping there to protect rate limits..."
+            if duck not in self.bot.ducks_spawned.get(duck.channel, ()):
+                # Removed along with the other ducks of the channel.
+                continue
+
+            duck._departure = None
+            # A full channel queue drops the message, instead of blocking the loop.
+            await duck.leave(wait=False)
+            total_leaves += 1
+        else:
+            # Protecting rate limits, the remaining ducks will leave on the next iterations.
+            lag = departures.lag(now)
+            if lag:
+                self.logger.warning(
+                    f"Made {total_leaves} ducks leave at once, {departures.backlog(now)} more ducks "
+                    f"are waiting to leave, up to {lag} seconds late..."
                 )
-                break
 
         end_leaving = time()
+        profiler.add("leaves", perf_counter() - leaves_started_at)
 
         if end_leaving - start_leaving > 0.7:
             duration = round(end_leaving - start_leaving, 2)
-            self.bot.logger.error(
+            self.logger.error(
                 f"Leaving {total_leaves} ducks took more than {duration} seconds..."
             )
 
         CURRENT_PLANNED_DAY = now - (now % DAY)
         if CURRENT_PLANNED_DAY != self.last_planned_day:
-            await self.planify(now)
-            embed = discord.Embed()
-
-            embed.colour = discord.Colour.green()
-            embed.title = f"It's freetime !"
-            embed.description = f"Your magazines have been refilled, and confiscated weapons have just been released"
-            dtnow = datetime.datetime.fromtimestamp(now)
-            if dtnow.day == 1 and dtnow.month == 4:
-                # April 1st
-                embed.set_footer(text="🐟️")
-            else:
-                embed.set_footer(text="Freetime happens every 24 hours.")
-            await self.bot.log_to_channel(embed=embed)
+            with profiler.phase("daily"):
+                await self.planify(now)
+                embed = discord.Embed()
+
+                embed.colour = discord.Colour.green()
+                embed.title = f"It's freetime !"
+                embed.description = f"Your magazines have been refilled, and confiscated weapons have just been released"
+                dtnow = datetime.datetime.fromtimestamp(now)
+                if dtnow.day == 1 and dtnow.month == 4:
+                    # April 1st
+                    embed.set_footer(text="🐟️")
+                else:
+                    embed.set_footer(text="Freetime happens every 24 hours.")
+                await self.bot.log_to_channel(embed=embed)
 
         if SECONDS_LEFT_TODAY % HOUR == 0:
-            await self.change_event()
+            with profiler.phase("daily"):
+                await self.change_event()
+
+    def spawn_duck(self, ducks_left: DucksLeft, spawn_type) -> float:
+        """
+        Schedule the creation and the spawn of a duck in the channel. Returns the time it took.
+
+        Both happen outside of the loop: creating the duck may need the channel settings from the database.
+        """
+        scheduled_at = perf_counter()
+        asyncio.ensure_future(self.construct_and_spawn(ducks_left, spawn_type))
+        duration = perf_counter() - scheduled_at
+
+        self.profiler.add("scheduling", duration)
+        return duration
+
+    async def construct_and_spawn(self, ducks_left: DucksLeft, spawn_type):
+        constructed_at = perf_counter()
+        duck = await ducks.get_random_weighted_duck(
+            self.bot, ducks_left.channel, ducks_left.db_channel, sun=spawn_type
+        )
+        self.constructions.add(perf_counter() - constructed_at)
+
+        await duck.spawn()
 
     def cog_unload(self):
         self.background_loop.cancel()
 
-        self.bot.logger.info(f"Saving ducks to cache...")
+        self.logger.info(f"Saving ducks to cache...")
 
         ducks_spawned = self.bot.ducks_spawned
 
@@ -196,7 +264,7 @@ class DucksSpawning(Cog):
         with open("cache/ducks_spawned_cache.json", "w") as f:
             json.dump(serialized, f)
 
-        self.bot.logger.info(f"Saved {ducks_count} to cache/ducks_spawned_cache.json")
+        self.logger.info(f"Saved {ducks_count} to cache/ducks_spawned_cache.json")
 
     async def planify(self, now=None):
         if now is None:
@@ -204,70 +272,95 @@ class DucksSpawning(Cog):
 
         self.last_planned_day = now - (now % DAY)
 
-        db_channels = await get_enabled_channels()
+        start = time()
+        channels_data = await get_enabled_channels_planning()
 
-        self.bot.logger.debug(f"Planifying ducks spawns on {len(db_channels)} channels")
+        self.logger.debug(
+            "Planifying ducks spawns on %d channels", len(channels_data)
+        )
 
+        planned = 0
         channels_to_disable = []
-
-        channels: Dict[int, discord.TextChannel] = {
-            c.id: c for c in self.bot.get_all_channels()
-        }
-        i = 0
-
-        for db_channel in db_channels:
-            i += 1
-            channel = channels.get(db_channel.discord_id)
-
-            if i % 100 == 0:
+        unavailable_guilds = set()
+        # Guilds that aren't in the cache, after a partial READY for instance. Their channels aren't disabled.
+        missing_guilds = set()
+        # Most channels use the same settings, so the budgets are computed once per settings.
+        budgets: Dict[Tuple[int, int, int], Tuple[int, int]] = {}
+        ranges: Dict[Tuple[int, int], Tuple[List[range], List[range]]] = {}
+
+        for i, (
+            channel_id,
+            guild_id,
+            ducks_per_day,
+            night_start_at,
+            night_end_at,
+        ) in enumerate(channels_data, start=1):
+            if i % 5000 == 0:
                 await asyncio.sleep(0)
-                self.bot.logger.debug(
-                    f"Planifying ducks spawns on {i}/{len(db_channels)} channels"
+
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                missing_guilds.add(guild_id)
+                continue
+            elif guild.unavailable:
+                # Discord outage, don't disable anything there.
+                unavailable_guilds.add(guild_id)
+                continue
+
+            channel = guild.get_channel(channel_id)
+            if not channel:
+                # The guild is loaded, but the channel was deleted (or the bot can't see it anymore)
+                channels_to_disable.append(channel_id)
+                continue
+
+            settings = (ducks_per_day, night_start_at, night_end_at)
+            budget = budgets.get(settings)
+            if budget is None:
+                budget = budgets[settings] = DucksLeft.compute_budget(
+                    ducks_per_day, night_start_at, night_end_at, now
                 )
 
-            if channel:
-                self.bot.enabled_channels[channel] = await DucksLeft(
-                    channel
-                ).compute_ducks_count(db_channel, now)
-            else:
-                self.bot.logger.warning(
-                    f"Channel {db_channel.name} is unknown, marking for disable"
+            night = (night_start_at, night_end_at)
+            night_ranges = ranges.get(night)
+            if night_ranges is None:
+                night_ranges = ranges[night] = DucksLeft.compute_ranges(
+                    night_start_at, night_end_at, now
                 )
-                channels_to_disable.append(db_channel)
 
-        if 0 < len(channels_to_disable) < 100:
-            self.bot.logger.warning(
+            ducks_left = DucksLeft(channel)
+            ducks_left.plan(now, night_ranges, budget)
+            self.bot.enabled_channels[channel] = ducks_left
+            planned += 1
+
+        self.rebuild_spawns_timeline()
+
+        self.logger.info(
+            f"Planified ducks spawns on {planned} channels "
+            f"({len(budgets)} different settings) in {round(time() - start, 3)} seconds"
+        )
+
+        if unavailable_guilds or missing_guilds:
+            self.logger.error(
+                f"{len(unavailable_guilds)} guilds are unavailable and {len(missing_guilds)} are unknown, their "
+                f"channels weren't planned. Is discord healthy ? https://discordstatus.com/ for more info."
+            )
+
+        if channels_to_disable:
+            self.logger.warning(
                 f"Disabling {len(channels_to_disable)} channels "
-                f"that are no longer available to the bot."
+                f"that are no longer available to the bot. "
+                f"Examples : {', '.join([str(c) for c in channels_to_disable[:10]])}"
             )
-            for db_channel in channels_to_disable:
-                # TODO : We can probably only do 1 big query here, but for that I'd have to learn Tortoise.
-                # To be honest, improvement would be limited since 100 queries max isn't that slow and there obviously
-                # aren't that many channels that get disabled during a reboot...
-                db_channel.enabled = False
-                await db_channel.save()
-                await asyncio.sleep(0)  # Just in case
-            self.bot.logger.warning(
-                f"Disabled {len(channels_to_disable)} channels "
+            disabled = await disable_channels(channels_to_disable)
+            self.logger.warning(
+                f"Disabled {disabled} channels "
                 f"that are no longer available to the bot."
             )
-        elif len(channels_to_disable) >= 100:
-            self.bot.logger.error(
-                f"Too many unavailable channels ({len(channels_to_disable)}) "
-                f"to disable them. Is discord healthy ?"
-            )
-            self.bot.logger.error(
-                "Consider rebooting the bot once the outage is over. https://discordstatus.com/ for more info."
-            )
-            self.bot.logger.error(
-                "Bad examples : "
-                + ", ".join([str(c.discord_id) for c in channels_to_disable[:10]])
-            )
         else:
-            self.bot.logger.debug(f"All the channels are available :)")
+            self.logger.debug(f"All the channels are available :)")
 
     async def before(self):
-        self.bot.logger.info(f"Waiting for ready-ness to planify duck spawns...")
+        self.logger.info(f"Waiting for ready-ness to planify duck spawns...")
 
         await self.bot.wait_until_ready()
         # Wait 5 seconds because discord.py can send the ready event a little bit too early
@@ -275,23 +368,23 @@ class DucksSpawning(Cog):
         # Then try again to make sure we are still good.
         await self.bot.wait_until_ready()
 
-        self.bot.logger.info(f"Restoring ducks from cache...")
+        self.logger.info(f"Restoring ducks from cache...")
 
         ducks_count = 0
         try:
             with open("cache/ducks_spawned_cache.json", "r") as f:
                 serialized = json.load(f)
         except FileNotFoundError:
-            self.bot.logger.warning(
+            self.logger.warning(
                 "No ducks_spawned_cache.json found. Normal on first run."
             )
             serialized = {}
 
-        self.bot.logger.info(f"Loaded JSON file...")
+        self.logger.info(f"Loaded JSON file...")
 
-        self.bot.logger.debug(f"Building channels hash table for fast-access...")
+        self.logger.debug(f"Building channels hash table for fast-access...")
         channels = {c.id: c for c in self.bot.get_all_channels()}
-        self.bot.logger.debug(f"Hash table built, restoring ducks...")
+        self.logger.debug(f"Hash table built, restoring ducks...")
 
         for channel_id, ducks in serialized.items():
             channel = channels.get(int(channel_id), None)
@@ -302,11 +395,11 @@ class DucksSpawning(Cog):
                     duck = deserialize_duck(self.bot, channel, data)
                     await duck.spawn(loud=False)
 
-        self.bot.logger.info(f"{ducks_count} ducks restored!")
+        self.logger.info(f"{ducks_count} ducks restored!")
 
         await asyncio.sleep(1)
 
-        self.bot.logger.info(f"Planifying ducks spawns for the rest of the day")
+        self.logger.info(f"Planifying ducks spawns for the rest of the day")
 
         await self.planify()
 
@@ -328,7 +421,7 @@ class DucksSpawning(Cog):
         )
         await self.bot.log_to_channel(embed=embed)
 
-        self.bot.logger.info(f"Restoring an event for the rest of the hour")
+        self.logger.info(f"Restoring an event for the rest of the hour")
 
         try:
             with open("cache/event_cache.json", "r") as f:
@@ -337,12 +430,12 @@ class DucksSpawning(Cog):
             event = Events[event_name]
             self.bot.current_event = event
         except FileNotFoundError:
-            self.bot.logger.warning(
+            self.logger.warning(
                 "No event_cache.json found. Normal on first run. Rolling an event instead."
             )
             await self.change_event()
         except KeyError:
-            self.bot.logger.exception(
+            self.logger.exception(
                 "event_cache.json found, but couldn't read it. Rolling an event instead."
             )
             await self.change_event()
@@ -350,7 +443,7 @@ class DucksSpawning(Cog):
         game = discord.Game(self.bot.current_event.value[0])
         await self.bot.change_presence(status=discord.Status.online, activity=game)
 
-        self.bot.logger.info(f"Ducks spawning started")
+        self.logger.info(f"Ducks spawning started")
 
     async def calculate_ducks_per_day(self, db_channel: DiscordChannel, now: int):
         # TODO : Compute ducks sleep
@@ -363,24 +456,43 @@ class DucksSpawning(Cog):
 
         ducks = int((seconds_left_in_day * ducks_per_day) / DAY)
 
-        # self.bot.logger.debug(f"Recomputing : {pct_day}% day done, {ducks}/{ducks_per_day} ducks to spawn today")
+        # self.logger.debug(f"Recomputing : {pct_day}% day done, {ducks}/{ducks_per_day} ducks to spawn today")
 
         return ducks
 
+    def schedule_spawns(self, ducks_left: DucksLeft):
+        next_spawn_at = ducks_left.next_spawn_at
+        if next_spawn_at is not None:
+            heapq.heappush(
+                self.spawns_timeline,
+                (next_spawn_at, next(self.timeline_counter), ducks_left),
+            )
+
+    def rebuild_spawns_timeline(self):
+        """
+        Recreate the timeline from bot.enabled_channels, dropping the outdated entries.
+        """
+        self.spawns_timeline = [
+            (ducks_left.next_spawn_at, next(self.timeline_counter), ducks_left)
+            for ducks_left in self.bot.enabled_channels.values()
+            if ducks_left.next_spawn_at is not None
+        ]
+        heapq.heapify(self.spawns_timeline)
+
     async def recompute_channel(self, channel: discord.TextChannel):
-        self.bot.enabled_channels[channel] = await DucksLeft(
-            channel
-        ).compute_ducks_count()
+        ducks_left = await DucksLeft(channel).compute_ducks_count()
+        self.bot.enabled_channels[channel] = ducks_left
+        self.schedule_spawns(ducks_left)
 
     async def change_event(self, force=False):
         if random.randint(1, 12) != 1 and not force:
-            self.bot.logger.info("No new event this time!")
+            self.logger.info("No new event this time!")
             self.bot.current_event = Events.CALM
         else:
-            self.bot.logger.debug("It's time for an EVENT!")
+            self.logger.debug("It's time for an EVENT!")
             events = [event for event in Events if event != Events.CALM]
             event_choosen: Events = random.choice(events)
-            self.bot.logger.info(f"New event : {event_choosen.name}")
+            self.logger.info(f"New event : {event_choosen.name}")
 
             self.bot.current_event = event_choosen
         game = discord.Game(self.bot.current_event.value[0])
@@ -1,6 +1,9 @@
 """
 The emergencies command group, allowing for finer control of the bot, raw debugging and statistics.
 """
+import collections
+import logging
+import time
 from typing import Set
 
 import discord
@@ -11,8 +14,26 @@ from tortoise import timezone
 from utils import checks
 from utils.cog_class import Cog
 from utils.ctx_class import MyContext
+from utils.db_instrumentation import QUERIES
 from utils.ducks import Map
-from utils.models import AccessLevel, get_from_db
+from utils.interaction import WEBHOOK_POOLS
+from utils.landmines_index import LANDMINES_INDEX
+from utils.landmines_points import LANDMINES_POINTS
+from utils.latency import COMMAND_LATENCIES, CommandTimings
+from utils.logger import SUBSYSTEMS
+from utils.models import (
+    DB_LOCKS,
+    GUILD_PREFIXES,
+    IDENTITY_CACHE,
+    PLAYERS_CACHE,
+    PLAYERS_CACHE_SHARD_STATS,
+    SAVES_STATS,
+    AccessLevel,
+    get_from_db,
+)
+from utils.prefixes import PREFIXES
+from utils.tick_profiler import sparkline
+from utils.translations import CATALOGS
 
 
 def _(message):
@@ -199,6 +220,353 @@ class Emergencies(Cog):
             f"{total} socket events observed ({cpm:.2f}/minute):\n{self.bot.socket_stats}"
         )
 
+    @manage_bot.command(aliases=["cache", "cache_stats"])
+    async def caches(self, ctx: MyContext):
+        """
+        Show the in-process database caches statistics.
+        """
+        stats = IDENTITY_CACHE.stats()
+        players_stats = PLAYERS_CACHE.stats()
+        prefixes_stats = PREFIXES.stats()
+        landmines_stats = LANDMINES_INDEX.stats()
+        points_stats = LANDMINES_POINTS.stats()
+
+        shards_lines = []
+        for shard_id, shard_stats in sorted(
+            PLAYERS_CACHE_SHARD_STATS.items(), key=lambda item: item[0] or 0
+        ):
+            total = shard_stats["hits"] + shard_stats["misses"]
+            shards_lines.append(
+                f"Shard {shard_id}: {shard_stats['hits']}/{total} ({shard_stats['hits'] / total:.2%})"
+            )
+
+        await ctx.send(
+            f"**Identity cache** (get_from_db): {stats['size']}/{stats['maxsize']} objects, "
+            f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_ratio']:.2%}), "
+            f"{stats['evictions']} evictions, {stats['expirations']} expirations.\n"
+            f"**Players cache** (get_player): {players_stats['size']}/{players_stats['maxsize']} players, "
+            f"{players_stats['hits']} hits, {players_stats['misses']} misses ({players_stats['hit_ratio']:.2%}), "
+            f"{players_stats['evictions']} evictions, {players_stats['expirations']} expirations.\n"
+            f"Hit ratio per shard: {', '.join(shards_lines) or 'no data yet'}\n"
+            f"**Dirty-tracked saves**: {SAVES_STATS['full']} full, {SAVES_STATS['partial']} partial, "
+            f"{SAVES_STATS['skipped']} skipped (unchanged), {SAVES_STATS['coalesced']} coalesced.\n"
+            f"**Landmines index**: {landmines_stats['landmines']} landmines in {landmines_stats['guilds']} guilds, "
+            f"{landmines_stats['hits']} hits, {landmines_stats['misses']} misses (no query).\n"
+            f"**Landmines points**: {points_stats['pending']} players pending, {points_stats['accrued']} messages, "
+            f"{points_stats['rows_flushed']} rows in {points_stats['flushes']} flushes "
+            f"({points_stats['average_flush_time'] * 1000:.1f}ms average).\n"
+            f"**Prefixes**: {prefixes_stats['compiled']} compiled, {len(GUILD_PREFIXES)} guild prefixes cached, "
+            f"{prefixes_stats['matched']} messages matched, {prefixes_stats['rejected']} rejected."
+        )
+
+    @manage_bot.command(aliases=["db_locks"])
+    async def locks(self, ctx: MyContext):
+        """
+        Show the database locks registry statistics: live locks, and how long commands waited on them.
+        """
+        stats = DB_LOCKS.stats()
+        histogram = ", ".join(
+            f"≤{bucket}s: {count}" for bucket, count in stats["wait_histogram"].items()
+        )
+        await ctx.send(
+            f"**DB locks**: {stats['live_locks']} live locks, {stats['acquisitions']} acquisitions, "
+            f"{stats['contended_acquisitions']} contended ({stats['total_wait_time']}s waited).\n"
+            f"Wait histogram: {histogram}"
+        )
+
+    @manage_bot.command(aliases=["leaves"])
+    async def departures(self, ctx: MyContext):
+        """
+        Show the ducks departures queue statistics: how many ducks are late to leave, and by how much.
+        """
+        stats = self.bot.ducks_departures.stats(time.time())
+        await ctx.send(
+            f"**Ducks departures**: {stats['entries']} entries, {stats['popped']} popped, "
+            f"{stats['discarded']} discarded (killed or rescheduled).\n"
+            f"Backlog: {stats['backlog']} ducks, {stats['lag']}s late. "
+            f"Lag: {stats['average_lag']}s average, {stats['max_lag']}s max."
+        )
+
+    @manage_bot.command(aliases=["spawning_loop", "loop_profile", "ticks"])
+    async def spawn_loop(self, ctx: MyContext, ticks: int = 600):
+        """
+        Show how long the last iterations of the ducks spawning loop took, and where the time went: deciding which
+        ducks spawn, creating them, scheduling their messages, making ducks leave, and the daily planning and
+        hourly events.
+        """
+        ducks_spawning_cog = self.bot.get_cog("DucksSpawning")
+        profiler = ducks_spawning_cog.profiler
+        ticks = max(1, min(ticks, profiler.history.maxlen))
+
+        last_ticks = profiler.last(ticks)
+        if not last_ticks:
+            await ctx.send("The spawning loop didn't run yet.")
+            return
+
+        summary = profiler.summary(ticks)
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.1f}ms"
+
+        rows = [("tick", summary["duration"]), ("lag", summary["lag"])]
+        rows += list(summary["phases"].items())
+        # Outside of the ticks, over the last hour
+        rows.append(("construction*", ducks_spawning_cog.constructions.merged().summary()))
+        table = "\n".join(
+            f"{name:<13} {ms(values['p50']):>9} {ms(values['p95']):>9} {ms(values['p99']):>9} {ms(values['max']):>9}"
+            for name, values in rows
+        )
+
+        await ctx.send(
+            f"**Spawning loop**: last {summary['ticks']} of {summary['total_ticks']} ticks, "
+            f"{summary['skipped_iterations']} iterations skipped since the start.\n"
+            f"```\n"
+            f"Duration {sparkline([tick.duration for tick in last_ticks])}\n"
+            f"Lag      {sparkline([tick.lag for tick in last_ticks])}\n\n"
+            f"{'':<13} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}\n"
+            f"{table}\n"
+            f"```\n"
+            f"\\* Creating the ducks, in the spawn tasks, over the last hour."
+        )
+
+    @manage_bot.command(aliases=["event_loop_stalls", "blocking"])
+    @checks.needs_access_level(AccessLevel.BOT_OWNER)
+    async def stalls(self, ctx: MyContext, count: int = 8):
+        """
+        Show the code that blocked the event loop the most since the bot started, as caught by the event loop
+        watchdog, and the stack of the worst one.
+        """
+        watchdog = self.bot.watchdog
+        if watchdog is None:
+            await ctx.send("The event loop watchdog is disabled in the configuration.")
+            return
+
+        locations = watchdog.top_locations(max(1, min(count, 15)))
+        if not locations:
+            await ctx.send(f"The event loop was never blocked for more than {watchdog.threshold}s. Good.")
+            return
+
+        now = time.time()
+        lines = [
+            f"**{location.total_duration:.1f}s** in {location.count} stalls "
+            f"({location.max_duration:.2f}s max, last {now - location.last_seen:.0f}s ago): `{location.location}`"
+            for location in locations
+        ]
+        stack = "\n".join(locations[0].stack)
+
+        message = (
+            f"**Event loop stalls** (over {watchdog.threshold}s): {watchdog.stalls} stalls, "
+            f"{watchdog.total_duration:.1f}s blocked in total.\n" + "\n".join(lines)
+        )
+        stack_message = f"\nStack of the worst location:\n```\n{stack}\n```"
+        if stack and len(message) + len(stack_message) <= 2000:
+            message += stack_message
+
+        await ctx.send(message[:2000])
+
+    @manage_bot.command(aliases=["log_levels", "logging"])
+    @checks.needs_access_level(AccessLevel.BOT_OWNER)
+    async def log_level(self, ctx: MyContext, level: str = None, subsystem: str = None):
+        """
+        Show the logs levels, or change the level of the bot logs or of a subsystem (spawning, landmines, api) until the
+        next restart. Use NOTSET to make a subsystem use the bot level again.
+        """
+        logger = self.bot.logger
+
+        if level is not None:
+            level = level.upper()
+            if not isinstance(logging.getLevelName(level), int):
+                await ctx.send(f"❌ Unknown level `{level}`, use DEBUG, INFO, WARNING or ERROR.")
+                return
+            if subsystem is not None and subsystem not in SUBSYSTEMS:
+                await ctx.send(f"❌ Unknown subsystem `{subsystem}`, use one of {', '.join(SUBSYSTEMS)}.")
+                return
+            if subsystem is None and level == "NOTSET":
+                await ctx.send("❌ The bot logs need a level.")
+                return
+
+            logger.set_level(level, subsystem)
+
+        lines = [f"{'bot':<10} {logging.getLevelName(logger.get_level())}"]
+        for name in SUBSYSTEMS:
+            subsystem_logger = logger.subsystem(name).logger
+            level_name = logging.getLevelName(subsystem_logger.getEffectiveLevel())
+            if subsystem_logger.level == logging.NOTSET:
+                level_name += " (bot level)"
+            lines.append(f"{name:<10} {level_name}")
+
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @manage_bot.command(aliases=["http_cache", "api_cache"])
+    async def api_responses_cache(self, ctx: MyContext):
+        """
+        Show the JSON API response cache statistics, by route.
+        """
+        rest_api = self.bot.get_cog("RestAPI")
+        if rest_api is None:
+            await ctx.send("The API isn't loaded.")
+            return
+
+        lines = []
+        for route, stats in sorted(rest_api.response_cache.stats().items()):
+            lines.append(
+                f"`{route}`: {stats.get('hits', 0)} hits, {stats.get('misses', 0)} misses, "
+                f"{stats.get('coalesced', 0)} coalesced, {stats.get('not_modified', 0)} not modified (304)"
+            )
+
+        await ctx.send("**API responses cache**\n" + ("\n".join(lines) or "No cached route was called yet."))
+
+    @manage_bot.command(aliases=["outbound_queues", "send_queues"])
+    async def outbound(self, ctx: MyContext):
+        """
+        Show the outbound messages queues: how many messages are waiting, merged or dropped, and the slowest channels.
+        """
+        totals = self.bot.outbound.stats()
+        queues = self.bot.outbound.queues()
+
+        busiest = sorted(queues, key=lambda queue: (len(queue), queue.average_latency), reverse=True)[:5]
+        busiest_str = "\n".join(
+            f"<#{queue.channel_id}>: {len(queue)} waiting, {queue.sent} sent, "
+            f"{queue.average_latency * 1000:.0f}ms average latency ({queue.max_latency * 1000:.0f}ms max)"
+            for queue in busiest
+            if queue.sent or len(queue)
+        )
+
+        await ctx.send(
+            f"**Outbound queues**: {totals.get('queues', 0)} channels, {totals.get('depth', 0)} messages waiting.\n"
+            f"{totals.get('sent', 0)} sent, {totals.get('merged', 0)} merged, {totals.get('dropped', 0)} dropped, "
+            f"{totals.get('failed', 0)} failed, {totals.get('throttled', 0)} throttled, "
+            f"{totals.get('rate_limited', 0)} rate-limited.\n"
+            f"{busiest_str or 'No messages sent yet.'}"
+        )
+
+    @manage_bot.command(aliases=["webhook_pools"])
+    async def webhooks(self, ctx: MyContext):
+        """
+        Show the webhook pools statistics: healthy webhooks, rate-limits and missing webhooks.
+        """
+        totals = collections.Counter()
+        pools = WEBHOOK_POOLS.values()
+        for pool in pools:
+            totals.update(pool.stats())
+
+        slowest = sorted(
+            (
+                (pooled.latency, pool.channel_id)
+                for pool in pools
+                for pooled in pool.webhooks.values()
+                if pooled.latency is not None
+            ),
+            reverse=True,
+        )[:5]
+        slowest_str = ", ".join(
+            f"<#{channel_id}> {latency * 1000:.0f}ms" for latency, channel_id in slowest
+        )
+
+        await ctx.send(
+            f"**Webhook pools**: {len(pools)} channels, {totals['webhooks']} webhooks "
+            f"({totals['healthy']} healthy).\n"
+            f"{totals['sends']} sends, {totals['rate_limited']} rate-limited, {totals['not_found']} not found.\n"
+            f"Slowest webhooks (average latency): {slowest_str or 'no data yet'}"
+        )
+
+    @manage_bot.command(aliases=["latencies", "slow_commands"])
+    @checks.needs_access_level(AccessLevel.BOT_OWNER)
+    async def command_latencies(self, ctx: MyContext, *, command_name: str = None):
+        """
+        Show the commands latency percentiles over the last hour, from receiving the message to the end of the command.
+
+        Without a command name, show the slowest commands. With one, show where the time goes for that command:
+        prefix resolution, context, checks, waiting for the previous command of the channel, callback and database.
+        """
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.0f}ms"
+
+        if command_name is None:
+            stats = COMMAND_LATENCIES.stats()
+            slowest = sorted(stats.items(), key=lambda item: item[1]["total"]["p95"], reverse=True)[:15]
+            lines = [
+                f"{name[:20]:<20} {summary['total']['count']:>6} {ms(summary['total']['p50']):>7} "
+                f"{ms(summary['total']['p95']):>7} {ms(summary['total']['p99']):>7} "
+                f"{ms(summary['concurrency']['p95']):>7} {ms(summary['db']['p95']):>7}"
+                for name, summary in slowest
+            ]
+            header = f"{'Command':<20} {'Uses':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'wait95':>7} {'db95':>7}"
+        else:
+            summary = COMMAND_LATENCIES.summary(command_name)
+            if not summary or not summary["total"]["count"]:
+                await ctx.send(f"`{command_name}` wasn't used during the last hour.")
+                return
+
+            lines = [
+                f"{phase:<12} {ms(summary[phase]['average']):>8} {ms(summary[phase]['p50']):>7} "
+                f"{ms(summary[phase]['p95']):>7} {ms(summary[phase]['p99']):>7} {ms(summary[phase]['max']):>7}"
+                for phase in CommandTimings.PHASES
+            ]
+            header = (
+                f"{command_name}: {summary['total']['count']} uses\n"
+                f"{'Phase':<12} {'Average':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'Max':>7}"
+            )
+
+        if not lines:
+            await ctx.send("No command was used during the last hour.")
+            return
+
+        await ctx.send("```\n" + header + "\n" + "\n".join(lines) + "\n```")
+
+    @manage_bot.command(aliases=["queries", "slow_queries", "db_queries"])
+    @checks.needs_access_level(AccessLevel.BOT_OWNER)
+    async def top_queries(self, ctx: MyContext, count: int = 8):
+        """
+        Show the database queries that took the most time since the bot started, and what made them: commands,
+        background loops, API routes or events. Queries slower than the database slow_query_threshold are also
+        written to cache/slow_queries.log.
+        """
+        count = max(1, min(count, 15))
+
+        sources = ", ".join(
+            f"`{source}` {stats.total_time:.1f}s ({stats.count})" for source, stats in QUERIES.top_sources(count)
+        )
+        message = (
+            f"**Database queries**: {len(QUERIES.templates)} templates, {QUERIES.slow_queries} slower than "
+            f"{QUERIES.slow_query_threshold}s.\n"
+            f"Top sources: {sources or 'no query yet'}\n"
+        )
+
+        for template, stats in QUERIES.top_templates(count):
+            top_source = stats.sources.most_common(1)[0][0]
+            line = (
+                f"**{stats.total_time:.1f}s** in {stats.count} queries "
+                f"({stats.total_time / stats.count * 1000:.1f}ms average, {stats.max_time * 1000:.0f}ms max, "
+                f"{stats.rows} rows), mostly `{top_source}`\n"
+                f"```sql\n{template[:250]}\n```"
+            )
+            if len(message) + len(line) > 2000:
+                break
+            message += line
+
+        await ctx.send(message)
+
+    @manage_bot.command(aliases=["reload_catalogs", "reload_locales"])
+    async def reload_translations(self, ctx: MyContext):
+        """
+        Reload the translation catalogs from the compiled .mo files, without restarting the bot.
+        """
+        try:
+            catalogs = CATALOGS.load()
+        except Exception as e:
+            await ctx.reply(
+                f"❌ Couldn't reload the catalogs, the previous ones are still used: {type(e).__name__}: {e}"
+            )
+            return
+
+        lookup_time = CATALOGS.measure_lookup()
+        await ctx.reply(
+            f"Reloaded {len(catalogs)} translation catalogs in {CATALOGS.load_duration * 1000:.1f}ms. "
+            f"A translation now takes {lookup_time * 1e6:.2f}µs."
+        )
+
     @manage_bot.command()
     async def asshole(self, ctx):
         try:
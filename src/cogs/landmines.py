@@ -4,7 +4,7 @@ import babel.lists
 import discord
 from babel.dates import format_timedelta
 from discord import HTTPException, Thread
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import BucketType, MaxConcurrency
 from tortoise import timezone
 
@@ -12,6 +12,9 @@ from utils import checks, models
 from utils.bot_class import MyBot
 from utils.cog_class import Cog
 from utils.ctx_class import MyContext
+from utils.db_instrumentation import attribute_queries
+from utils.landmines_index import LANDMINES_INDEX
+from utils.landmines_points import LANDMINES_POINTS
 from utils.models import AccessLevel, DiscordMember, get_from_db
 
 
@@ -23,10 +26,47 @@ class Event2021(Cog):
     display_name = _("Landmines")
     help_priority = 9
     help_color = "primary"
+    logger_subsystem = "landmines"
 
     def __init__(self, bot: MyBot, *args, **kwargs):
         super().__init__(bot, *args, **kwargs)
         self.concurrency = MaxConcurrency(number=1, per=BucketType.member, wait=True)
+        self.index_rebuild_loop.start()
+        self.points_flush_loop.start()
+
+    async def cog_unload(self):
+        self.index_rebuild_loop.cancel()
+        self.points_flush_loop.cancel()
+        rows = await LANDMINES_POINTS.flush()
+        self.logger.info(f"Saved the landmines points of {rows} players")
+
+    @tasks.loop(seconds=5)
+    async def points_flush_loop(self):
+        """
+        Write the points earned by talking to the database.
+        """
+        attribute_queries("loop:Event2021.points_flush_loop")
+        try:
+            await LANDMINES_POINTS.flush()
+        except Exception:
+            self.logger.exception("Couldn't save the landmines points, will retry")
+
+    @tasks.loop(minutes=30)
+    async def index_rebuild_loop(self):
+        """
+        Rebuild the landmines words index from the database, in case it missed something.
+        """
+        attribute_queries("loop:Event2021.index_rebuild_loop")
+        try:
+            count = await LANDMINES_INDEX.rebuild()
+        except Exception:
+            self.logger.exception("Couldn't rebuild the landmines index, will retry")
+        else:
+            self.logger.debug("Rebuilt the landmines index, %d active landmines", count)
+
+    @index_rebuild_loop.before_loop
+    async def before(self):
+        await self.bot.wait_until_ready()
 
     async def user_can_play(self, user: discord.Member):
         if user.bot:
@@ -96,7 +136,7 @@ class Event2021(Cog):
 
             db_target = await models.get_member_landminesdata(message.author)
 
-            added_points = db_target.add_points_for_message(message.content)
+            db_target.add_points_for_message(message.content)
 
             landmine = await models.get_landmine(message.guild, message.content)
 
@@ -158,7 +198,8 @@ class Event2021(Cog):
                         delete_on_invoke_removed=False,
                     )
 
-            if landmine or added_points:
+            if landmine:
+                # Points earned by talking are saved in batches by points_flush_loop.
                 await db_target.save()
         finally:
             await self.concurrency.release(message)
@@ -669,6 +710,7 @@ class Event2021(Cog):
         _ = await ctx.get_translate_function()
 
         db_guild = await models.get_from_db(ctx.guild)
+        await LANDMINES_POINTS.flush()
 
         stats_embed = discord.Embed(
             colour=discord.Colour.dark_green(), title=_("Landmines statistics")
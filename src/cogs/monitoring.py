@@ -2,9 +2,8 @@
 Bot monitoring.
 """
 import asyncio
-import time
 from datetime import timedelta
-from typing import Callable, List, Union
+from typing import Union
 
 import discord
 from discord.ext import tasks
@@ -12,6 +11,8 @@ from discord.ext.commands import CommandError
 
 from utils.cog_class import Cog
 from utils.ctx_class import MyContext
+from utils.db_instrumentation import attribute_queries
+from utils.event_counters import EventCounter
 from utils.models import BotState
 
 
@@ -19,49 +20,8 @@ def _(message):
     return message
 
 
-def get_now():
-    return int(time.time())
-
-
 DB_MEASURE_INTERVAL = timedelta(minutes=10)
-
-
-def filter_count_event_list(
-    events: List[int], count_predicate: Callable, keep_predicate: Callable
-) -> int:
-    """
-    This function count the number of events matching a predicate and filters the events list inplace following another.
-
-    It returns the count of matching events.
-    """
-    total_count = 0
-    filtered_events = []
-
-    for event in events:
-        if count_predicate(event):
-            total_count += 1
-
-        if keep_predicate(event):
-            filtered_events.append(event)
-
-    events[:] = filtered_events
-    return total_count
-
-
-def get_predicate(delta: timedelta, now: int = None) -> Callable:
-    now = now or get_now()
-
-    if delta is not None:
-
-        def time_predicate(timestamp):
-            return timestamp > (now - delta.total_seconds())
-
-    else:
-
-        def time_predicate(timestamp):
-            return True
-
-    return time_predicate
+EVENTS_RETENTION = timedelta(hours=1)
 
 
 class Monitoring(Cog):
@@ -71,12 +31,13 @@ class Monitoring(Cog):
 
     def __init__(self, bot, *args, **kwargs):
         super().__init__(bot, *args, **kwargs)
-        self.ws_send_timings = []
-        self.ws_recv_timings = []
-        self.message_timings = []
-        self.command_timings = []
-        self.command_error_timings = []
-        self.command_completion_timings = []
+        retention = EVENTS_RETENTION.total_seconds()
+        self.ws_send_events = EventCounter(retention)
+        self.ws_recv_events = EventCounter(retention)
+        self.message_events = EventCounter(retention)
+        self.command_events = EventCounter(retention)
+        self.command_error_events = EventCounter(retention)
+        self.command_completion_events = EventCounter(retention)
         self.background_loop.start()
 
     def cog_unload(self):
@@ -84,6 +45,7 @@ class Monitoring(Cog):
 
     @tasks.loop(minutes=10)
     async def background_loop(self):
+        attribute_queries("loop:Monitoring.background_loop")
         await self.save_statistics_to_database()
 
     @background_loop.before_loop
@@ -91,34 +53,18 @@ class Monitoring(Cog):
         await self.bot.wait_until_ready()
         await asyncio.sleep(DB_MEASURE_INTERVAL.total_seconds())
 
-    async def get_statistics(
-        self, over=DB_MEASURE_INTERVAL, delete_older_than=timedelta(hours=1)
-    ):
-        now = get_now()
-        count_predicate = get_predicate(over, now)
-        keep_predicate = get_predicate(delete_older_than, now)
+    async def get_statistics(self, over=DB_MEASURE_INTERVAL):
+        over_seconds = over.total_seconds()
 
         stats = {
             # Event counts
-            "measure_interval": over.total_seconds(),
-            "ws_send": filter_count_event_list(
-                self.ws_send_timings, count_predicate, keep_predicate
-            ),
-            "ws_recv": filter_count_event_list(
-                self.ws_recv_timings, count_predicate, keep_predicate
-            ),
-            "messages": filter_count_event_list(
-                self.message_timings, count_predicate, keep_predicate
-            ),
-            "commands": filter_count_event_list(
-                self.command_timings, count_predicate, keep_predicate
-            ),
-            "command_errors": filter_count_event_list(
-                self.command_error_timings, count_predicate, keep_predicate
-            ),
-            "command_completions": filter_count_event_list(
-                self.command_completion_timings, count_predicate, keep_predicate
-            ),
+            "measure_interval": over_seconds,
+            "ws_send": self.ws_send_events.count(over_seconds),
+            "ws_recv": self.ws_recv_events.count(over_seconds),
+            "messages": self.message_events.count(over_seconds),
+            "commands": self.command_events.count(over_seconds),
+            "command_errors": self.command_error_events.count(over_seconds),
+            "command_completions": self.command_completion_events.count(over_seconds),
             # Curent state
             "guilds": len(self.bot.guilds),
             "users": len(self.bot.users),
@@ -133,30 +79,30 @@ class Monitoring(Cog):
     async def save_statistics_to_database(self):
         await BotState.create(**await self.get_statistics())
 
-    # These are all "dumb" event listeners that record the time every time an event is triggered.
+    # These are all "dumb" event listeners that count every event in the current second.
     @Cog.listener()
     async def on_socket_raw_send(self, payload: Union[str, bytes]):
-        self.ws_send_timings.append(get_now())
+        self.ws_send_events.add()
 
     @Cog.listener()
     async def on_socket_raw_receive(self, payload: Union[str, bytes]):
-        self.ws_recv_timings.append(get_now())
+        self.ws_recv_events.add()
 
     @Cog.listener()
     async def on_message(self, message: discord.Message):
-        self.message_timings.append(get_now())
+        self.message_events.add()
 
     @Cog.listener()
     async def on_command(self, ctx: MyContext):
-        self.command_timings.append(get_now())
+        self.command_events.add()
 
     @Cog.listener()
     async def on_command_error(self, ctx: MyContext, error: CommandError):
-        self.command_error_timings.append(get_now())
+        self.command_error_events.add()
 
     @Cog.listener()
     async def on_command_completion(self, ctx: MyContext):
-        self.command_completion_timings.append(get_now())
+        self.command_completion_events.add()
 
 
 setup = Monitoring.setup
@@ -19,6 +19,7 @@ from utils.checks import NotInChannel, NotInServer
 from utils.cog_class import Cog
 from utils.concurrency import dont_block
 from utils.ctx_class import MyContext
+from utils.db_instrumentation import attribute_queries
 from utils.models import (
     AccessLevel,
     DiscordUser,
@@ -238,6 +239,7 @@ class PrivateMessagesSupport(Cog):
         Check for age of the last message sent in the channel.
         If it's too old, consider the channel inactive and close the ticket.
         """
+        attribute_queries("loop:PrivateMessagesSupport.background_loop")
         category = await self.get_forwarding_category()
         now = timezone.now()
         one_day_ago = now - datetime.timedelta(days=1)
@@ -3,11 +3,31 @@ from typing import Optional, Union
 
 import aiohttp_cors
 from aiohttp import web
-from aiohttp.web_exceptions import HTTPForbidden, HTTPNotFound
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPForbidden, HTTPNotFound
 from discord.ext.commands import Group
 
 from utils.cog_class import Cog
-from utils.models import AccessLevel, DiscordChannel, Player, get_from_db
+from utils.db_instrumentation import attribute_queries
+from utils.http_cache import ResponseCache
+from utils.latency import COMMAND_LATENCIES
+from utils.leaderboards import decode_cursor, encode_cursor
+from utils.metrics import METRICS
+from utils.models import (
+    AccessLevel,
+    DiscordChannel,
+    Player,
+    get_channel_leaderboard,
+    get_from_db,
+)
+
+DUCKS_ALIVE = METRICS.gauge(
+    "duckhunt_ducks_alive", "Ducks currently spawned, by shard.", ["shard"]
+)
+WS_LATENCY = METRICS.gauge(
+    "duckhunt_websocket_latency_seconds",
+    "Latency between a heartbeat and its acknowledgement, by shard.",
+    ["shard"],
+)
 
 
 class RestAPI(Cog):
@@ -20,7 +40,11 @@ class RestAPI(Cog):
     `/api/channels/{channel_id}`  [Authentication required] -> Returns information about the channel, like the ducks currently spawned.
     `/api/channels/{channel_id}/settings`  [Authentication required] -> Returns channel settings
     `/api/channels/{channel_id}/top` [No authentication required] -> Returns the top scores (all players on the channel and some info about players)
+    `/api/channels/{channel_id}/top?limit=100&after=...` [No authentication required] -> Returns a page of the top scores, `next` is the `after` value of the next page
     `/api/channels/{channel_id}/player/{player_id}` [No authentication required] -> Returns *all* the data for a specific user
+    `/api/commands/latencies` [Global Authentication required] -> Returns the commands latency percentiles, by phase, over the last hour
+    `/api/spawn_loop?ticks=300` [Global Authentication required] -> Returns the duration of the last ducks spawning loop iterations, and where the time went
+    `/api/metrics` [Global Authentication required] -> Returns the bot metrics, in the Prometheus text format
 
     **Authentication**:
 
@@ -34,20 +58,33 @@ class RestAPI(Cog):
     Api keys (local or global) are uuid4, and look like this : `d84af260-c806-4066-8387-1d5144b7fa72`
     """
 
+    logger_subsystem = "api"
+
     def __init__(self, bot, *args, **kwargs):
         super().__init__(bot, *args, **kwargs)
 
     async def cog_load(self):
-        self.app = web.Application()
+        self.response_cache = ResponseCache()
+        self.app = web.Application(
+            middlewares=[self.queries_middleware, self.response_cache.middleware]
+        )
         self.cors = aiohttp_cors.setup(self.app)
-        self.runner = web.AppRunner(self.app, access_log=self.bot.logger.logger)
+        self.runner = web.AppRunner(self.app, access_log=self.logger.logger)
         self.site = None
+        METRICS.add_collector(self.collect_metrics)
         self.bot.loop.create_task(self.run())
 
     async def cog_unload(self):
-        self.bot.logger.info("DuckHunt JSON API is shutting down...")
+        self.logger.info("DuckHunt JSON API is shutting down...")
+        METRICS.remove_collector(self.collect_metrics)
         self.bot.loop.create_task(self.site.stop())
 
+    @web.middleware
+    async def queries_middleware(self, request: web.Request, handler):
+        route = request.match_info.route
+        attribute_queries(f"api:{route.resource.canonical if route.resource else request.path}")
+        return await handler(request)
+
     async def authenticate_request(self, request, channel=None):
         api_key = request.headers.get("Authorization")
         if api_key is None:
@@ -166,6 +203,9 @@ class RestAPI(Cog):
         if not channel:
             raise HTTPNotFound(reason="Unknown channel")
 
+        if "limit" in request.query or "after" in request.query:
+            return await self.channel_top_page(request, channel)
+
         players = (
             await Player.all()
             .filter(channel__discord_id=channel.id)
@@ -188,6 +228,44 @@ class RestAPI(Cog):
             [player.serialize(serialize_fields=fields) for player in players]
         )
 
+    async def channel_top_page(self, request, channel):
+        """
+        /channels/<channel_id>/top?limit=<limit>&after=<cursor>
+
+        Get a page of the players of a channel, ordered by experience, from the channel leaderboard.
+        """
+        try:
+            limit = min(int(request.query.get("limit", 100)), 500)
+            after = request.query.get("after")
+            cursor = decode_cursor(after) if after else None
+        except ValueError:
+            raise HTTPBadRequest(reason="Invalid limit or after parameter")
+
+        if limit < 1:
+            raise HTTPBadRequest(reason="Invalid limit or after parameter")
+
+        leaderboard = await get_channel_leaderboard(channel.id)
+
+        if not len(leaderboard):
+            raise HTTPNotFound(reason="Unknown channel in database")
+
+        offset, entries = leaderboard.page_after(cursor, limit)
+
+        if entries and offset + len(entries) < len(leaderboard):
+            next_cursor = encode_cursor(entries[-1])
+        else:
+            next_cursor = None
+
+        return web.json_response(
+            {
+                "total": len(leaderboard),
+                "players": [
+                    entry.serialize(rank) for rank, entry in enumerate(entries, start=offset + 1)
+                ],
+                "next": next_cursor,
+            }
+        )
+
     async def player_info(self, request):
         """
         /channels/<channel_id>/player/<player_id>
@@ -272,6 +350,18 @@ class RestAPI(Cog):
 
         return web.json_response(help_dict)
 
+    async def commands_latencies(self, request):
+        """
+        /commands/latencies
+
+        Get the latency percentiles (in seconds) of the commands used during the last hour, for each phase of the
+        commands: prefix, context, checks, concurrency (waiting for the previous command in the channel), callback,
+        db (time spent on database queries during the other phases) and total.
+        """
+        await self.authenticate_request(request)
+
+        return web.json_response(COMMAND_LATENCIES.stats())
+
     async def status(self, request):
         """
         /status
@@ -315,7 +405,7 @@ class RestAPI(Cog):
         try:
             total_members = sum((g.member_count for g in self.bot.available_guilds))
         except:
-            self.bot.logger.exception("Couldn't get total member count.")
+            self.logger.exception("Couldn't get total member count.")
             total_members = 0
 
         return web.json_response(
@@ -336,6 +426,59 @@ class RestAPI(Cog):
             }
         )
 
+    async def spawn_loop(self, request):
+        """
+        /spawn_loop?ticks=<ticks>
+
+        Get the percentiles of the ducks spawning loop iterations duration, lag and phases, and the last iterations.
+        """
+        await self.authenticate_request(request)
+
+        ducks_spawning_cog = self.bot.get_cog("DucksSpawning")
+        if ducks_spawning_cog is None:
+            raise HTTPNotFound(reason="Ducks aren't spawning")
+        profiler = ducks_spawning_cog.profiler
+
+        try:
+            ticks = max(1, min(int(request.query.get("ticks", 300)), profiler.history.maxlen))
+        except ValueError:
+            raise HTTPBadRequest(reason="Invalid ticks parameter")
+
+        return web.json_response(
+            {
+                **profiler.summary(ticks),
+                # Creating the ducks, in the spawn tasks, over the last hour
+                "construction": ducks_spawning_cog.constructions.merged().summary(),
+                "last_ticks": [tick.serialize() for tick in profiler.last(ticks)],
+            }
+        )
+
+    def collect_metrics(self):
+        DUCKS_ALIVE.clear()
+        for shard_id in self.bot.shards:
+            DUCKS_ALIVE.labels(shard_id).set(0)
+        for channel, ducks in self.bot.ducks_spawned.items():
+            if ducks:
+                DUCKS_ALIVE.labels(channel.guild.shard_id).inc(len(ducks))
+
+        WS_LATENCY.clear()
+        for shard_id, latency in self.bot.latencies:
+            WS_LATENCY.labels(shard_id).set(latency)
+
+    async def metrics(self, request):
+        """
+        /metrics
+
+        Get the bot metrics (commands, database queries, spawning loop, webhooks and websocket latencies) in the
+        Prometheus text exposition format.
+        """
+        await self.authenticate_request(request)
+
+        return web.Response(
+            body=METRICS.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
     async def run(self):
         # Don't wait for ready to avoid blocking the website
         # await self.bot.wait_until_ready()
@@ -364,16 +507,26 @@ class RestAPI(Cog):
                 self.player_info,
             ),
             ("GET", f"{route_prefix}/help/commands", self.commands),
+            ("GET", f"{route_prefix}/commands/latencies", self.commands_latencies),
             ("GET", f"{route_prefix}/status", self.status),
             ("GET", f"{route_prefix}/stats", self.stats),
+            ("GET", f"{route_prefix}/spawn_loop", self.spawn_loop),
+            ("GET", f"{route_prefix}/metrics", self.metrics),
         ]
 
+        # Public routes, that return the same thing to everyone: cached for that many seconds.
+        self.response_cache.cache_route(self.channel_top, ttl=30, query_params=["limit", "after"])
+        self.response_cache.cache_route(self.player_info, ttl=30)
+        self.response_cache.cache_route(self.commands, ttl=10 * 60)
+        self.response_cache.cache_route(self.status, ttl=15)
+        self.response_cache.cache_route(self.stats, ttl=60)
+
         if not botlist_cog:
-            self.bot.logger.error("API was loaded before the bots_list cog")
+            self.logger.error("API was loaded before the bots_list cog")
         else:
             routes += await botlist_cog.get_routes(f"{route_prefix}/votes")
 
-        self.bot.logger.debug(f"Defined routes {routes}")
+        self.logger.debug(f"Defined routes {routes}")
 
         for route_method, route_path, route_coro in routes:
             resource = self.cors.add(self.app.router.add_resource(route_path))
@@ -396,7 +549,7 @@ class RestAPI(Cog):
         self.site = web.TCPSite(self.runner, listen_ip, listen_port)
         await self.site.start()
         # noinspection HttpUrlsUsage
-        self.bot.logger.info(
+        self.logger.info(
             f"DuckHunt JSON API listening on http://{listen_ip}:{listen_port}"
         )
 
@@ -38,6 +38,14 @@ class SettingsCommands(Cog):
     help_color = "red"
     help_priority = 4
 
+    async def cog_after_invoke(self, ctx: MyContext):
+        # Templates and the ducks_time_to_live setting change when the ducks already spawned will leave.
+        if ctx.channel in self.bot.ducks_spawned:
+            db_channel = await get_from_db(ctx.channel)
+            ducks.reschedule_departures(
+                self.bot, ctx.channel, db_channel.ducks_time_to_live
+            )
+
     @commands.group(aliases=["set"])
     async def settings(self, ctx: MyContext):
         """
@@ -8,19 +8,42 @@ from utils import checks, models
 from utils.achievements import achievements
 from utils.cog_class import Cog
 from utils.ctx_class import MyContext
-from utils.models import DiscordChannel, Player, get_from_db, get_player
+from utils.leaderboards import ChannelLeaderboard, LeaderboardEntry
+from utils.models import (
+    DiscordChannel,
+    Player,
+    forget_players,
+    get_channel_leaderboard,
+    get_from_db,
+    get_player,
+)
 
 
 def _(message):
     return message
 
 
-class TopScoresSource(menus.ListPageSource):
-    def __init__(self, ctx: MyContext, data, title):
-        super().__init__(data, per_page=6)
+class TopScoresSource(menus.PageSource):
+    per_page = 6
+
+    def __init__(self, ctx: MyContext, leaderboard: ChannelLeaderboard, title):
         self.ctx = ctx
+        self.leaderboard = leaderboard
         self.title = title
 
+    def is_paginating(self):
+        return len(self.leaderboard) > self.per_page
+
+    def get_max_pages(self):
+        pages, left_over = divmod(len(self.leaderboard), self.per_page)
+        if left_over:
+            pages += 1
+        return max(1, pages)
+
+    async def get_page(self, page_number):
+        # Only the page shown is read from the leaderboard.
+        return self.leaderboard.page(page_number * self.per_page, self.per_page)
+
     async def format_page(self, menu, entries):
         _ = await self.ctx.get_translate_function()
         e = discord.Embed()
@@ -31,9 +54,9 @@ class TopScoresSource(menus.ListPageSource):
         offset = menu.current_page * self.per_page
 
         for i, item in enumerate(entries, start=offset):
-            item: Player
+            item: LeaderboardEntry
             e.add_field(
-                name=f"**{i + 1}** - {item.member.user.name}#{item.member.user.discriminator}",
+                name=f"**{i + 1}** - {item.name}#{item.discriminator}",
                 value=_("{exp} experience", exp=item.experience),
                 inline=False,
             )
@@ -44,10 +67,7 @@ async def show_topscores_pages(ctx, title: str):
     pages = menus.MenuPages(
         source=TopScoresSource(
             ctx,
-            await Player.all()
-            .filter(channel__discord_id=ctx.channel.id)
-            .order_by("-experience")
-            .prefetch_related("member__user"),
+            await get_channel_leaderboard(ctx.channel.id),
             title,
         ),
         clear_reactions_after=True,
@@ -733,6 +753,7 @@ class StatisticsCommands(Cog):
                 db_channel = await get_from_db(ctx.channel)
 
             await Player.filter(channel=db_channel).delete()
+            forget_players(db_channel.discord_id)
 
             await ctx.send(
                 _(
@@ -0,0 +1,45 @@
+"""
+Weights of the ducks picked by AliasSampler.
+
+Run from the src directory: python -m pytest tests
+"""
+import collections
+import pathlib
+import random
+import sys
+
+import pytest
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils.alias_sampler import AliasSampler  # noqa: E402
+
+
+def test_alias_tables_match_the_weights():
+    weights = [5, 1, 0, 3, 1]
+    sampler = AliasSampler(weights)
+
+    count = len(weights)
+    total = sum(weights)
+    for index, weight in enumerate(weights):
+        probability = sampler.probabilities[index] / count
+        probability += sum(
+            (1 - sampler.probabilities[other]) / count
+            for other in range(count)
+            if sampler.aliases[other] == index and other != index
+        )
+        assert probability == pytest.approx(weight / total)
+
+
+def test_alias_sampling_follows_the_weights():
+    random.seed(3)
+    weights = [1, 2, 0, 7]
+    sampler = AliasSampler(weights)
+
+    samples = 100_000
+    counts = collections.Counter(sampler.sample() for _ in range(samples))
+
+    assert counts[2] == 0
+    for index, weight in enumerate(weights):
+        assert counts[index] / samples == pytest.approx(weight / sum(weights), abs=0.01)
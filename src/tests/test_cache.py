@@ -0,0 +1,101 @@
+"""
+Time-to-live and least recently used eviction of TTLCache.
+
+Run from the src directory: python -m pytest tests
+"""
+import pathlib
+import sys
+
+import pytest
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils import cache  # noqa: E402
+from utils.cache import TTLCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    ttl_cache = TTLCache(ttl=10)
+    ttl_cache.set("a", 1)
+
+    clock.now += 10
+    assert ttl_cache.get("a") == 1
+
+    clock.now += 0.1
+    assert ttl_cache.get("a") is None
+    assert "a" not in ttl_cache
+    assert (ttl_cache.hits, ttl_cache.misses, ttl_cache.expirations) == (1, 1, 1)
+
+
+def test_sliding_ttl_restarts_on_hits(clock):
+    ttl_cache = TTLCache(ttl=10, sliding=True)
+    ttl_cache.set("a", 1)
+
+    for _ in range(5):
+        clock.now += 8
+        assert ttl_cache.get("a") == 1
+
+    clock.now += 11
+    assert ttl_cache.get("a") is None
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    ttl_cache = TTLCache(maxsize=3)
+    for key in "abc":
+        ttl_cache.set(key, key)
+
+    # "a" becomes the most recently used, "b" the least.
+    assert ttl_cache.get("a") == "a"
+    ttl_cache.set("d", "d")
+
+    assert "b" not in ttl_cache
+    assert [key for key in "acd" if key in ttl_cache] == ["a", "c", "d"]
+    assert ttl_cache.evictions == 1
+
+
+def test_peek_does_not_touch_the_lru_order(clock):
+    ttl_cache = TTLCache(maxsize=2)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+
+    assert ttl_cache.peek("a") == 1
+    ttl_cache.set("c", 3)
+
+    assert "a" not in ttl_cache
+    assert ttl_cache.hits == 0
+
+
+def test_pop_where_removes_matching_entries(clock):
+    ttl_cache = TTLCache()
+    for i in range(10):
+        ttl_cache.set(i, i * i)
+
+    assert ttl_cache.pop_where(lambda key, value: value > 40) == 3
+    assert len(ttl_cache) == 7
+
+
+def test_values_do_not_touch_the_lru_order(clock):
+    ttl_cache = TTLCache(maxsize=2, ttl=10)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    clock.now += 11
+
+    # Expired values are listed too.
+    assert ttl_cache.values() == [1, 2]
+    assert (ttl_cache.hits, ttl_cache.misses) == (0, 0)
@@ -0,0 +1,48 @@
+"""
+Lookup of the compiled catalogs by CatalogsRegistry.
+
+Run from the src directory: python -m pytest tests
+"""
+import pathlib
+import sys
+
+import polib
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils.translations import CatalogsRegistry  # noqa: E402
+
+
+def write_catalog(localedir: pathlib.Path, language: str, messages: dict):
+    po = polib.POFile()
+    po.metadata = {"Content-Type": "text/plain; charset=utf-8"}
+    for message_id, message_string in messages.items():
+        po.append(polib.POEntry(msgid=message_id, msgstr=message_string))
+
+    directory = localedir / language / "LC_MESSAGES"
+    directory.mkdir(parents=True)
+    po.save_as_mofile(str(directory / "messages.mo"))
+
+
+def test_regional_catalogs_fall_back_on_the_language_catalog(tmp_path):
+    write_catalog(tmp_path, "pt", {"Hello": "Olá", "Duck": "Pato"})
+    write_catalog(tmp_path, "pt_BR", {"Hello": "Oi"})
+
+    registry = CatalogsRegistry(str(tmp_path))
+
+    assert registry.get("pt-BR").gettext("Hello") == "Oi"
+    assert registry.get("pt-BR").gettext("Duck") == "Pato"
+    assert registry.get("pt-BR").gettext("Bang") == "Bang"
+
+    # The language catalog itself isn't changed by the chaining.
+    assert registry.get("pt").gettext("Hello") == "Olá"
+    assert registry.get("pt").gettext("Bang") == "Bang"
+
+
+def test_unknown_languages_are_not_translated(tmp_path):
+    write_catalog(tmp_path, "fr", {"Hello": "Bonjour"})
+
+    registry = CatalogsRegistry(str(tmp_path))
+
+    assert registry.get("xx").gettext("Hello") == "Hello"
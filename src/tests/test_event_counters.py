@@ -0,0 +1,61 @@
+"""
+Windows and retention of EventCounter.
+
+Run from the src directory: python -m pytest tests
+"""
+import pathlib
+import sys
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils.event_counters import EventCounter  # noqa: E402
+
+NOW = 1_640_995_200
+
+
+def test_events_are_counted_by_window():
+    counter = EventCounter(retention=3600)
+    counter.add(now=NOW - 3000)
+    counter.add(2, now=NOW - 100)
+    counter.add(now=NOW - 10)
+    counter.add(now=NOW)
+
+    assert counter.count(over=1, now=NOW) == 1
+    assert counter.count(over=60, now=NOW) == 2
+    assert counter.count(over=600, now=NOW) == 4
+    assert counter.count(now=NOW) == 5
+    assert counter.count(over=0, now=NOW) == 0
+
+
+def test_events_older_than_the_retention_are_forgotten():
+    counter = EventCounter(retention=60)
+    counter.add(5, now=NOW)
+
+    assert counter.count(now=NOW + 59) == 5
+    assert counter.count(now=NOW + 60) == 0
+
+    # The slot is reused by a bucket a whole retention later.
+    counter.add(now=NOW + 60)
+    assert counter.count(now=NOW + 60) == 1
+    assert counter.count(over=3600, now=NOW + 60) == 1
+
+
+def test_buckets_group_events_by_resolution():
+    counter = EventCounter(retention=600, resolution=60)
+    assert counter.size == 10
+
+    counter.add(now=NOW)
+    counter.add(now=NOW + 59)
+    counter.add(now=NOW + 60)
+
+    assert counter.count(over=60, now=NOW + 60) == 1
+    assert counter.count(over=120, now=NOW + 60) == 3
+
+
+def test_clear_forgets_everything():
+    counter = EventCounter(retention=60)
+    counter.add(3, now=NOW)
+    counter.clear()
+
+    assert counter.count(now=NOW) == 0
@@ -0,0 +1,78 @@
+"""
+Ordering and lag accounting of ExpiryQueue.
+
+Run from the src directory: python -m pytest tests
+"""
+import pathlib
+import sys
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils.expiry_queue import ExpiryQueue  # noqa: E402
+
+
+def pop_all(queue: ExpiryQueue, now: float) -> list:
+    items = []
+    while (item := queue.pop_expired(now)) is not None:
+        items.append(item)
+    return items
+
+
+def test_items_pop_in_expiry_order():
+    queue = ExpiryQueue()
+    for item, expires_at in [("c", 30), ("a", 10), ("d", 40), ("b", 20)]:
+        queue.push(item, expires_at)
+
+    assert queue.next_expiry() == 10
+    assert pop_all(queue, 25) == ["a", "b"]
+    assert pop_all(queue, 100) == ["c", "d"]
+    assert queue.next_expiry() is None
+
+
+def test_items_expiring_together_pop_in_insertion_order():
+    queue = ExpiryQueue()
+    for item in range(5):
+        queue.push(item, 10)
+
+    assert pop_all(queue, 10) == [0, 1, 2, 3, 4]
+
+
+def test_items_do_not_pop_before_they_expire():
+    queue = ExpiryQueue()
+    queue.push("a", 10)
+
+    assert queue.pop_expired(9.99) is None
+    assert queue.lag(9.99) == 0.0
+    assert queue.pop_expired(10) == "a"
+
+
+def test_discarded_items_are_skipped():
+    queue = ExpiryQueue()
+    entry = queue.push("a", 10)
+    queue.push("b", 20)
+    queue.discard(entry)
+    # Discarding twice, or nothing, doesn't count.
+    queue.discard(entry)
+    queue.discard(None)
+
+    assert queue.next_expiry() == 20
+    assert pop_all(queue, 30) == ["b"]
+    assert queue.discarded == 1
+
+
+def test_lag_is_counted():
+    queue = ExpiryQueue()
+    queue.push("a", 10)
+    queue.push("b", 15)
+    queue.push("c", 50)
+
+    assert queue.lag(20) == 10
+    assert queue.backlog(20) == 2
+
+    pop_all(queue, 20)
+    stats = queue.stats(20)
+    assert stats["popped"] == 2
+    assert stats["max_lag"] == 10
+    assert stats["average_lag"] == 7.5
+    assert stats["backlog"] == 0
@@ -0,0 +1,72 @@
+"""
+Loading and matching of the landmines words index, on an in-memory SQLite database.
+
+Run from the src directory: python -m pytest tests
+"""
+import asyncio
+import pathlib
+import sys
+
+from tortoise import Tortoise
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils import models  # noqa: E402
+from utils.landmines_index import LandminesIndex  # noqa: E402
+
+
+def run_with_db(test):
+    async def run():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["utils.models"]})
+        await Tortoise.generate_schemas()
+        try:
+            await test()
+        finally:
+            await Tortoise.close_connections()
+            models.IDENTITY_CACHE.clear()
+
+    asyncio.run(run())
+
+
+async def place_landmine(guild_id: int, word: str) -> models.LandminesPlaced:
+    db_guild, _ = await models.DiscordGuild.get_or_create(discord_id=guild_id, defaults={"name": "Guild"})
+    db_user, _ = await models.DiscordUser.get_or_create(
+        discord_id=3, defaults={"name": "Hunter", "discriminator": "0001"}
+    )
+    db_member, _ = await models.DiscordMember.get_or_create(guild=db_guild, user=db_user)
+    db_data, _ = await models.LandminesUserData.get_or_create(member=db_member)
+    return await models.LandminesPlaced.create(placed_by=db_data, word=word, value=50)
+
+
+def test_concurrent_matches_wait_for_the_guild_to_load():
+    async def test():
+        landmine = await place_landmine(1, "hello")
+        index = LandminesIndex()
+
+        results = await asyncio.gather(*(index.match(1, ["hello"]) for _ in range(5)))
+
+        assert results == [{landmine.pk}] * 5
+        assert index.stats()["guilds"] == 1
+
+    run_with_db(test)
+
+
+def test_landmines_placed_while_loading_are_indexed():
+    async def test():
+        first = await place_landmine(1, "hello")
+        index = LandminesIndex()
+
+        load = asyncio.create_task(index.match(1, ["hello"]))
+        # Let the load start its query.
+        await asyncio.sleep(0)
+        assert 1 in index._loading
+        index._add(1, "world", 1000)
+
+        assert await load == {first.pk}
+        assert await index.match(1, ["world"]) == {1000}
+
+        index._remove(1000)
+        assert await index.match(1, ["world"]) == set()
+
+    run_with_db(test)
@@ -0,0 +1,150 @@
+"""
+Dirty fields tracking and caching of the players, on an in-memory SQLite database.
+
+Run from the src directory: python -m pytest tests
+"""
+import asyncio
+import pathlib
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import discord
+from tortoise import Tortoise
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils import models  # noqa: E402
+from utils.models import Player, TrackedDefaultDict  # noqa: E402
+
+
+def fake(cls, **attributes):
+    mock = MagicMock(spec=cls)
+    for name, value in attributes.items():
+        setattr(mock, name, value)
+    return mock
+
+
+def run_with_db(test):
+    async def run():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["utils.models"]})
+        await Tortoise.generate_schemas()
+        try:
+            await test()
+        finally:
+            await Tortoise.close_connections()
+            models.PLAYERS_CACHE.clear()
+            models.IDENTITY_CACHE.clear()
+
+    asyncio.run(run())
+
+
+def make_hunter(user_id: int = 3, channel_id: int = 2):
+    guild = fake(discord.Guild, id=1, name="Guild", shard_id=0)
+    channel = fake(discord.TextChannel, id=channel_id, name="channel", guild=guild)
+    member = fake(discord.Member, id=user_id, name="Hunter", discriminator="0001", guild=guild)
+    return member, channel
+
+
+def test_tracked_default_dict_reads_are_not_changes():
+    powerups = TrackedDefaultDict(int, {"sight": 12})
+
+    assert powerups["dead"] == 0
+    assert powerups["sight"] == 12
+    assert "dead" in powerups
+    assert not powerups.changed
+
+    powerups["dead"] += 1
+    assert powerups.changed
+
+
+def test_read_only_access_leaves_player_clean():
+    async def test():
+        member, channel = make_hunter()
+        await models.get_player(member, channel)
+
+        db_player = await Player.get(member__user__discord_id=member.id)
+        assert db_player.get_dirty_fields() == []
+
+        db_player.is_powerup_active("dead")
+        db_player.shooting_stats["shots_without_ducks"]
+        assert db_player.get_dirty_fields() == []
+
+        db_player.shooting_stats["shots_without_ducks"] += 1
+        assert db_player.get_dirty_fields() == ["shooting_stats"]
+
+    run_with_db(test)
+
+
+def test_players_cache_hit_after_read_only_command():
+    async def test():
+        member, channel = make_hunter()
+        shard_stats = models.PLAYERS_CACHE_SHARD_STATS[0]
+        shard_stats.clear()
+
+        db_player = await models.get_player(member, channel)
+        assert shard_stats["misses"] == 1
+
+        # What a command that doesn't change the player does, like a bang without a duck to shoot at.
+        db_player.is_powerup_active("dead")
+        db_player.is_powerup_active("sight")
+        db_player.killed["normal"]
+
+        assert await models.get_player(member, channel) is db_player
+        assert shard_stats["hits"] == 1
+
+    run_with_db(test)
+
+
+def test_no_giveback_for_new_players():
+    async def test():
+        member, channel = make_hunter()
+
+        with patch.object(Player, "maybe_giveback", AsyncMock()) as maybe_giveback:
+            await models.get_player(member, channel, giveback=True)
+            maybe_giveback.assert_not_awaited()
+
+            await models.get_player(member, channel, giveback=True)
+            maybe_giveback.assert_awaited_once()
+
+    run_with_db(test)
+
+
+def test_players_cache_signals_find_players_by_id():
+    async def test():
+        member, channel = make_hunter()
+        db_player = await models.get_player(member, channel)
+        key = (member.id, channel.id)
+
+        # Another copy of the row, loaded without its member, is saved: the cached one is stale.
+        copy = await Player.get(pk=db_player.pk)
+        copy.experience += 10
+        await copy.save()
+        assert key not in models.PLAYERS_CACHE
+        assert db_player.pk not in models.PLAYERS_CACHE._keys
+
+        db_player = await models.get_player(member, channel)
+        # Saving the cached instance itself keeps it.
+        copy = await Player.get(pk=db_player.pk)
+        with patch.object(models, "_player_cache_key", return_value=None):
+            await models._players_cache_on_save(Player, db_player, False, None, None)
+        assert models.PLAYERS_CACHE.peek(key) is db_player
+
+        await copy.delete()
+        assert key not in models.PLAYERS_CACHE
+        assert models.PLAYERS_CACHE._keys == {}
+
+    run_with_db(test)
+
+
+def test_players_cache_index_follows_evictions():
+    players_cache = models.PlayersCache(maxsize=2)
+    players = [fake(Player, pk=pk) for pk in range(3)]
+    for pk, db_player in enumerate(players):
+        players_cache.set((pk, 1), db_player)
+
+    assert players_cache._keys == {1: (1, 1), 2: (2, 1)}
+
+    players_cache.pop((1, 1))
+    players_cache.pop_where(lambda key, _db_player: key == (2, 1))
+    assert players_cache._keys == {}
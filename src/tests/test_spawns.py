@@ -0,0 +1,94 @@
+"""
+Planning of the ducks spawns: the daily budget and the spawn schedules.
+
+Run from the src directory: python -m pytest tests
+"""
+import collections
+import pathlib
+import random
+import sys
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils.models import DAY, HOUR, DucksLeft, SunState, night_ranges  # noqa: E402
+from utils.spawns_schedule import SpawnsSchedule  # noqa: E402
+
+# A midnight UTC
+MIDNIGHT = 1_640_995_200
+NIGHT_START_AT = 21 * HOUR
+NIGHT_END_AT = 6 * HOUR
+
+
+def is_night(timestamp: int) -> bool:
+    second = timestamp % DAY
+    return any(second in r for r in night_ranges(NIGHT_START_AT, NIGHT_END_AT))
+
+
+def test_budget_at_midnight_is_the_whole_day():
+    assert DucksLeft.compute_budget(100, NIGHT_START_AT, NIGHT_END_AT, MIDNIGHT) == (90, 10)
+
+
+def test_budget_only_decreases_during_the_day():
+    previous_day_ducks, previous_night_ducks = DucksLeft.compute_budget(
+        100, NIGHT_START_AT, NIGHT_END_AT, MIDNIGHT
+    )
+    for now in range(MIDNIGHT, MIDNIGHT + DAY, 5 * 60):
+        day_ducks, night_ducks = DucksLeft.compute_budget(100, NIGHT_START_AT, NIGHT_END_AT, now)
+        assert day_ducks <= previous_day_ducks
+        assert night_ducks <= previous_night_ducks
+        previous_day_ducks, previous_night_ducks = day_ducks, night_ducks
+
+
+def test_budget_is_capped_to_a_duck_every_five_seconds():
+    day_ducks, night_ducks = DucksLeft.compute_budget(10**6, 0, 0, MIDNIGHT)
+    assert day_ducks == DAY // 5
+    assert night_ducks == 0
+
+
+def test_schedule_is_sorted_and_within_ranges():
+    random.seed(1)
+    ranges = [range(100, 200), range(500, 600)]
+    schedule = SpawnsSchedule(MIDNIGHT, ranges, 150)
+
+    spawns = []
+    while schedule.next_at is not None:
+        spawns.append(schedule.next_at)
+        schedule.pop()
+
+    assert len(spawns) == 150
+    assert spawns == sorted(spawns)
+    assert all(any(spawn - MIDNIGHT in r for r in ranges) for spawn in spawns)
+
+
+def test_schedule_fits_a_duck_per_second_at_most():
+    schedule = SpawnsSchedule(MIDNIGHT, [range(10, 20)], 50)
+    assert schedule.left == 10
+
+    assert SpawnsSchedule(MIDNIGHT, [], 50).next_at is None
+
+
+def test_due_spawns_pop_in_order_and_match_the_budget():
+    random.seed(2)
+    now = MIDNIGHT + 3 * HOUR
+    budget = DucksLeft.compute_budget(500, NIGHT_START_AT, NIGHT_END_AT, now)
+    ducks_left = DucksLeft(None)
+    ducks_left.plan(now, DucksLeft.compute_ranges(NIGHT_START_AT, NIGHT_END_AT, now), budget)
+    assert (ducks_left.day_ducks, ducks_left.night_ducks) == budget
+
+    popped = collections.Counter()
+    previous_at = now
+    while ducks_left.next_spawn_at is not None:
+        spawn_at = ducks_left.next_spawn_at
+        assert previous_at <= spawn_at < MIDNIGHT + DAY
+
+        due = ducks_left.pop_due_spawns(spawn_at)
+        assert due
+        assert (SunState.NIGHT if is_night(spawn_at) else SunState.DAY) in due
+        assert ducks_left.next_spawn_at is None or ducks_left.next_spawn_at > spawn_at
+
+        popped.update(due)
+        previous_at = spawn_at
+
+    assert (popped[SunState.DAY], popped[SunState.NIGHT]) == budget
+    assert ducks_left.ducks_left == 0
@@ -0,0 +1,58 @@
+"""
+Health tracking of the webhooks pools.
+
+Run from the src directory: python -m pytest tests
+"""
+import pathlib
+import sys
+from unittest.mock import MagicMock
+
+import discord
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils.interaction import PooledWebhook, WebhookPool  # noqa: E402
+
+
+def make_pool(count: int) -> WebhookPool:
+    pool = WebhookPool(1)
+    for i in range(count):
+        url = f"https://discord.com/api/webhooks/{i}/token"
+        pool.webhooks[url] = PooledWebhook(MagicMock(spec=discord.Webhook, url=url))
+    return pool
+
+
+def test_a_single_healthy_webhook_is_enough():
+    pool = make_pool(1)
+
+    assert not pool.should_prewarm()
+
+
+def test_slow_sends_are_not_rate_limits():
+    pool = make_pool(1)
+    pooled = next(iter(pool.webhooks.values()))
+    pooled.record_latency(30)
+
+    assert pooled.healthy
+    assert not pool.should_prewarm()
+
+
+def test_rate_limited_or_deleted_webhooks_need_a_new_one():
+    pool = make_pool(2)
+    first, second = pool.webhooks.values()
+    first.record_rate_limit()
+    second.not_found += 1
+
+    assert pool.healthy_count == 0
+    assert pool.should_prewarm()
+    # Not again before PREWARM_INTERVAL.
+    assert not pool.should_prewarm()
+
+
+def test_no_more_webhooks_than_the_maximum():
+    pool = make_pool(WebhookPool.MAX_WEBHOOKS)
+    for pooled in pool.webhooks.values():
+        pooled.record_rate_limit()
+
+    assert not pool.should_prewarm()
@@ -0,0 +1,43 @@
+import random
+import typing
+
+
+class AliasSampler:
+    """
+    Pick a random index, weighted, in constant time (Walker's alias method).
+    Building the tables is O(n), so build them once and keep the sampler around.
+    """
+
+    __slots__ = ("probabilities", "aliases")
+
+    def __init__(self, weights: typing.Sequence[float]):
+        count = len(weights)
+        total = sum(weights)
+
+        # Scaled so that the average weight is 1
+        scaled = [weight * count / total for weight in weights]
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Whatever is left is 1, give or take floating point errors.
+
+    def sample(self) -> int:
+        index = random.randrange(len(self.probabilities))
+        if random.random() < self.probabilities[index]:
+            return index
+        else:
+            return self.aliases[index]
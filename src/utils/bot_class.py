@@ -1,4 +1,6 @@
+import asyncio
 import collections
+import time
 import typing
 from typing import Optional
 
@@ -12,9 +14,16 @@ from tortoise import timezone
 
 from utils import config
 from utils.ctx_class import MyContext
+from utils.db_instrumentation import QUERIES_SCOPE, attribute_queries
 from utils.events import Events
-from utils.logger import FakeLogger
-from utils.models import AccessLevel, DucksLeft, get_from_db, init_db_connection, DiscordUser
+from utils.expiry_queue import ExpiryQueue
+from utils.latency import COMMAND_LATENCIES, CommandTimings
+from utils.logger import QUEUE_SIZE, FakeLogger, init_logger
+from utils.models import AccessLevel, DucksLeft, get_from_db, init_db_connection, DiscordUser, write_behind
+from utils.outbound import OutboundQueues
+from utils.prefixes import PREFIXES
+from utils.translations import CATALOGS
+from utils.watchdog import LoopWatchdog
 
 if typing.TYPE_CHECKING:
     # Prevent circular imports
@@ -23,10 +32,17 @@ if typing.TYPE_CHECKING:
 
 class MyBot(AutoShardedBot):
     def __init__(self, *args, **kwargs):
-        self.logger = FakeLogger()
-        self.logger.debug("Running sync init")
         self.config: dict = {}
         self.reload_config()
+        logging_config = self.config.get("logging", {})
+        self.logger = FakeLogger(
+            init_logger(
+                json_lines=logging_config.get("json_lines", False),
+                queue_size=logging_config.get("queue_size", QUEUE_SIZE),
+            )
+        )
+        self.logger.configure_levels(logging_config)
+        self.logger.debug("Running sync init")
         # activity = discord.Game(self.config["bot"]["playing"])
         self.current_event: Events = Events.CALM
         activity = discord.Game(self.current_event.value[0])
@@ -46,11 +62,18 @@ class MyBot(AutoShardedBot):
         self.ducks_spawned: collections.defaultdict[
             discord.TextChannel, collections.deque["Duck"]
         ] = collections.defaultdict(collections.deque)
+        # Spawned ducks, by the time they will leave at
+        self.ducks_departures = ExpiryQueue()
+        # Messages sent by the bot on its own, in order, by channel
+        self.outbound = OutboundQueues(self)
         self.enabled_channels: typing.Dict[discord.TextChannel, DucksLeft] = {}
         self.concurrency = MaxConcurrency(number=1, per=BucketType.channel, wait=True)
         self.allow_ducks_spawning = True
+        self.before_invoke(self.on_callback_start)
+        self.after_invoke(self.on_callback_end)
 
         self._duckhunt_public_log = None
+        self.watchdog: Optional[LoopWatchdog] = None
 
         self.logger.debug("End of init, bot object is ready")
 
@@ -69,6 +92,8 @@ class MyBot(AutoShardedBot):
 
     def reload_config(self):
         self.config = config.load_config()
+        # The global prefixes may have changed
+        PREFIXES.clear()
 
     async def setup_hook(self):
         """
@@ -80,9 +105,23 @@ class MyBot(AutoShardedBot):
             aiohttp.ClientSession()
         )  # There is no need to call __aenter__, since that does nothing in that case
 
+        watchdog_config = self.config.get("event_loop_watchdog", {})
+        if watchdog_config.get("enable", False):
+            self.watchdog = LoopWatchdog(
+                asyncio.get_running_loop(),
+                interval=watchdog_config.get("interval", 1.0),
+                threshold=watchdog_config.get("threshold", 0.5),
+            )
+            self.watchdog.start()
+
         if self.config["database"]["enable"]:
             await init_db_connection(self.config["database"])
 
+        catalogs = CATALOGS.load()
+        self.logger.info(
+            f"Loaded {len(catalogs)} translation catalogs in {CATALOGS.load_duration * 1000:.1f}ms"
+        )
+
         for cog_name in self.config["cogs"]["cogs_to_load"]:
             try:
                 await self.load_extension(cog_name)
@@ -94,6 +133,11 @@ class MyBot(AutoShardedBot):
                     )
                 )
 
+    async def close(self):
+        if self.watchdog:
+            self.watchdog.stop()
+        await super().close()
+
     def get_logging_channel(self):
         if not self._duckhunt_public_log:
             config = self.config["duckhunt_public_log"]
@@ -121,6 +165,11 @@ class MyBot(AutoShardedBot):
             )
             return False
 
+    async def _run_event(self, coro, event_name: str, *args, **kwargs):
+        # Each listener runs in its own task: attribute its queries to it, like "event:Landmines.on_message".
+        attribute_queries(f"event:{getattr(coro, '__qualname__', event_name)}")
+        await super()._run_event(coro, event_name, *args, **kwargs)
+
     async def on_socket_event_type(self, event_type):
         self.socket_stats[event_type] += 1
 
@@ -131,11 +180,28 @@ class MyBot(AutoShardedBot):
         if message.author.bot:
             return  # ignore messages from other bots
 
+        timings = CommandTimings()
+        # Every event is handled in its own task, so this only counts the queries made for this message.
+        QUERIES_SCOPE.set(timings)
+
+        if not await PREFIXES.matches(self, message):
+            return  # Not a command, that's most messages.
+
+        context_started_at = time.perf_counter()
+        timings.add("prefix", context_started_at - timings.started_at)
         ctx = await self.get_context(message, cls=MyContext)
+        ctx.timings = timings
+        checks_started_at = time.perf_counter()
+        timings.add("context", checks_started_at - context_started_at)
+
+        if ctx.command:
+            attribute_queries(f"command:{ctx.command.qualified_name}")
+
         if ctx.prefix is not None:
             db_user = await get_from_db(ctx.author)
 
             access = db_user.get_access_level()
+            timings.add("checks", time.perf_counter() - checks_started_at)
 
             if access != AccessLevel.BANNED:
                 if ctx.command:
@@ -146,16 +212,46 @@ class MyBot(AutoShardedBot):
                     should_block = getattr(
                         ctx.command.callback, "block_concurrency", True
                     )
+                    should_coalesce_saves = getattr(
+                        ctx.command.callback, "coalesce_saves", False
+                    )
                 else:
                     should_block = True
+                    should_coalesce_saves = False
 
                 if should_block:
+                    # Commands wait for the previous command of the channel to finish.
+                    concurrency_started_at = time.perf_counter()
                     await self.concurrency.acquire(message)
+                    timings.add("concurrency", time.perf_counter() - concurrency_started_at)
+
+                timings.invoked_at = time.perf_counter()
+                try:
+                    if should_coalesce_saves:
+                        try:
+                            async with write_behind():
+                                await self.invoke(ctx)
+                        except Exception as e:
+                            # invoke() handles the command errors, this is the deferred saves failing.
+                            self.dispatch("command_error", ctx, commands.CommandInvokeError(e))
+                    else:
+                        await self.invoke(ctx)
+                finally:
+                    if should_block:
+                        await self.concurrency.release(message)
 
-                await self.invoke(ctx)
+                if ctx.command:
+                    timings.finish()
+                    COMMAND_LATENCIES.record(ctx.command.qualified_name, timings)
 
-                if should_block:
-                    await self.concurrency.release(message)
+    async def on_callback_start(self, ctx: MyContext):
+        # Before invoke hook. Groups call it again for their subcommand, the first call is the one that counts.
+        if ctx.timings.callback_started_at is None:
+            ctx.timings.callback_started_at = time.perf_counter()
+
+    async def on_callback_end(self, ctx: MyContext):
+        # After invoke hook.
+        ctx.timings.callback_ended_at = time.perf_counter()
 
     async def on_command(self, ctx: MyContext):
         db_user = await get_from_db(ctx.author, as_user=True)
@@ -194,9 +290,17 @@ class MyBot(AutoShardedBot):
         ctx.logger.info(f"{ctx.message.clean_content}")
 
     async def on_interaction(self, interaction: discord.Interaction):
-        data = interaction.data
+        data = interaction.data or {}
         self.logger.info(
-            f"Interaction received: {data}",
+            f"Interaction received: {interaction.type.name} {data.get('name') or data.get('custom_id') or ''}",
+            guild=interaction.guild,
+            channel=interaction.channel,
+            member=interaction.user,
+        )
+        # The full payload can be large, and is only useful when debugging.
+        self.logger.debug(
+            "Interaction payload: %s",
+            data,
             guild=interaction.guild,
             channel=interaction.channel,
             member=interaction.user,
@@ -245,17 +349,5 @@ class MyBot(AutoShardedBot):
 
 
 async def get_prefix(bot: MyBot, message: discord.Message):
-    forced_prefixes = [p + " " for p in bot.config["bot"]["prefixes"]] + bot.config["bot"]["prefixes"]
-
-    if not message.guild:
-        # Need no prefix when in DMs
-        return commands.when_mentioned_or(*forced_prefixes, "")(bot, message)
-
-    else:
-        if bot.config["database"]["enable"]:
-            db_guild = await get_from_db(message.guild)
-            guild_prefix = db_guild.prefix
-            if guild_prefix is not None:
-                forced_prefixes = [guild_prefix] + forced_prefixes
-
-        return commands.when_mentioned_or(*forced_prefixes)(bot, message)
+    compiled = await PREFIXES.resolve(bot, message)
+    return compiled.prefixes
@@ -0,0 +1,130 @@
+import collections
+import time
+import typing
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A bounded mapping that forgets its least recently used entries, and the entries that have been stored for longer
+    than a time-to-live. Hits and misses are counted, so that you can check the cache is actually useful.
+
+    With `sliding=True`, the time-to-live restarts on every hit, so entries are only forgotten after `ttl` seconds
+    of inactivity.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 600, sliding: bool = False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sliding = sliding
+
+        # key -> (expires_at, value), ordered from the least to the most recently used
+        self._data: collections.OrderedDict[
+            typing.Hashable, typing.Tuple[float, typing.Any]
+        ] = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        try:
+            expires_at, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        now = time.monotonic()
+        if expires_at < now:
+            del self._data[key]
+            self._removed(key, value)
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        if self.sliding:
+            self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """
+        Get a value without touching the counters or the LRU order. Expired values are still returned.
+        """
+        try:
+            return self._data[key][1]
+        except KeyError:
+            return default
+
+    def values(self) -> typing.List[typing.Any]:
+        """
+        Every value stored, from the least to the most recently used, without touching the counters or the LRU order.
+        Expired values are included.
+        """
+        return [value for _, value in self._data.values()]
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            evicted_key, (_, evicted_value) = self._data.popitem(last=False)
+            self._removed(evicted_key, evicted_value)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        try:
+            value = self._data.pop(key)[1]
+        except KeyError:
+            return default
+
+        self._removed(key, value)
+        return value
+
+    def pop_where(self, predicate: typing.Callable[[typing.Hashable, typing.Any], bool]) -> int:
+        """
+        Remove every entry for which predicate(key, value) is true, and return how many were removed.
+        This is a full scan, keep it out of hot paths.
+        """
+        keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+        for key in keys:
+            self._removed(key, self._data.pop(key)[1])
+        return len(keys)
+
+    def clear(self):
+        self._data.clear()
+
+    def _removed(self, key, value):
+        """
+        Called when an entry is popped, evicted or found expired (but not on clear()), for subclasses that index the
+        values.
+        """
+
+    def __contains__(self, key):
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        if total:
+            return self.hits / total
+        else:
+            return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
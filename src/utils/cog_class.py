@@ -1,6 +1,9 @@
+import typing
+
 from discord.ext import commands
 
 from utils.bot_class import MyBot
+from utils.logger import FakeLogger
 
 
 class Cog(commands.Cog):
@@ -9,11 +12,20 @@ class Cog(commands.Cog):
     help_color = "gray"
 
     display_name = None
+    # Part of the bot the logs of the cog belong to, if it has its own level. See FakeLogger.subsystem
+    logger_subsystem: typing.Optional[str] = None
 
     @property
     def name(self):
         return self.display_name or self.qualified_name or type(self).__name__
 
+    @property
+    def logger(self) -> FakeLogger:
+        if self.logger_subsystem:
+            return self.bot.logger.subsystem(self.logger_subsystem)
+        else:
+            return self.bot.logger
+
     def __init__(self, bot: MyBot, *args, **kwargs):
         self.bot = bot
         super().__init__(*args, **kwargs)
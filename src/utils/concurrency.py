@@ -6,3 +6,12 @@ def dont_block(command):
 def must_block(command):
     command.block_concurrency = True
     return command
+
+
+def coalesce_saves(command):
+    """
+    Run the command in a write_behind() block: the saves of the players and other dirty-tracked models it modifies
+    are merged and written once, when the command ends.
+    """
+    command.coalesce_saves = True
+    return command
@@ -8,11 +8,13 @@ from discord.ext import commands
 from discord.utils import MISSING
 
 from utils.interaction import delete_messages_if_message_removed
+from utils.latency import CommandTimings
 from utils.logger import LoggerConstant
 from utils.models import get_from_db
 from utils.translations import (
     get_ntranslate_function,
     get_translate_function,
+    normalize_language_code,
     ntranslate,
     translate,
 )
@@ -31,6 +33,8 @@ class MyContext(commands.Context):
         self.bot: "MyBot"
         self.interaction: typing.Optional[Interaction] = None  # Injected later.
         self._prefix: typing.Optional[str] = None
+        # Replaced by MyBot.on_message, that starts timing when the message is received.
+        self.timings = CommandTimings()
 
         self.logger = LoggerConstant(
             self.bot.logger, self.guild, self.channel, self.author
@@ -215,12 +219,7 @@ class MyContext(commands.Context):
             db_user = await get_from_db(self.author, as_user=True)
             language = db_user.language
 
-        if language == "zh-Hans":
-            return "zh"  # Babel don't know about Simplified Chinese
-        else:
-            language = language.replace("-", "_")
-
-        return language
+        return normalize_language_code(language)
 
     async def translate(self, message):
         language_code = await self.get_language_code()
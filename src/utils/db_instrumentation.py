@@ -0,0 +1,215 @@
+"""
+Measure the queries made through Tortoise, and attribute them to what made them.
+
+InstrumentedClient is mixed in the database client classes (and their transaction wrappers), see
+utils.instrumented_asyncpg, the engine init_db_connection configures.
+
+Queries are grouped by template (the SQL with its values and lists of parameters collapsed), and by source: the
+command, background loop, API route or event being handled, read from the QUERIES_SOURCE contextvar.
+"""
+import collections
+import contextvars
+import functools
+import logging
+import re
+import time
+import typing
+
+from utils.metrics import METRICS
+
+DB_QUERY_DURATION = METRICS.histogram(
+    "duckhunt_db_query_duration_seconds",
+    "Duration of the database queries, by statement type.",
+    ["operation"],
+)
+DB_QUERY_ERRORS = METRICS.counter(
+    "duckhunt_db_query_errors_total",
+    "Database queries that raised an exception, by statement type.",
+    ["operation"],
+)
+
+# What the queries of the current task are made for, if anything: an object with an add_query(duration) method,
+# like the CommandTimings of the command being handled.
+QUERIES_SCOPE: contextvars.ContextVar[typing.Optional[typing.Any]] = contextvars.ContextVar(
+    "queries_scope", default=None
+)
+
+# Who makes the queries of the current task, like "command:bang" or "loop:DucksSpawning.loop".
+# Tasks inherit it from the task that created them.
+QUERIES_SOURCE: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "queries_source", default="other"
+)
+
+# Written to cache/slow_queries.log, see utils.logger.init_logger
+SLOW_QUERIES_LOGGER = logging.getLogger("slow_queries")
+
+OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PARAMETER = re.compile(r"\$\d+(?:::\w+)?|\?|\b\d+(?:\.\d+)?\b")
+_PARAMETERS_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_LISTS_OF_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+
+
+def attribute_queries(source: str):
+    """
+    Attribute the queries made from now on by the current task, and the tasks it creates, to `source`.
+    """
+    QUERIES_SOURCE.set(source)
+
+
+def query_operation(query: str) -> str:
+    operation = query.lstrip()[:8].split(None, 1)
+    if operation and operation[0].upper() in OPERATIONS:
+        return operation[0].upper()
+    else:
+        return "OTHER"
+
+
+@functools.lru_cache(maxsize=4096)
+def query_template(query: str) -> str:
+    """
+    The query without its values, so that the same query made with different values, or with lists of different
+    lengths, is counted once.
+    """
+    template = _STRING_LITERAL.sub("?", query)
+    template = _PARAMETER.sub("?", template)
+    template = _PARAMETERS_LIST.sub("(...)", template)
+    template = _LISTS_OF_LISTS.sub("(...), ...", template)
+    return " ".join(template.split())
+
+
+class QueriesStats:
+    __slots__ = ("count", "errors", "rows", "total_time", "max_time", "sources")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # Source -> time spent, only for templates
+        self.sources: typing.Counter[str] = collections.Counter()
+
+    def add(self, duration: float, rows: int, failed: bool):
+        self.count += 1
+        self.errors += failed
+        self.rows += rows
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+
+    def serialize(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_time": self.total_time,
+            "average_time": self.total_time / self.count if self.count else 0.0,
+            "max_time": self.max_time,
+        }
+
+
+class QueriesRecorder:
+    """
+    Totals of the queries made since the bot started, by template and by source. Queries slower than
+    slow_query_threshold seconds are logged to the slow queries log.
+    """
+
+    # Templates beyond this are counted together, something is building queries it shouldn't.
+    MAX_TEMPLATES = 5000
+
+    def __init__(self, slow_query_threshold: float = 0.5):
+        self.slow_query_threshold = slow_query_threshold
+        self.templates: typing.Dict[str, QueriesStats] = {}
+        self.sources: typing.DefaultDict[str, QueriesStats] = collections.defaultdict(QueriesStats)
+        self.slow_queries = 0
+
+    def record(self, query: str, duration: float, rows: int, failed: bool = False):
+        template = query_template(query)
+        source = QUERIES_SOURCE.get()
+
+        stats = self.templates.get(template)
+        if stats is None:
+            if len(self.templates) >= self.MAX_TEMPLATES:
+                template = "(other templates)"
+                stats = self.templates.get(template)
+            if stats is None:
+                stats = self.templates[template] = QueriesStats()
+        stats.add(duration, rows, failed)
+        stats.sources[source] += duration
+
+        self.sources[source].add(duration, rows, failed)
+
+        if duration >= self.slow_query_threshold:
+            self.slow_queries += 1
+            SLOW_QUERIES_LOGGER.warning(
+                f"{duration * 1000:.0f}ms, {rows} rows{', failed' if failed else ''} [{source}] {template}"
+            )
+
+    def top_templates(self, count: int = 10) -> typing.List[typing.Tuple[str, QueriesStats]]:
+        return sorted(self.templates.items(), key=lambda item: item[1].total_time, reverse=True)[:count]
+
+    def top_sources(self, count: int = 10) -> typing.List[typing.Tuple[str, QueriesStats]]:
+        return sorted(self.sources.items(), key=lambda item: item[1].total_time, reverse=True)[:count]
+
+    def clear(self):
+        self.templates.clear()
+        self.sources.clear()
+        self.slow_queries = 0
+
+
+QUERIES = QueriesRecorder()
+
+
+def count_rows(result) -> int:
+    if isinstance(result, tuple):
+        # execute_query: (rows affected or returned, rows)
+        return result[0]
+    elif isinstance(result, list):
+        return len(result)
+    elif result is None:
+        return 0
+    else:
+        # execute_insert: the inserted row, or its ID.
+        return 1
+
+
+class InstrumentedClient:
+    """
+    Time every query of a Tortoise BaseDBAsyncClient. Must come before the client class in the bases.
+    """
+
+    async def _measure(self, query: str, coroutine: typing.Awaitable, rows: typing.Optional[int] = None):
+        operation = query_operation(query)
+        result = None
+        failed = False
+        start = time.perf_counter()
+        try:
+            result = await coroutine
+            return result
+        except Exception:
+            failed = True
+            DB_QUERY_ERRORS.labels(operation).inc()
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            DB_QUERY_DURATION.labels(operation).observe(duration)
+            QUERIES.record(query, duration, count_rows(result) if rows is None else rows, failed)
+            scope = QUERIES_SCOPE.get()
+            if scope is not None:
+                scope.add_query(duration)
+
+    async def execute_insert(self, query: str, values: list):
+        return await self._measure(query, super().execute_insert(query, values), rows=1)
+
+    async def execute_query(self, query: str, values: typing.Optional[list] = None):
+        return await self._measure(query, super().execute_query(query, values))
+
+    async def execute_query_dict(self, query: str, values: typing.Optional[list] = None):
+        return await self._measure(query, super().execute_query_dict(query, values))
+
+    async def execute_many(self, query: str, values: list):
+        return await self._measure(query, super().execute_many(query, values), rows=len(values))
+
+    async def execute_script(self, query: str):
+        return await self._measure(query, super().execute_script(query), rows=0)
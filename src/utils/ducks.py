@@ -1,5 +1,6 @@
 import asyncio
 import datetime
+import functools
 import random
 import time
 import typing
@@ -15,8 +16,13 @@ from utils.bot_class import MyBot
 from utils.bushes import bushes_objects, bushes_weights
 from utils.coats import Coats
 from utils.events import Events
-from utils.interaction import anti_bot_zero_width, get_webhook_if_possible
+from utils.interaction import (
+    anti_bot_zero_width,
+    get_webhook_if_possible,
+    get_webhook_pool,
+)
 from utils.models import DiscordChannel, Player, SunState, get_from_db, get_player
+from utils.outbound import OutboundMessage, OutboundQueue
 from utils.translations import ntranslate, translate
 
 SECOND = 1
@@ -50,6 +56,8 @@ class Duck:
         }
 
         self.spawned_at: Optional[int] = None
+        self.expires_at: Optional[float] = None
+        self._departure: Optional[list] = None  # Entry in bot.ducks_departures
         self.target_lock = asyncio.Lock()
         self.target_lock_by: Optional[discord.Member] = None
         self.db_target_lock_by: Optional[Player] = None
@@ -374,62 +382,79 @@ class Duck:
 
         return f"{shout} {trace}"
 
-    async def send(self, content: str, **kwargs):
+    async def send(self, content: str = None, coalesce: bool = False, wait: bool = True, **kwargs):
+        """
+        Queue a message in the duck channel. Messages are sent in order, and with coalesce=True, merged with the
+        previous message if it was queued with coalesce=True too (e.g. when many ducks leave at once).
+
+        With wait=False, the message is dropped instead of waiting for room when the channel queue is full.
+        """
         db_channel = await self.get_db_channel()
         if db_channel.use_webhooks:
+            webhook_parameters = dict(await self.get_webhook_parameters())
+            coalesce_key = (webhook_parameters.get("username"), webhook_parameters.get("avatar_url"))
+        else:
+            webhook_parameters = None
+            coalesce_key = (None, None)
+
+        message = OutboundMessage(
+            content,
+            kwargs,
+            deliver=functools.partial(self._deliver, db_channel, webhook_parameters),
+            coalesce_key=coalesce_key if coalesce else None,
+        )
+        queue = self.bot.outbound.get(self.channel.id)
+        if wait:
+            await queue.put(message)
+        else:
+            queue.put_nowait(message)
+
+    async def _deliver(
+        self,
+        db_channel: DiscordChannel,
+        webhook_parameters: typing.Optional[dict],
+        queue: OutboundQueue,
+        message: OutboundMessage,
+    ):
+        if webhook_parameters is not None:
+            # The webhook is picked when the message is actually sent, so that the pool can skip rate-limited ones.
             webhook = await get_webhook_if_possible(self.bot, db_channel)
         else:
             webhook = None
 
         if webhook:
-            this_webhook_parameters = await self.get_webhook_parameters()
-
-            async def sendit():
-                try:
-                    await webhook.send(content, **this_webhook_parameters, **kwargs)
-                    return
-                except (discord.NotFound, ValueError) as e:
-                    db_channel: DiscordChannel = await get_from_db(self.channel)
-                    self.bot.logger.warning(
-                        f"Removing webhook {webhook.url} on #{self.channel.name} on {self.channel.guild.id} from planification because {e}."
-                    )
-                    db_channel.webhook_urls.remove(webhook.url)
-                    await db_channel.save()
-                    try:
-                        await self.channel.send(content, **kwargs)
-                    except (discord.Forbidden, discord.NotFound):
-                        self.bot.logger.warning(
-                            f"Removing #{self.channel.name} on {self.channel.guild.id} from planification because I'm not allowed to send messages there {e}."
-                        )
-                        try:
-                            del self.bot.enabled_channels[self.channel]
-                        except KeyError:
-                            pass
-                        try:
-                            del self.bot.ducks_spawned[self.channel]
-                        except KeyError:
-                            pass
-
-            asyncio.ensure_future(sendit())
-            return
-
-        async def sendit():
             try:
-                await self.channel.send(content, **kwargs)
-            except (discord.Forbidden, discord.NotFound):
-                self.bot.logger.warning(
-                    f"Removing #{self.channel.name} on {self.channel.guild.id} from planification because I'm not allowed to send messages there."
+                with get_webhook_pool(self.bot, db_channel).track(webhook):
+                    async with queue.route(("webhook", webhook.id)):
+                        await webhook.send(message.content, **webhook_parameters, **message.kwargs)
+                return
+            except (discord.NotFound, ValueError) as e:
+                db_channel: DiscordChannel = await get_from_db(self.channel)
+                self.bot.logger.subsystem("spawning").warning(
+                    "Removing webhook %s on #%s on %d from planification because %s.",
+                    webhook.url, self.channel.name, self.channel.guild.id, e,
                 )
-                try:
-                    del self.bot.enabled_channels[self.channel]
-                except KeyError:
-                    pass
-                try:
-                    del self.bot.ducks_spawned[self.channel]
-                except KeyError:
-                    pass
+                if webhook.url in db_channel.webhook_urls:
+                    db_channel.webhook_urls.remove(webhook.url)
+                    await db_channel.save()
 
-        asyncio.ensure_future(sendit())
+        try:
+            async with queue.route(("channel", self.channel.id)):
+                await self.channel.send(message.content, **message.kwargs)
+        except (discord.Forbidden, discord.NotFound):
+            self.bot.logger.subsystem("spawning").warning(
+                "Removing #%s on %d from planification because I'm not allowed to send messages there.",
+                self.channel.name, self.channel.guild.id,
+            )
+            try:
+                del self.bot.enabled_channels[self.channel]
+            except KeyError:
+                pass
+            try:
+                del self.bot.ducks_spawned[self.channel]
+            except KeyError:
+                pass
+            queue.clear()
 
     # Parameters #
 
@@ -486,13 +511,14 @@ class Duck:
         message = await self.get_spawn_message()
 
         if loud:
-            self.bot.logger.debug(
-                f"Spawning {self}", guild=self.channel.guild, channel=self.channel
+            self.bot.logger.subsystem("spawning").debug(
+                "Spawning %s", self, guild=self.channel.guild, channel=self.channel
             )
             self.spawned_at = time.time()
             await self.send(message)
 
         bot.ducks_spawned[self.channel].append(self)
+        await self.schedule_departure()
 
     async def shoot(self, args) -> Optional[bool]:
         if await self.will_frighten():
@@ -527,17 +553,19 @@ class Duck:
         _ = await self.get_translate_function()
         await self.send(await self.get_hug_message(hugger, db_hugger, experience))
 
-    async def leave(self):
-        self.bot.logger.debug(
-            f"Leaving {self}", guild=self.channel.guild, channel=self.channel
+    async def leave(self, wait: bool = True):
+        self.bot.logger.subsystem("spawning").debug(
+            "Leaving %s", self, guild=self.channel.guild, channel=self.channel
         )
 
-        await self.send(await self.get_left_message())
+        await self.send(await self.get_left_message(), coalesce=True, wait=wait)
         self.despawn()
 
     async def maybe_leave(self):
-        db_channel = await self.get_db_channel()
-        if db_channel.ducks_time_to_live < self.spawned_for:
+        if self.expires_at is None:
+            await self.schedule_departure()
+
+        if self.expires_at < time.time():
             await self.leave()
             return True
         else:
@@ -640,12 +668,34 @@ class Duck:
 
     # Utilities #
 
+    async def schedule_departure(self, time_to_live: Optional[int] = None):
+        """
+        (Re)compute when the duck will leave, and queue it in bot.ducks_departures.
+        """
+        if time_to_live is None:
+            db_channel = await self.get_db_channel()
+            time_to_live = db_channel.ducks_time_to_live
+
+        if self.spawned_at is None:
+            self.spawned_at = time.time()
+
+        self.reschedule_departure(time_to_live)
+
+    def reschedule_departure(self, time_to_live: int):
+        departures = self.bot.ducks_departures
+        departures.discard(self._departure)
+        self.expires_at = self.spawned_at + time_to_live
+        self._departure = departures.push(self, self.expires_at)
+
     def despawn(self):
         try:
             self.bot.ducks_spawned[self.channel].remove(self)
         except ValueError:
             pass
 
+        self.bot.ducks_departures.discard(self._departure)
+        self._departure = None
+
     async def damage(self, lives):
         """
         This function remove lives from a duck and returns True if the duck was killed, False otherwise
@@ -700,6 +750,7 @@ class GhostDuck(Duck):
         bot.ducks_spawned[self.channel].append(self)
 
         self.spawned_at = time.time()
+        await self.schedule_departure()
 
 
 class PrDuck(Duck):
@@ -1204,8 +1255,8 @@ class KamikazeDuck(Duck):
             this_ducks_killed=this_ducks_killed,
         )
 
-    async def leave(self):
-        await self.send(await self.get_left_message())
+    async def leave(self, wait: bool = True):
+        await self.send(await self.get_left_message(), coalesce=True, wait=wait)
         self.bot.ducks_spawned[self.channel].clear()
 
 
@@ -1451,6 +1502,11 @@ DUCKS_NIGHTTIME_CATEGORIES = [
     dc.category for dc in RANDOM_NIGHTTIME_SPAWN_DUCKS_CLASSES
 ]
 
+# Spawn weights multipliers, per duck category, applied during events
+EVENTS_SPAWN_WEIGHTS_MULTIPLIERS = {
+    Events.STEROIDS: {SuperDuck.category: 2},
+}
+
 RANDOM_SPAWN_DUCKS_CLASSES = (
     RANDOM_DAYTIME_SPAWN_DUCKS_CLASSES + RANDOM_NIGHTTIME_SPAWN_DUCKS_CLASSES
 )
@@ -1481,25 +1537,22 @@ async def get_random_weighted_duck(
     db_channel = db_channel or await get_from_db(channel)
 
     if sun == SunState.DAY:
-        weights = [
-            getattr(db_channel, f"spawn_weight_{category}_ducks", 0)
-            for category in DUCKS_DAYTIME_CATEGORIES
-        ]
+        categories = DUCKS_DAYTIME_CATEGORIES
         ducks = RANDOM_DAYTIME_SPAWN_DUCKS_CLASSES
     else:
-        weights = [
-            getattr(db_channel, f"spawn_weight_{category}_ducks", 0)
-            for category in DUCKS_NIGHTTIME_CATEGORIES
-        ]
+        categories = DUCKS_NIGHTTIME_CATEGORIES
         ducks = RANDOM_NIGHTTIME_SPAWN_DUCKS_CLASSES
 
-    if bot.current_event == Events.STEROIDS and SuperDuck in ducks:
-        weights[ducks.index(SuperDuck)] *= 2
+    event = bot.current_event
+    multipliers = EVENTS_SPAWN_WEIGHTS_MULTIPLIERS.get(event)
+    # Events that don't change the weights share the same sampler.
+    sampler_key = (sun, event if multipliers else None)
+    sampler = db_channel.get_spawn_sampler(sampler_key, categories, multipliers)
 
-    if sum(weights) <= 0:  # Channel config is fucked anyways
+    if sampler is None:  # Channel config is fucked anyways
         return Duck(bot, channel)
 
-    DuckClass: typing.Type[Duck] = random.choices(ducks, weights)[0]
+    DuckClass: typing.Type[Duck] = ducks[sampler.sample()]
 
     return DuckClass(bot, channel)
 
@@ -1508,6 +1561,15 @@ def deserialize_duck(bot: MyBot, channel: discord.TextChannel, data: dict):
     return DUCKS_CATEGORIES_TO_CLASSES[data["category"]].deserialize(bot, channel, data)
 
 
+def reschedule_departures(bot: MyBot, channel: discord.TextChannel, time_to_live: int):
+    """
+    Move the departure of the ducks on a channel, after its ducks_time_to_live changed.
+    """
+    for duck in bot.ducks_spawned.get(channel, ()):
+        if duck.spawned_at is not None and duck.expires_at != duck.spawned_at + time_to_live:
+            duck.reschedule_departure(time_to_live)
+
+
 async def compute_sun_state(channel, seconds_spent_today=None):
     if seconds_spent_today is None:
         now = int(time.time())
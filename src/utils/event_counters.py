@@ -0,0 +1,59 @@
+import array
+import time
+import typing
+
+
+class EventCounter:
+    """
+    Count events in fixed-size time buckets, kept in a ring that covers the last `retention` seconds.
+
+    Recording an event is O(1), counting the events of a window is O(number of buckets in the window), and the memory
+    used doesn't depend on the number of events. Buckets older than the retention are overwritten as time goes on.
+    """
+
+    __slots__ = ("resolution", "size", "_counts", "_buckets")
+
+    def __init__(self, retention: float = 3600, resolution: int = 1):
+        self.resolution = resolution
+        self.size = max(1, int(retention // resolution))
+        # Events counted in each slot, and the bucket (timestamp // resolution) each slot currently holds.
+        self._counts = array.array("Q", bytes(8 * self.size))
+        self._buckets = array.array("q", [-1]) * self.size
+
+    def add(self, count: int = 1, now: typing.Optional[float] = None):
+        if now is None:
+            now = time.time()
+        bucket = int(now) // self.resolution
+        slot = bucket % self.size
+
+        if self._buckets[slot] != bucket:
+            # The slot held a bucket older than the retention.
+            self._buckets[slot] = bucket
+            self._counts[slot] = count
+        else:
+            self._counts[slot] += count
+
+    def count(self, over: typing.Optional[float] = None, now: typing.Optional[float] = None) -> int:
+        """
+        Number of events recorded during the last `over` seconds, or during the whole retention if `over` is None.
+        """
+        if now is None:
+            now = time.time()
+        last_bucket = int(now) // self.resolution
+
+        if over is None:
+            buckets = self.size
+        else:
+            buckets = min(self.size, max(0, int(over) // self.resolution))
+
+        total = 0
+        for bucket in range(last_bucket - buckets + 1, last_bucket + 1):
+            slot = bucket % self.size
+            if self._buckets[slot] == bucket:
+                total += self._counts[slot]
+        return total
+
+    def clear(self):
+        for slot in range(self.size):
+            self._buckets[slot] = -1
+            self._counts[slot] = 0
@@ -0,0 +1,99 @@
+import heapq
+import itertools
+import typing
+
+_REMOVED = object()
+
+
+class ExpiryQueue:
+    """
+    A priority queue of items keyed by the absolute time (timestamp) they expire at.
+
+    Removing an item is lazy: its entry is marked as removed, and skipped when it reaches the top of the heap.
+    Items popped after their expiry time are counted as lag, so that a queue that can't keep up is visible.
+    """
+
+    def __init__(self):
+        # [expires_at, tie-breaker, item]
+        self._heap: typing.List[list] = []
+        self._counter = itertools.count()
+
+        self.popped = 0
+        self.discarded = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def push(self, item, expires_at: float) -> list:
+        """
+        Add an item to the queue, and return its entry, to pass to discard() later.
+        """
+        entry = [expires_at, next(self._counter), item]
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    def discard(self, entry: typing.Optional[list]):
+        if entry is not None and entry[2] is not _REMOVED:
+            entry[2] = _REMOVED
+            self.discarded += 1
+
+    def _drop_removed(self):
+        heap = self._heap
+        while heap and heap[0][2] is _REMOVED:
+            heapq.heappop(heap)
+
+    def next_expiry(self) -> typing.Optional[float]:
+        self._drop_removed()
+        if self._heap:
+            return self._heap[0][0]
+        else:
+            return None
+
+    def pop_expired(self, now: float):
+        """
+        Pop the item that expired first, if it expired before now. Returns None otherwise.
+        """
+        expires_at = self.next_expiry()
+        if expires_at is None or expires_at > now:
+            return None
+
+        _, _, item = heapq.heappop(self._heap)
+
+        lag = now - expires_at
+        self.popped += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+        return item
+
+    def lag(self, now: float) -> float:
+        """
+        How late, in seconds, is the oldest expired item still in the queue.
+        """
+        expires_at = self.next_expiry()
+        if expires_at is None:
+            return 0.0
+        else:
+            return max(0.0, now - expires_at)
+
+    def backlog(self, now: float) -> int:
+        """
+        Count the expired items still waiting to be popped. This is a full scan, keep it out of hot paths.
+        """
+        return sum(
+            1 for expires_at, _, item in self._heap if expires_at <= now and item is not _REMOVED
+        )
+
+    def __len__(self):
+        return len(self._heap)
+
+    def stats(self, now: float) -> dict:
+        lag = self.lag(now)
+        return {
+            "entries": len(self._heap),
+            "popped": self.popped,
+            "discarded": self.discarded,
+            "backlog": self.backlog(now),
+            "lag": round(lag, 3),
+            "max_lag": round(self.max_lag, 3),
+            "average_lag": round(self.total_lag / self.popped, 3) if self.popped else 0.0,
+        }
@@ -0,0 +1,215 @@
+"""
+Response caching for the JSON API: per-route time-to-live, strong ETags answered with 304 Not Modified, compression,
+and a single recomputation when many clients ask for an expired response at the same time.
+"""
+import asyncio
+import collections
+import gzip
+import hashlib
+import time
+import typing
+import urllib.parse
+
+from aiohttp import web
+
+from utils.cache import TTLCache
+
+try:
+    # Installed with aiohttp[speedups]
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent as is, compressing them isn't worth it.
+MIN_COMPRESSED_SIZE = 1024
+
+
+class CachedResponse:
+    __slots__ = ("body", "content_type", "charset", "etag", "expires_at", "_encoded")
+
+    def __init__(self, response: web.Response, ttl: float):
+        self.body: bytes = response.body
+        self.content_type = response.content_type
+        self.charset = response.charset
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+        # Content-Encoding -> compressed body
+        self._encoded: typing.Dict[str, bytes] = {}
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at <= time.monotonic()
+
+    def encoded(self, encoding: str) -> bytes:
+        body = self._encoded.get(encoding)
+        if body is None:
+            if encoding == "br":
+                body = brotli.compress(self.body)
+            else:
+                body = gzip.compress(self.body)
+            self._encoded[encoding] = body
+        return body
+
+
+def negotiate_encoding(request: web.Request) -> typing.Optional[str]:
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("Accept-Encoding", "").split(",")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    elif "gzip" in accepted:
+        return "gzip"
+    else:
+        return None
+
+
+def etag_matches(request: web.Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {tag.strip() for tag in if_none_match.split(",")}
+
+
+def cache_key(request: web.Request, query_params: typing.Sequence[str]) -> str:
+    """
+    The path, and the values of the query parameters the route reads. Other parameters don't change the response,
+    and would let anyone fill the cache with copies of it.
+    """
+    query = urllib.parse.urlencode(
+        [(name, request.query[name]) for name in query_params if name in request.query]
+    )
+    if query:
+        return request.path + "?" + query
+    else:
+        return request.path
+
+
+class ResponseCache:
+    """
+    An aiohttp middleware caching the successful GET responses of the routes registered with cache_route(), by path
+    and the query parameters the route reads. Only register routes that return the same thing to everyone (no
+    authentication).
+    """
+
+    # Expired responses are removed when storing a new one, at most every SWEEP_INTERVAL seconds.
+    SWEEP_INTERVAL = 10
+
+    def __init__(self, maxsize: int = 5000):
+        # Route handler -> (time-to-live in seconds, query parameters read by the route)
+        self._routes: typing.Dict[typing.Callable, typing.Tuple[float, typing.Tuple[str, ...]]] = {}
+        # Cache key -> response. TTLCache only bounds the size, entries have their own expiry.
+        self._responses = TTLCache(maxsize=maxsize, ttl=24 * 60 * 60)
+        # Cache key -> response being computed
+        self._computing: typing.Dict[str, asyncio.Future] = {}
+        self._next_sweep = 0.0
+
+        # Route -> {"hits", "misses", "coalesced", "not_modified"}
+        self.routes_stats: typing.DefaultDict[str, collections.Counter] = collections.defaultdict(
+            collections.Counter
+        )
+
+    def cache_route(self, handler: typing.Callable, ttl: float, query_params: typing.Sequence[str] = ()):
+        self._routes[handler] = (ttl, tuple(query_params))
+
+    def clear(self):
+        self._responses.clear()
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        route = request.match_info.route
+        cached_route = self._routes.get(route.handler)
+        if cached_route is None or request.method != "GET":
+            response = await handler(request)
+            if (
+                isinstance(response, web.Response)
+                and isinstance(response.body, bytes)
+                and len(response.body) >= MIN_COMPRESSED_SIZE
+            ):
+                # aiohttp negotiates gzip or deflate with the client.
+                response.enable_compression()
+            return response
+
+        ttl, query_params = cached_route
+        stats = self.routes_stats[route.resource.canonical if route.resource else request.path]
+        key = cache_key(request, query_params)
+
+        cached: typing.Optional[CachedResponse] = self._responses.peek(key)
+        if cached is not None and not cached.expired:
+            stats["hits"] += 1
+            return self._respond(request, cached, stats)
+
+        computing = self._computing.get(key)
+        if computing is not None:
+            # Somebody is already computing that response, wait for it.
+            stats["coalesced"] += 1
+            cached = await asyncio.shield(computing)
+            if cached is None:
+                # Not cacheable, compute our own.
+                return await handler(request)
+            return self._respond(request, cached, stats)
+
+        stats["misses"] += 1
+        computing = self._computing[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await handler(request)
+        except BaseException:
+            # Waiters will compute their own response (or error).
+            computing.set_result(None)
+            raise
+        finally:
+            del self._computing[key]
+
+        if not (
+            isinstance(response, web.Response)
+            and response.status == 200
+            and isinstance(response.body, bytes)
+        ):
+            computing.set_result(None)
+            return response
+
+        cached = CachedResponse(response, ttl)
+        self._store(key, cached)
+        computing.set_result(cached)
+        return self._respond(request, cached, stats)
+
+    def _store(self, key: str, cached: CachedResponse):
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.SWEEP_INTERVAL
+            self._responses.pop_where(lambda _, response: response.expired)
+
+        self._responses.set(key, cached)
+
+    @staticmethod
+    def _respond(
+        request: web.Request, cached: CachedResponse, stats: collections.Counter
+    ) -> web.Response:
+        headers = {
+            "ETag": cached.etag,
+            "Cache-Control": f"public, max-age={max(0, int(cached.expires_at - time.monotonic()))}",
+            "Vary": "Accept-Encoding",
+        }
+
+        if etag_matches(request, cached.etag):
+            stats["not_modified"] += 1
+            return web.Response(status=304, headers=headers)
+
+        body = cached.body
+        if len(body) >= MIN_COMPRESSED_SIZE:
+            encoding = negotiate_encoding(request)
+            if encoding is not None:
+                body = cached.encoded(encoding)
+                headers["Content-Encoding"] = encoding
+
+        return web.Response(
+            body=body,
+            content_type=cached.content_type,
+            charset=cached.charset,
+            headers=headers,
+        )
+
+    def stats(self) -> typing.Dict[str, dict]:
+        return {route: dict(counter) for route, counter in self.routes_stats.items()}
@@ -0,0 +1,21 @@
+"""
+The Tortoise asyncpg engine, with the queries measured by utils.db_instrumentation.
+"""
+from tortoise.backends.asyncpg.client import AsyncpgDBClient, TransactionWrapper
+from tortoise.backends.base.client import TransactionContext, TransactionContextPooled
+
+from utils.db_instrumentation import InstrumentedClient
+
+
+class InstrumentedTransactionWrapper(InstrumentedClient, TransactionWrapper):
+    pass
+
+
+class InstrumentedAsyncpgDBClient(InstrumentedClient, AsyncpgDBClient):
+    def _in_transaction(self) -> TransactionContext:
+        # Queries made in transactions (get_or_create, select_for_update, ...) go through the wrapper.
+        return TransactionContextPooled(InstrumentedTransactionWrapper(self))
+
+
+# Looked up by Tortoise, as for any engine module.
+client_class = InstrumentedAsyncpgDBClient
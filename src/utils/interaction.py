@@ -1,12 +1,16 @@
 import asyncio
+import contextlib
 import datetime
 import random
+import time
 import typing
 
 import discord
 from discord.ext import menus
 from discord.ext.commands import MemberConverter
 
+from utils.cache import TTLCache
+from utils.metrics import METRICS
 from utils.models import DiscordChannel, get_from_db
 
 if typing.TYPE_CHECKING:
@@ -132,6 +136,204 @@ async def create_and_save_webhook(
     return webhook
 
 
+WEBHOOK_SEND_DURATION = METRICS.histogram(
+    "duckhunt_webhook_send_duration_seconds",
+    "Duration of the messages sent with webhooks, including the time discord.py waited on rate-limits.",
+)
+WEBHOOK_RATE_LIMITS = METRICS.counter(
+    "duckhunt_webhook_rate_limits_total",
+    "Webhook sends that failed with HTTP 429 Too Many Requests.",
+)
+
+
+class PooledWebhook:
+    """
+    A parsed webhook, and how it behaved recently.
+    """
+
+    # How long a webhook is skipped after being rate-limited, in seconds
+    RATE_LIMIT_COOLDOWN = 10
+
+    __slots__ = ("webhook", "sends", "rate_limited", "not_found", "latency", "cooldown_until")
+
+    def __init__(self, webhook: discord.Webhook):
+        self.webhook = webhook
+        self.sends = 0
+        self.rate_limited = 0
+        self.not_found = 0
+        self.latency: typing.Optional[float] = None  # Exponential moving average, seconds
+        self.cooldown_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return not self.not_found and self.cooldown_until <= time.monotonic()
+
+    def record_latency(self, latency: float):
+        self.sends += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+
+    def record_rate_limit(self):
+        self.rate_limited += 1
+        self.cooldown_until = time.monotonic() + self.RATE_LIMIT_COOLDOWN
+
+
+class WebhookPool:
+    """
+    The webhooks of a channel, parsed once from DiscordChannel.webhook_urls, and used in turn, skipping the ones that
+    were recently rate-limited, so that busy channels spread their messages over every webhook.
+    """
+
+    # Create another webhook when there are fewer healthy ones (not rate-limited, not deleted) than this...
+    MIN_HEALTHY_WEBHOOKS = 1
+    # ... but don't try more than once every PREWARM_INTERVAL seconds...
+    PREWARM_INTERVAL = 15 * 60
+    # ... and not when the channel already has that many.
+    MAX_WEBHOOKS = 5
+
+    def __init__(self, channel_id: int):
+        self.channel_id = channel_id
+        self.webhooks: typing.Dict[str, PooledWebhook] = {}
+        self.index = 0
+        self.last_prewarm = 0.0
+
+    def sync(self, urls: typing.List[str], session):
+        """
+        Follow the URLs saved for the channel, keeping the webhooks that were already parsed.
+        """
+        if len(urls) == len(self.webhooks) and all(url in self.webhooks for url in urls):
+            return
+
+        webhooks = {}
+        for url in urls:
+            pooled = self.webhooks.get(url)
+            if pooled is None:
+                try:
+                    pooled = PooledWebhook(
+                        discord.Webhook.from_url(url, session=session)
+                    )
+                except ValueError:
+                    continue
+            webhooks[url] = pooled
+        self.webhooks = webhooks
+
+    def invalid_urls(self, urls: typing.List[str]) -> typing.List[str]:
+        return [url for url in urls if url not in self.webhooks]
+
+    @property
+    def healthy_count(self) -> int:
+        return sum(1 for pooled in self.webhooks.values() if pooled.healthy)
+
+    def pick(self) -> typing.Optional[PooledWebhook]:
+        """
+        Round-robin over the healthy webhooks. If they are all cooling down, use the one that will be ready first.
+        """
+        webhooks = list(self.webhooks.values())
+        if not webhooks:
+            return None
+
+        for _ in range(len(webhooks)):
+            self.index = (self.index + 1) % len(webhooks)
+            pooled = webhooks[self.index]
+            if pooled.healthy:
+                return pooled
+
+        alive = [pooled for pooled in webhooks if not pooled.not_found]
+        if alive:
+            return min(alive, key=lambda pooled: pooled.cooldown_until)
+        else:
+            return None
+
+    def get(self, webhook: discord.Webhook) -> typing.Optional[PooledWebhook]:
+        return self.webhooks.get(webhook.url)
+
+    @contextlib.contextmanager
+    def track(self, webhook: discord.Webhook):
+        """
+        Record the outcome of sending a message with one of the pool webhooks.
+        """
+        pooled = self.get(webhook)
+        start = time.monotonic()
+        try:
+            yield
+        except discord.NotFound:
+            if pooled:
+                pooled.not_found += 1
+            raise
+        except discord.HTTPException as e:
+            if e.status == 429:
+                WEBHOOK_RATE_LIMITS.inc()
+                if pooled:
+                    pooled.record_rate_limit()
+            raise
+        else:
+            latency = time.monotonic() - start
+            WEBHOOK_SEND_DURATION.observe(latency)
+            if pooled:
+                pooled.record_latency(latency)
+
+    def should_prewarm(self) -> bool:
+        if self.healthy_count >= self.MIN_HEALTHY_WEBHOOKS or len(self.webhooks) >= self.MAX_WEBHOOKS:
+            return False
+
+        now = time.monotonic()
+        if now - self.last_prewarm < self.PREWARM_INTERVAL:
+            return False
+
+        self.last_prewarm = now
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "webhooks": len(self.webhooks),
+            "healthy": self.healthy_count,
+            "sends": sum(pooled.sends for pooled in self.webhooks.values()),
+            "rate_limited": sum(pooled.rate_limited for pooled in self.webhooks.values()),
+            "not_found": sum(pooled.not_found for pooled in self.webhooks.values()),
+        }
+
+
+# Channel ID -> pool, for the channels that sent messages recently
+WEBHOOK_POOLS = TTLCache(maxsize=50000, ttl=6 * 60 * 60, sliding=True)
+
+
+def get_webhook_pool(bot: "MyBot", db_channel: DiscordChannel) -> WebhookPool:
+    pool = WEBHOOK_POOLS.peek(db_channel.discord_id)
+    if pool is None:
+        pool = WebhookPool(db_channel.discord_id)
+        WEBHOOK_POOLS.set(db_channel.discord_id, pool)
+    else:
+        WEBHOOK_POOLS.get(db_channel.discord_id)  # Refresh the TTL
+
+    pool.sync(db_channel.webhook_urls, session=bot.client_session)
+    return pool
+
+
+async def _prewarm_webhooks(bot: "MyBot", db_channel: DiscordChannel):
+    """
+    Add a webhook to the channel pool. Unlike create_and_save_webhook, a failure here doesn't disable webhooks on the
+    channel, the pool keeps using the webhooks it has.
+    """
+    channel = bot.get_channel(db_channel.discord_id)
+    if channel is None or not channel.permissions_for(channel.guild.me).manage_webhooks:
+        return
+
+    logger = bot.logger.subsystem("spawning")
+    logger.debug("Creating a new webhook, not enough healthy ones", guild=channel.guild, channel=channel)
+    try:
+        webhook = await channel.create_webhook(name="DuckHunt", reason="Better Ducks")
+    except discord.HTTPException as e:
+        logger.warning("Couldn't create a new webhook: %s", e, guild=channel.guild, channel=channel)
+        return
+
+    # Saved on the current instance, the one given may be outdated by now.
+    db_channel = await get_from_db(channel)
+    db_channel.webhook_urls.append(webhook.url)
+    await db_channel.save()
+
+
 async def get_webhook_if_possible(
     bot: "MyBot", channel: typing.Union[DiscordChannel, discord.TextChannel]
 ):
@@ -141,17 +343,24 @@ async def get_webhook_if_possible(
         db_channel: DiscordChannel = await get_from_db(channel)
 
     if len(db_channel.webhook_urls) == 0:
-        webhook = await create_and_save_webhook(bot, channel)
-    else:
-        url = random.choice(db_channel.webhook_urls)
-        try:
-            webhook = discord.Webhook.from_url(url, session=bot.client_session)
-        except ValueError:
+        return await create_and_save_webhook(bot, channel)
+
+    pool = get_webhook_pool(bot, db_channel)
+
+    invalid_urls = pool.invalid_urls(db_channel.webhook_urls)
+    if invalid_urls:
+        for url in invalid_urls:
             db_channel.webhook_urls.remove(url)
-            await db_channel.save()
-            webhook = None
+        await db_channel.save()
 
-    return webhook
+    if pool.should_prewarm():
+        asyncio.ensure_future(_prewarm_webhooks(bot, db_channel))
+
+    pooled = pool.pick()
+    if pooled is None:
+        return None
+    else:
+        return pooled.webhook
 
 
 def anti_bot_zero_width(mystr: str):
@@ -0,0 +1,144 @@
+import time
+import typing
+
+from utils.locks import LockRegistry
+
+
+class LandminesIndex:
+    """
+    The words that have active (not tripped, not disarmed) landmines, by guild, so that messages with no landmine
+    don't need a database query.
+
+    The index may list landmines that are not active anymore, but never misses an active one: a match is always
+    checked against the database. Guilds are loaded the first time they are needed, kept up to date by the
+    LandminesPlaced signals, and everything is rebuilt from the database once in a while.
+    """
+
+    def __init__(self):
+        # Guild ID -> word -> active landmines IDs
+        self._guilds: typing.Dict[int, typing.Dict[str, typing.Set[int]]] = {}
+        # Landmine ID -> (guild ID, word)
+        self._landmines: typing.Dict[int, typing.Tuple[int, str]] = {}
+        # Guild ID -> word -> active landmines IDs, for the guilds being loaded. They are only published in _guilds
+        # once filled, so that a concurrent match() doesn't see a guild without landmines.
+        self._loading: typing.Dict[int, typing.Dict[str, typing.Set[int]]] = {}
+        self._loading_locks = LockRegistry()
+
+        self.hits = 0
+        self.misses = 0
+        self.last_rebuild: typing.Optional[float] = None
+
+    def _guild_words(self, guild_id: int) -> typing.List[typing.Dict[str, typing.Set[int]]]:
+        # A guild can be both published and loading, when rebuild() runs during the load.
+        return [
+            words
+            for words in (self._guilds.get(guild_id), self._loading.get(guild_id))
+            if words is not None
+        ]
+
+    def _add(self, guild_id: int, word: str, landmine_id: int):
+        guild_words = self._guild_words(guild_id)
+        if not guild_words:
+            # Not loaded yet, the landmine will be loaded with the rest.
+            return
+        for words in guild_words:
+            words.setdefault(word, set()).add(landmine_id)
+        self._landmines[landmine_id] = (guild_id, word)
+
+    def _remove(self, landmine_id: int):
+        try:
+            guild_id, word = self._landmines.pop(landmine_id)
+        except KeyError:
+            return
+
+        for words in self._guild_words(guild_id):
+            ids = words.get(word)
+            if ids is not None:
+                ids.discard(landmine_id)
+                if not ids:
+                    del words[word]
+
+    @staticmethod
+    def _active_landmines(**filters):
+        # Imported here, utils.models keeps the index up to date.
+        from utils.models import LandminesPlaced
+
+        return LandminesPlaced.filter(tripped=False, disarmed=False, **filters).values_list(
+            "id", "word", "placed_by__member__guild__discord_id"
+        )
+
+    async def _load_guild(self, guild_id: int) -> typing.Dict[str, typing.Set[int]]:
+        # Concurrent callers wait for the first one to load the guild.
+        async with self._loading_locks[guild_id]:
+            words = self._guilds.get(guild_id)
+            if words is not None:
+                return words
+
+            # Registered before querying, so that landmines placed meanwhile are not missed.
+            words = self._loading[guild_id] = {}
+            try:
+                for landmine_id, word, _guild_id in await self._active_landmines(
+                    placed_by__member__guild__discord_id=guild_id
+                ):
+                    self._add(guild_id, word, landmine_id)
+            finally:
+                del self._loading[guild_id]
+
+            self._guilds[guild_id] = words
+            return words
+
+    async def rebuild(self) -> int:
+        """
+        Reload every active landmine from the database, and return how many there are.
+        """
+        rows = await self._active_landmines()
+        newest_id = max((landmine_id for landmine_id, _word, _guild_id in rows), default=0)
+        # Landmines placed while the query was running
+        placed_meanwhile = [
+            (guild_id, word, landmine_id)
+            for landmine_id, (guild_id, word) in self._landmines.items()
+            if landmine_id > newest_id
+        ]
+
+        self._guilds = {guild_id: {} for guild_id in self._guilds}
+        self._landmines = {}
+        for landmine_id, word, guild_id in rows:
+            self._guilds.setdefault(guild_id, {})
+            self._add(guild_id, word, landmine_id)
+        for guild_id, word, landmine_id in placed_meanwhile:
+            self._add(guild_id, word, landmine_id)
+
+        self.last_rebuild = time.time()
+        return len(rows)
+
+    async def match(self, guild_id: int, words: typing.Iterable[str]) -> typing.Set[int]:
+        """
+        The IDs of the landmines that may be active on some of those words.
+        """
+        guild_words = self._guilds.get(guild_id)
+        if guild_words is None:
+            guild_words = await self._load_guild(guild_id)
+
+        ids = set()
+        for word in words:
+            word_ids = guild_words.get(word)
+            if word_ids:
+                ids.update(word_ids)
+
+        if ids:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return ids
+
+    def stats(self) -> dict:
+        return {
+            "guilds": len(self._guilds),
+            "landmines": len(self._landmines),
+            "hits": self.hits,
+            "misses": self.misses,
+            "last_rebuild": self.last_rebuild,
+        }
+
+
+LANDMINES_INDEX = LandminesIndex()
@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import time
+import typing
+
+from tortoise.expressions import F
+
+if typing.TYPE_CHECKING:
+    from utils.models import LandminesUserData
+
+
+class LandminesPointsBuffer:
+    """
+    Points earned by talking, summed in memory by LandminesUserData ID, and added to the database in batches instead
+    of saving the player data after every message.
+
+    The instance that earned the points (from the get_member_landminesdata cache) is up-to-date in memory. Its pending
+    points are flushed before it's saved, so that save() doesn't write them a second time. Other copies of the row
+    don't include the pending points, and can be saved at any time: the points are added on top of what they wrote.
+    """
+
+    FIELDS = ("messages_sent", "words_sent", "points_acquired", "points_current")
+    # Rows per UPDATE statement
+    BATCH_SIZE = 1000
+
+    def __init__(self):
+        # LandminesUserData ID -> deltas, in FIELDS order
+        self._pending: typing.Dict[int, typing.List[int]] = {}
+        # LandminesUserData ID -> the instance that earned the points
+        self._instances: typing.Dict[int, "LandminesUserData"] = {}
+        self._lock = asyncio.Lock()
+
+        self.accrued = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.total_flush_time = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, db_data: "LandminesUserData", **deltas: int):
+        pending = self._pending.get(db_data.pk)
+        if pending is None:
+            pending = self._pending[db_data.pk] = [0] * len(self.FIELDS)
+
+        for i, field_name in enumerate(self.FIELDS):
+            pending[i] += deltas.get(field_name, 0)
+
+        self._instances[db_data.pk] = db_data
+        self.accrued += 1
+
+    def accrued_by(self, db_data: "LandminesUserData") -> bool:
+        return self._instances.get(db_data.pk) is db_data
+
+    @contextlib.asynccontextmanager
+    async def settled(self):
+        """
+        Wait for the running flush to finish, and don't start another one inside this block, so that rows read from
+        the database either include the pending points or not, but not half of them.
+        """
+        async with self._lock:
+            yield
+
+    def adopt(self, db_data: "LandminesUserData"):
+        """
+        Make a freshly loaded instance include the points pending for its row, and own them.
+        """
+        deltas = self._pending.get(db_data.pk)
+        if deltas is None or self.accrued_by(db_data):
+            return
+
+        for field_name, delta in zip(self.FIELDS, deltas):
+            setattr(db_data, field_name, getattr(db_data, field_name) + delta)
+        self._instances[db_data.pk] = db_data
+
+    async def flush_member(self, pk: int):
+        async with self._lock:
+            deltas = self._pending.pop(pk, None)
+            if deltas is not None:
+                await self._write({pk: deltas})
+
+    async def flush(self) -> int:
+        """
+        Add every pending point to the database, and return how many rows were updated.
+        """
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            if batch:
+                await self._write(batch)
+            return len(batch)
+
+    async def _write(self, batch: typing.Dict[int, typing.List[int]]):
+        start = time.perf_counter()
+        rows = list(batch.items())
+        try:
+            for i in range(0, len(rows), self.BATCH_SIZE):
+                await self._update(rows[i : i + self.BATCH_SIZE])
+        except BaseException:
+            # Put the points back, to be written with the next flush.
+            for pk, deltas in batch.items():
+                pending = self._pending.setdefault(pk, [0] * len(self.FIELDS))
+                for j, delta in enumerate(deltas):
+                    pending[j] += delta
+            raise
+
+        for pk, deltas in rows:
+            instance = self._instances.get(pk)
+            if instance is not None and instance._snapshot is not None:
+                # The database caught up with the instance.
+                for field_name, delta in zip(self.FIELDS, deltas):
+                    instance._snapshot[field_name] += delta
+            if pk not in self._pending:
+                self._instances.pop(pk, None)
+
+        self.flushes += 1
+        self.rows_flushed += len(rows)
+        self.total_flush_time += time.perf_counter() - start
+
+    async def _update(self, rows: typing.List[typing.Tuple[int, typing.List[int]]]):
+        # Imported here, utils.models uses the buffer.
+        from utils.models import LandminesUserData
+
+        db = LandminesUserData._meta.db
+
+        if db.capabilities.dialect != "postgres":
+            for pk, deltas in rows:
+                await LandminesUserData.filter(pk=pk).update(
+                    **{
+                        field_name: F(field_name) + delta
+                        for field_name, delta in zip(self.FIELDS, deltas)
+                    }
+                )
+            return
+
+        columns = ("id",) + self.FIELDS
+        values = []
+        placeholders = []
+        for pk, deltas in rows:
+            start = len(values)
+            values.append(pk)
+            values.extend(deltas)
+            placeholders.append(
+                "(" + ", ".join(f"${start + j + 1}::integer" for j in range(len(columns))) + ")"
+            )
+
+        table = LandminesUserData._meta.db_table
+        assignments = ", ".join(
+            f'"{field_name}" = "data"."{field_name}" + "deltas"."{field_name}"'
+            for field_name in self.FIELDS
+        )
+        columns_sql = ", ".join(f'"{column}"' for column in columns)
+        await db.execute_query(
+            f'UPDATE "{table}" AS "data" SET {assignments} '
+            f'FROM (VALUES {", ".join(placeholders)}) AS "deltas" ({columns_sql}) '
+            f'WHERE "data"."id" = "deltas"."id"',
+            values,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "accrued": self.accrued,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "average_flush_time": round(self.total_flush_time / self.flushes, 4)
+            if self.flushes
+            else 0.0,
+        }
+
+
+LANDMINES_POINTS = LandminesPointsBuffer()
@@ -0,0 +1,212 @@
+"""
+Commands latency: where the time goes between a command message and the end of the command, and rolling
+percentiles of those times, per command.
+"""
+import collections
+import math
+import time
+import typing
+
+from utils.metrics import METRICS
+
+COMMAND_DURATION = METRICS.histogram(
+    "duckhunt_command_duration_seconds",
+    "Time from receiving a command message to the end of the command, by command.",
+    ["command"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2.5, 5, 10, 30, 60),
+)
+
+
+class LatencySketch:
+    """
+    A histogram with logarithmic buckets: percentiles are within RELATIVE_ERROR of the actual value, whatever the
+    number of samples and their range, for a few hundred counters at most.
+    """
+
+    RELATIVE_ERROR = 0.02
+    # Values under this are counted in the first bucket.
+    MIN_VALUE = 1e-5
+
+    _LOG_GROWTH = math.log((1 + RELATIVE_ERROR) / (1 - RELATIVE_ERROR))
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        # Bucket index -> count
+        self.counts: typing.Counter[int] = collections.Counter()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        if value <= self.MIN_VALUE:
+            index = 0
+        else:
+            index = int(math.log(value / self.MIN_VALUE) / self._LOG_GROWTH) + 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencySketch"):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def _bucket_value(self, index: int) -> float:
+        if index == 0:
+            return self.MIN_VALUE
+        # Middle of the bucket, in relative terms
+        lower = self.MIN_VALUE * math.exp((index - 1) * self._LOG_GROWTH)
+        return lower * (1 + self.RELATIVE_ERROR)
+
+    def percentile(self, percentile: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = percentile / 100 * (self.count - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "average": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class RollingLatencySketch:
+    """
+    The samples of the last `window` seconds, in a ring of `slices` sketches: the oldest slice is dropped as time goes
+    on, so percentiles follow what the bot is doing now, not since it started.
+    """
+
+    __slots__ = ("slice_duration", "_slices")
+
+    def __init__(self, window: float = 60 * 60, slices: int = 12):
+        self.slice_duration = window / slices
+        # (slice number, sketch), a slot holds slice number % slices.
+        self._slices: typing.List[typing.Tuple[int, LatencySketch]] = [
+            (-1, LatencySketch()) for _ in range(slices)
+        ]
+
+    def add(self, value: float, now: typing.Optional[float] = None):
+        if now is None:
+            now = time.time()
+        number = int(now // self.slice_duration)
+        slot = number % len(self._slices)
+
+        slice_number, sketch = self._slices[slot]
+        if slice_number != number:
+            sketch = LatencySketch()
+            self._slices[slot] = (number, sketch)
+        sketch.add(value)
+
+    def merged(self, now: typing.Optional[float] = None) -> LatencySketch:
+        if now is None:
+            now = time.time()
+        oldest = int(now // self.slice_duration) - len(self._slices) + 1
+
+        merged = LatencySketch()
+        for slice_number, sketch in self._slices:
+            if slice_number >= oldest:
+                merged.merge(sketch)
+        return merged
+
+
+class CommandTimings:
+    """
+    The time a command invocation spent in each phase, carried by MyContext.
+
+    The phases follow each other, except `db`, the time spent waiting on database queries during any of them.
+    """
+
+    PHASES = ("prefix", "context", "checks", "concurrency", "callback", "db", "total")
+
+    __slots__ = ("started_at", "phases", "queries", "invoked_at", "callback_started_at", "callback_ended_at")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: typing.Dict[str, float] = dict.fromkeys(self.PHASES, 0.0)
+        self.queries = 0
+
+        # Set by MyBot when invoking the command, and by the before and after invoke hooks.
+        self.invoked_at: typing.Optional[float] = None
+        self.callback_started_at: typing.Optional[float] = None
+        self.callback_ended_at: typing.Optional[float] = None
+
+    def add(self, phase: str, duration: float):
+        self.phases[phase] += duration
+
+    def add_query(self, duration: float):
+        # Called by utils.db_instrumentation for the queries made while handling the command.
+        self.phases["db"] += duration
+        self.queries += 1
+
+    def finish(self):
+        now = time.perf_counter()
+
+        if self.invoked_at is not None:
+            # Checks, cooldowns and arguments conversion run until the before invoke hook, if the command got there.
+            callback_started_at = self.callback_started_at or now
+            self.phases["checks"] += callback_started_at - self.invoked_at
+            if self.callback_started_at is not None:
+                self.phases["callback"] += (self.callback_ended_at or now) - self.callback_started_at
+
+        self.phases["total"] = now - self.started_at
+
+
+class CommandLatencies:
+    """
+    Rolling percentiles of the time spent in each phase, by command qualified name.
+    """
+
+    def __init__(self, window: float = 60 * 60):
+        self.window = window
+        self._sketches: typing.Dict[str, typing.Dict[str, RollingLatencySketch]] = {}
+
+    def record(self, command_name: str, timings: CommandTimings):
+        sketches = self._sketches.get(command_name)
+        if sketches is None:
+            sketches = self._sketches[command_name] = {
+                phase: RollingLatencySketch(self.window) for phase in CommandTimings.PHASES
+            }
+
+        now = time.time()
+        for phase, duration in timings.phases.items():
+            sketches[phase].add(duration, now)
+
+        COMMAND_DURATION.labels(command_name).observe(timings.phases["total"])
+
+    def clear(self):
+        self._sketches.clear()
+
+    def summary(self, command_name: str) -> typing.Dict[str, dict]:
+        now = time.time()
+        return {
+            phase: sketch.merged(now).summary()
+            for phase, sketch in self._sketches.get(command_name, {}).items()
+        }
+
+    def stats(self) -> typing.Dict[str, typing.Dict[str, dict]]:
+        """
+        Summaries of the commands used during the window, by command.
+        """
+        stats = {}
+        for command_name in self._sketches:
+            summary = self.summary(command_name)
+            if summary["total"]["count"]:
+                stats[command_name] = summary
+        return stats
+
+
+COMMAND_LATENCIES = CommandLatencies()
@@ -0,0 +1,129 @@
+import bisect
+import typing
+
+
+class LeaderboardEntry:
+    """
+    The part of a Player that leaderboards show.
+    """
+
+    __slots__ = ("player_id", "user_id", "name", "discriminator", "experience", "kills")
+
+    def __init__(
+        self,
+        player_id: int,
+        user_id: int,
+        name: str,
+        discriminator: str,
+        experience: int,
+        kills: int,
+    ):
+        self.player_id = player_id
+        self.user_id = user_id
+        self.name = name
+        self.discriminator = discriminator
+        self.experience = experience
+        self.kills = kills
+
+    @property
+    def sort_key(self) -> typing.Tuple[int, int]:
+        # Best experience first, then oldest players first.
+        return -self.experience, self.player_id
+
+    def serialize(self, rank: int) -> dict:
+        return {
+            "rank": rank,
+            "user_id": str(self.user_id),
+            "user_name": self.name,
+            "user_discriminator": self.discriminator,
+            "experience": self.experience,
+            "killed_total": self.kills,
+        }
+
+
+class ChannelLeaderboard:
+    """
+    The players of a channel, kept sorted by experience, so that any page of the leaderboard can be read without
+    loading or sorting every player.
+
+    Pages can be read by rank (offset), or after a cursor, the sort key of the last entry of the previous page, which
+    doesn't skip or repeat players when the ranking changes between two pages.
+    """
+
+    def __init__(self, channel_id: int):
+        self.channel_id = channel_id
+        self._keys: typing.List[typing.Tuple[int, int]] = []
+        self._entries: typing.Dict[int, LeaderboardEntry] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, player_id: int) -> typing.Optional[LeaderboardEntry]:
+        return self._entries.get(player_id)
+
+    def load(self, entries: typing.Iterable[LeaderboardEntry]):
+        """
+        Add players loaded from the database. Players already in the leaderboard were updated while it was loading,
+        and are kept as they are.
+        """
+        for entry in entries:
+            self._entries.setdefault(entry.player_id, entry)
+        self._keys = sorted(entry.sort_key for entry in self._entries.values())
+
+    def add(self, entry: LeaderboardEntry):
+        self.remove(entry.player_id)
+        self._entries[entry.player_id] = entry
+        bisect.insort(self._keys, entry.sort_key)
+
+    def update(self, player_id: int, experience: int, kills: int) -> bool:
+        """
+        Move a player to their new rank. Returns False if the player is not in the leaderboard.
+        """
+        entry = self._entries.get(player_id)
+        if entry is None:
+            return False
+
+        if entry.experience != experience:
+            del self._keys[bisect.bisect_left(self._keys, entry.sort_key)]
+            entry.experience = experience
+            bisect.insort(self._keys, entry.sort_key)
+        entry.kills = kills
+        return True
+
+    def remove(self, player_id: int):
+        entry = self._entries.pop(player_id, None)
+        if entry is not None:
+            del self._keys[bisect.bisect_left(self._keys, entry.sort_key)]
+
+    def rank(self, player_id: int) -> typing.Optional[int]:
+        entry = self._entries.get(player_id)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self._keys, entry.sort_key) + 1
+
+    def page(self, offset: int, limit: int) -> typing.List[LeaderboardEntry]:
+        return [self._entries[player_id] for _, player_id in self._keys[offset : offset + limit]]
+
+    def page_after(
+        self, cursor: typing.Optional[typing.Tuple[int, int]], limit: int
+    ) -> typing.Tuple[int, typing.List[LeaderboardEntry]]:
+        """
+        The entries after the one with the `cursor` sort key, and the offset of the first one.
+        """
+        if cursor is None:
+            offset = 0
+        else:
+            offset = bisect.bisect_right(self._keys, cursor)
+        return offset, self.page(offset, limit)
+
+
+def encode_cursor(entry: LeaderboardEntry) -> str:
+    return f"{entry.experience}_{entry.player_id}"
+
+
+def decode_cursor(cursor: str) -> typing.Tuple[int, int]:
+    """
+    Raises ValueError for an invalid cursor.
+    """
+    experience, player_id = cursor.split("_")
+    return -int(experience), int(player_id)
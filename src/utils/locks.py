@@ -0,0 +1,99 @@
+import asyncio
+import bisect
+import time
+import typing
+
+
+class _RegisteredLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0  # Tasks holding or waiting on the lock
+
+
+class _LockContext:
+    __slots__ = ("registry", "key", "entry")
+
+    def __init__(self, registry: "LockRegistry", key: typing.Hashable):
+        self.registry = registry
+        self.key = key
+        self.entry: typing.Optional[_RegisteredLock] = None
+
+    async def __aenter__(self):
+        self.entry = self.registry._checkout(self.key)
+        lock = self.entry.lock
+
+        try:
+            if lock.locked():
+                start = time.monotonic()
+                await lock.acquire()
+                self.registry._record_wait(time.monotonic() - start)
+            else:
+                await lock.acquire()
+                self.registry._record_wait(None)
+        except BaseException:
+            # Cancelled while waiting, don't leak the reference.
+            self.registry._checkin(self.key, self.entry)
+            raise
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.entry.lock.release()
+        self.registry._checkin(self.key, self.entry)
+
+
+class LockRegistry:
+    """
+    A mapping of asyncio locks, used like a `defaultdict(asyncio.Lock)`: `async with registry[key]: ...`
+
+    Locks are reference-counted and dropped as soon as nobody holds or waits on them, so the registry size
+    stays proportional to the work in progress instead of to every key ever seen.
+    Keys should be primitive values (IDs), not discord.py objects, to avoid keeping those alive.
+    """
+
+    # Upper bounds, in seconds, of the contention histogram buckets.
+    WAIT_BUCKETS = (0.001, 0.01, 0.1, 1, 10, float("inf"))
+
+    def __init__(self):
+        self._locks: typing.Dict[typing.Hashable, _RegisteredLock] = {}
+
+        self.acquisitions = 0
+        self.contended_acquisitions = 0
+        self.wait_histogram = [0] * len(self.WAIT_BUCKETS)
+        self.total_wait_time = 0.0
+
+    def __getitem__(self, key: typing.Hashable) -> _LockContext:
+        return _LockContext(self, key)
+
+    def _checkout(self, key) -> _RegisteredLock:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _RegisteredLock()
+        entry.users += 1
+        return entry
+
+    def _checkin(self, key, entry: _RegisteredLock):
+        entry.users -= 1
+        if entry.users <= 0 and self._locks.get(key) is entry:
+            del self._locks[key]
+
+    def _record_wait(self, wait_time: typing.Optional[float]):
+        self.acquisitions += 1
+        if wait_time is not None:
+            self.contended_acquisitions += 1
+            self.total_wait_time += wait_time
+            self.wait_histogram[bisect.bisect_left(self.WAIT_BUCKETS, wait_time)] += 1
+
+    @property
+    def live_locks(self) -> int:
+        return len(self._locks)
+
+    def stats(self) -> dict:
+        return {
+            "live_locks": self.live_locks,
+            "acquisitions": self.acquisitions,
+            "contended_acquisitions": self.contended_acquisitions,
+            "total_wait_time": round(self.total_wait_time, 3),
+            # Upper bound (seconds) -> count of contended acquisitions
+            "wait_histogram": dict(zip(self.WAIT_BUCKETS, self.wait_histogram)),
+        }
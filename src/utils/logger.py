@@ -1,37 +1,129 @@
+import atexit
+import copy
+import datetime
+import json
 import logging
+import queue
 import typing
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 import discord
 
-FILE_SIZE = 10000000
-
+from utils.metrics import METRICS
 
-def init_logger() -> logging.Logger:
-    # Create the logger
-
-    base_logger = logging.getLogger("matchmaking")
-    base_logger.setLevel(logging.DEBUG)
+FILE_SIZE = 10000000
+# Records waiting to be written. When the writer thread can't keep up, new records are dropped instead of blocking
+# the event loop.
+QUEUE_SIZE = 10000
+
+LOG_RECORDS_DROPPED = METRICS.counter(
+    "duckhunt_log_records_dropped_total",
+    "Log records dropped because the logging queue was full, by level.",
+    ["level"],
+)
+
+# Set by init_logger
+LOG_QUEUE_HANDLER: typing.Optional["DroppingQueueHandler"] = None
+LOG_LISTENER: typing.Optional["LogQueueListener"] = None
+
+# Extra record attributes set by FakeLogger, written by the JSON lines formatter.
+CONTEXT_FIELDS = ("guild_id", "channel_id", "member_id")
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Put the records in a bounded queue, for a QueueListener to write them from its thread. Records that don't fit
+    are counted and dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the message with its arguments now, they could change before the record is written.
+        # Unlike QueueHandler.prepare, the traceback is kept apart from the message, for the JSON lines formatter.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.labels(record.levelname).inc()
+
+
+class LogQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full, wait for the writer thread to make room instead of failing to stop.
+        self.queue.put(self._sentinel)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the guild, channel and member IDs the record was logged with.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def make_handlers(json_lines: bool = False) -> typing.List[logging.Handler]:
+    """
+    The handlers writing the logs of the bot, slow queries and discord.py. Each one only accepts the records of its
+    logger, so that they can all be given to the same QueueListener.
+    """
+    handlers = []
 
     # noinspection SpellCheckingInspection
     formatter = logging.Formatter("%(asctime)s :: %(levelname)s :: %(message)s")
+    if json_lines:
+        file_formatter = JsonLinesFormatter()
+    else:
+        file_formatter = formatter
 
     # Logging to a file
-    from logging.handlers import RotatingFileHandler
 
-    file_handler = RotatingFileHandler("cache/all.log", "a", FILE_SIZE, 1)
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.DEBUG)
-    base_logger.addHandler(file_handler)
-
-    file_handler = RotatingFileHandler("cache/info.log", "a", FILE_SIZE * 10, 1)
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
-    base_logger.addHandler(file_handler)
-
-    file_handler = RotatingFileHandler("cache/errors.log", "a", FILE_SIZE * 10, 1)
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.WARNING)
-    base_logger.addHandler(file_handler)
+    for filename, size, level in [
+        ("cache/all.log", FILE_SIZE, logging.DEBUG),
+        ("cache/info.log", FILE_SIZE * 10, logging.INFO),
+        ("cache/errors.log", FILE_SIZE * 10, logging.WARNING),
+    ]:
+        file_handler = RotatingFileHandler(filename, "a", size, 1)
+        file_handler.setFormatter(file_formatter)
+        file_handler.setLevel(level)
+        file_handler.addFilter(logging.Filter("matchmaking"))
+        handlers.append(file_handler)
+
+    # Queries slower than the database slow_query_threshold, see utils.db_instrumentation
+    file_handler = RotatingFileHandler("cache/slow_queries.log", "a", FILE_SIZE, 1)
+    file_handler.setFormatter(file_formatter)
+    file_handler.addFilter(logging.Filter("slow_queries"))
+    handlers.append(file_handler)
 
     # And to console
 
@@ -161,12 +253,9 @@ def init_logger() -> logging.Logger:
 
     steam_handler = ColorStreamHandler()
     steam_handler.setLevel(logging.DEBUG)
-
     steam_handler.setFormatter(formatter)
-    base_logger.addHandler(steam_handler)
-
-    discord_logger = logging.getLogger("discord")
-    discord_logger.setLevel(logging.WARNING)
+    steam_handler.addFilter(logging.Filter("matchmaking"))
+    handlers.append(steam_handler)
 
     # noinspection SpellCheckingInspection
     discord_formatter = logging.Formatter("%(asctime)s :: %(levelname)s :: %(message)s")
@@ -174,16 +263,114 @@ def init_logger() -> logging.Logger:
     discord_steam_handler = ColorStreamHandler()
     discord_steam_handler.setLevel(logging.INFO)
     discord_steam_handler.setFormatter(discord_formatter)
-    discord_logger.addHandler(discord_steam_handler)
+    discord_steam_handler.addFilter(logging.Filter("discord"))
+    handlers.append(discord_steam_handler)
+
+    return handlers
+
+
+def init_logger(json_lines: bool = False, queue_size: int = QUEUE_SIZE) -> logging.Logger:
+    """
+    Create the logger. Records are queued on the calling thread, and written (formatted, files rotated...) by a
+    QueueListener thread, so that logging never blocks the event loop on I/O.
+    """
+    global LOG_QUEUE_HANDLER, LOG_LISTENER
+
+    base_logger = logging.getLogger("matchmaking")
+    if LOG_LISTENER is not None:
+        # Already initialized
+        return base_logger
+
+    base_logger.setLevel(logging.DEBUG)
+
+    slow_queries_logger = logging.getLogger("slow_queries")
+    slow_queries_logger.setLevel(logging.WARNING)
+    slow_queries_logger.propagate = False
+
+    discord_logger = logging.getLogger("discord")
+    discord_logger.setLevel(logging.WARNING)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    LOG_QUEUE_HANDLER = DroppingQueueHandler(log_queue)
+    for logger in (base_logger, slow_queries_logger, discord_logger):
+        logger.addHandler(LOG_QUEUE_HANDLER)
+
+    LOG_LISTENER = LogQueueListener(log_queue, *make_handlers(json_lines), respect_handler_level=True)
+    LOG_LISTENER.start()
+
+    # Write what's left in the queue when the bot stops
+    atexit.register(stop_logger)
 
     return base_logger
 
 
+def stop_logger():
+    """
+    Write the queued records and stop the writer thread.
+    """
+    global LOG_LISTENER
+
+    if LOG_LISTENER is not None:
+        LOG_LISTENER.stop()
+        LOG_LISTENER = None
+
+
+# Parts of the bot whose logs can be given their own level, see FakeLogger.subsystem
+SUBSYSTEMS = ("spawning", "landmines", "api")
+
+LogMessage = typing.Union[str, typing.Callable[[], str]]
+
+
 class FakeLogger:
+    """
+    Log messages prefixed with the guild, channel and member they are about.
+
+    The message can be a format string, formatted with the args %-style like the logging module does, or a callable
+    returning the message. Either way, the prefix and the message are only built if the level is enabled:
+
+        logger.debug("Spawning %s", duck, guild=channel.guild, channel=channel)
+        logger.debug(lambda: f"Planning {len(channels)} channels")
+    """
+
     def __init__(self, logger: logging.Logger = None):
         if not logger:
             logger = init_logger()
         self.logger = logger
+        self._subsystems: typing.Dict[str, "FakeLogger"] = {}
+
+    def subsystem(self, name: str) -> "FakeLogger":
+        """
+        The logger of a part of the bot. Its records go to the same handlers, but it can have its own level.
+        """
+        subsystem_logger = self._subsystems.get(name)
+        if subsystem_logger is None:
+            subsystem_logger = self._subsystems[name] = FakeLogger(self.logger.getChild(name))
+        return subsystem_logger
+
+    def set_level(self, level: typing.Union[int, str], subsystem: typing.Optional[str] = None):
+        """
+        Set the level of the logger, or of one of its subsystems. NOTSET makes a subsystem use the level of the
+        logger again.
+        """
+        if subsystem is None:
+            self.logger.setLevel(level)
+        else:
+            self.subsystem(subsystem).logger.setLevel(level)
+
+    def get_level(self, subsystem: typing.Optional[str] = None) -> int:
+        if subsystem is None:
+            return self.logger.getEffectiveLevel()
+        else:
+            return self.subsystem(subsystem).logger.getEffectiveLevel()
+
+    def configure_levels(self, logging_config: dict):
+        """
+        Apply the levels of the [logging] section of the configuration.
+        """
+        self.set_level(logging_config.get("level", "DEBUG"))
+        subsystems_levels = logging_config.get("subsystems", {})
+        for subsystem in SUBSYSTEMS:
+            self.set_level(subsystems_levels.get(subsystem, logging.NOTSET), subsystem)
 
     @staticmethod
     def make_message_prefix(
@@ -206,70 +393,109 @@ class FakeLogger:
         else:
             return ""
 
-    def debug(
+    @staticmethod
+    def make_extra(
+        guild: typing.Optional[discord.Guild] = None,
+        channel: typing.Optional[discord.ChannelType] = None,
+        member: typing.Optional[discord.Member] = None,
+    ) -> dict:
+        # For the JSON lines formatter
+        return {
+            "guild_id": guild.id if guild else None,
+            "channel_id": channel.id if channel else None,
+            "member_id": member.id if member else None,
+        }
+
+    def log(
         self,
-        message: str,
+        level: int,
+        message: LogMessage,
+        *args,
         guild: typing.Optional[discord.Guild] = None,
         channel: typing.Optional[discord.ChannelType] = None,
         member: typing.Optional[discord.Member] = None,
+        exc_info: bool = False,
     ):
-        return self.logger.debug(
-            self.make_message_prefix(guild, channel, member) + str(message)
+        # The logging module caches isEnabledFor, until a level is changed.
+        if not self.logger.isEnabledFor(level):
+            return
+
+        if callable(message):
+            message = message()
+
+        prefix = self.make_message_prefix(guild, channel, member)
+        if args:
+            # The prefix is not a format string
+            prefix = prefix.replace("%", "%%")
+
+        self.logger.log(
+            level,
+            prefix + str(message),
+            *args,
+            exc_info=exc_info,
+            extra=self.make_extra(guild, channel, member),
         )
 
+    def debug(
+        self,
+        message: LogMessage,
+        *args,
+        guild: typing.Optional[discord.Guild] = None,
+        channel: typing.Optional[discord.ChannelType] = None,
+        member: typing.Optional[discord.Member] = None,
+    ):
+        return self.log(logging.DEBUG, message, *args, guild=guild, channel=channel, member=member)
+
     def info(
         self,
-        message: str,
+        message: LogMessage,
+        *args,
         guild: typing.Optional[discord.Guild] = None,
         channel: typing.Optional[discord.ChannelType] = None,
         member: typing.Optional[discord.Member] = None,
     ):
-        return self.logger.info(
-            self.make_message_prefix(guild, channel, member) + str(message)
-        )
+        return self.log(logging.INFO, message, *args, guild=guild, channel=channel, member=member)
 
     def warn(
         self,
-        message: str,
+        message: LogMessage,
+        *args,
         guild: typing.Optional[discord.Guild] = None,
         channel: typing.Optional[discord.ChannelType] = None,
         member: typing.Optional[discord.Member] = None,
     ):
-        return self.logger.warning(
-            self.make_message_prefix(guild, channel, member) + str(message)
-        )
+        return self.log(logging.WARNING, message, *args, guild=guild, channel=channel, member=member)
 
     def warning(
         self,
-        message: str,
+        message: LogMessage,
+        *args,
         guild: typing.Optional[discord.Guild] = None,
         channel: typing.Optional[discord.ChannelType] = None,
         member: typing.Optional[discord.Member] = None,
     ):
-        return self.logger.warning(
-            self.make_message_prefix(guild, channel, member) + str(message)
-        )
+        return self.log(logging.WARNING, message, *args, guild=guild, channel=channel, member=member)
 
     def error(
         self,
-        message: str,
+        message: LogMessage,
+        *args,
         guild: typing.Optional[discord.Guild] = None,
         channel: typing.Optional[discord.ChannelType] = None,
         member: typing.Optional[discord.Member] = None,
     ):
-        return self.logger.error(
-            self.make_message_prefix(guild, channel, member) + str(message)
-        )
+        return self.log(logging.ERROR, message, *args, guild=guild, channel=channel, member=member)
 
     def exception(
         self,
-        message: str,
+        message: LogMessage,
+        *args,
         guild: typing.Optional[discord.Guild] = None,
         channel: typing.Optional[discord.ChannelType] = None,
         member: typing.Optional[discord.Member] = None,
     ):
-        return self.logger.exception(
-            self.make_message_prefix(guild, channel, member) + str(message)
+        return self.log(
+            logging.ERROR, message, *args, guild=guild, channel=channel, member=member, exc_info=True
         )
 
 
@@ -286,20 +512,20 @@ class LoggerConstant:
         self.channel = channel
         self.member = member
 
-    def debug(self, message: str):
-        return self.logger.debug(message, self.guild, self.channel, self.member)
+    def debug(self, message: LogMessage, *args):
+        return self.logger.debug(message, *args, guild=self.guild, channel=self.channel, member=self.member)
 
-    def info(self, message: str):
-        return self.logger.info(message, self.guild, self.channel, self.member)
+    def info(self, message: LogMessage, *args):
+        return self.logger.info(message, *args, guild=self.guild, channel=self.channel, member=self.member)
 
-    def warn(self, message: str):
-        return self.logger.warn(message, self.guild, self.channel, self.member)
+    def warn(self, message: LogMessage, *args):
+        return self.logger.warn(message, *args, guild=self.guild, channel=self.channel, member=self.member)
 
-    def warning(self, message: str):
-        return self.logger.warning(message, self.guild, self.channel, self.member)
+    def warning(self, message: LogMessage, *args):
+        return self.logger.warning(message, *args, guild=self.guild, channel=self.channel, member=self.member)
 
-    def error(self, message: str):
-        return self.logger.error(message, self.guild, self.channel, self.member)
+    def error(self, message: LogMessage, *args):
+        return self.logger.error(message, *args, guild=self.guild, channel=self.channel, member=self.member)
 
-    def exception(self, message: str):
-        return self.logger.exception(message, self.guild, self.channel, self.member)
+    def exception(self, message: LogMessage, *args):
+        return self.logger.exception(message, *args, guild=self.guild, channel=self.channel, member=self.member)
@@ -0,0 +1,242 @@
+"""
+Counters, gauges and histograms, rendered in the Prometheus text exposition format by the /metrics API route.
+
+Metrics are declared once, at the module level, next to the code that updates them:
+
+    SENDS = METRICS.counter("duckhunt_sends_total", "Messages sent.", ["channel_type"])
+    SENDS.labels("webhook").inc()
+"""
+import bisect
+import contextlib
+import time
+import typing
+
+# Seconds. Fits most of what we measure, from a database query to a command waiting on rate-limits.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    elif value == float("-inf"):
+        return "-Inf"
+    elif value == int(value):
+        return str(int(value))
+    else:
+        return repr(float(value))
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: typing.Iterable[typing.Tuple[str, str]]) -> str:
+    labels = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels)
+    if labels:
+        return "{" + labels + "}"
+    else:
+        return ""
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: typing.Sequence[float]):
+        self.buckets = buckets
+        # Observations per bucket, not cumulative. The last one is +Inf.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextlib.contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Metric:
+    """
+    A metric, and its values for every combination of labels it was used with.
+    """
+
+    type_name: str
+
+    def __init__(self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: typing.Dict[typing.Tuple[str, ...], typing.Any] = {}
+
+    def _new_value(self):
+        raise NotImplementedError()
+
+    def labels(self, *labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {labelvalues}")
+
+        key = tuple(str(value) for value in labelvalues)
+        value = self._values.get(key)
+        if value is None:
+            value = self._values[key] = self._new_value()
+        return value
+
+    def remove(self, *labelvalues):
+        self._values.pop(tuple(str(value) for value in labelvalues), None)
+
+    def clear(self):
+        self._values.clear()
+
+    def samples(self) -> typing.Iterator[typing.Tuple[str, typing.List[typing.Tuple[str, str]], float]]:
+        """
+        (sample name, labels, value) for each sample of the metric.
+        """
+        for labelvalues, value in self._values.items():
+            yield self.name, list(zip(self.labelnames, labelvalues)), value.value
+
+    def render(self) -> typing.List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def _new_value(self):
+        return CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def _new_value(self):
+        return GaugeValue()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        for labelvalues, value in self._values.items():
+            labels = list(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), value.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [("le", format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, value.sum
+            yield f"{self.name}_count", labels, value.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: typing.Dict[str, Metric] = {}
+        # Called before rendering, to update the metrics that are read from the bot state.
+        self._collectors: typing.List[typing.Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            # Modules are reloaded with their cogs, keep collecting in the same metric.
+            existing = self._metrics[metric.name]
+            if type(existing) is type(metric) and existing.labelnames == metric.labelnames:
+                return existing
+            raise ValueError(f"A different metric is already registered as {metric.name}")
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: typing.Callable[[], None]):
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: typing.Callable[[], None]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+
+        lines = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
@@ -1,7 +1,11 @@
 import asyncio
 import collections
+import contextlib
+import contextvars
 import datetime
+import functools
 import random
+import re
 import string
 import time
 import typing
@@ -12,22 +16,139 @@ import discord
 from discord.ext import commands
 from tortoise import Tortoise, fields, timezone
 from tortoise.models import Model
+from tortoise.signals import post_delete, post_save
 
+from utils.alias_sampler import AliasSampler
+from utils.cache import TTLCache
 from utils.coats import Coats
+from utils.db_instrumentation import QUERIES
+from utils.landmines_index import LANDMINES_INDEX
+from utils.landmines_points import LANDMINES_POINTS
+from utils.leaderboards import ChannelLeaderboard, LeaderboardEntry
 from utils.levels import get_level_info
+from utils.locks import LockRegistry
+from utils.spawns_schedule import SpawnsSchedule
 from utils.translations import translate
 
-DB_LOCKS = collections.defaultdict(asyncio.Lock)
+DB_LOCKS = LockRegistry()
 SECOND = 1
 MINUTE = 60 * SECOND
 HOUR = 60 * MINUTE
 DAY = 24 * HOUR
 
+# Identity map for the objects returned by get_from_db, keyed by (model, discord ID).
+# A busy channel would otherwise cost a few SELECTs on every single message.
+IDENTITY_CACHE = TTLCache(maxsize=50000, ttl=15 * MINUTE)
+
+
+class PlayersCache(TTLCache):
+    """
+    A TTLCache of players, that also knows the key of every cached player by its ID, so that the Player signals can
+    find it without scanning the whole cache.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Player ID -> (user ID, channel ID)
+        self._keys: typing.Dict[int, typing.Tuple[int, int]] = {}
+
+    def set(self, key, value):
+        super().set(key, value)
+        self._keys[value.pk] = key
+
+    def _removed(self, key, value):
+        if self._keys.get(value.pk) == key:
+            del self._keys[value.pk]
+
+    def clear(self):
+        super().clear()
+        self._keys.clear()
+
+    def pop_player(self, pk: int, keep: typing.Optional["Player"] = None):
+        """
+        Forget the cached player with that ID, unless it is the `keep` instance.
+        """
+        key = self._keys.get(pk)
+        if key is not None and self.peek(key) is not keep:
+            self.pop(key)
+
+
+# Players returned by get_player, keyed by (user ID, channel ID). Hunters that stop playing are forgotten.
+PLAYERS_CACHE = PlayersCache(maxsize=20000, ttl=30 * MINUTE, sliding=True)
+# Shard ID -> {"hits": ..., "misses": ...} for PLAYERS_CACHE
+PLAYERS_CACHE_SHARD_STATS: typing.DefaultDict[
+    typing.Optional[int], collections.Counter
+] = collections.defaultdict(collections.Counter)
+
+# Channel ID -> ChannelLeaderboard, for the channels whose top scores were asked for recently.
+# Reloaded every hour, to pick up the new names of the users.
+LEADERBOARDS = TTLCache(maxsize=2000, ttl=HOUR)
+
+# LandminesUserData returned by get_member_landminesdata, keyed by DiscordMember ID.
+LANDMINES_DATA_CACHE = TTLCache(maxsize=20000, ttl=30 * MINUTE, sliding=True)
+
+# Guild ID -> custom prefix (or None), for get_prefix. Kept up to date by the DiscordGuild signals.
+GUILD_PREFIXES: typing.Dict[int, typing.Optional[str]] = {}
+
+# How DirtyTrackingMixin models were saved: full, partial, skipped (nothing changed) or coalesced (write-behind)
+SAVES_STATS = collections.Counter()
+
+
+class TrackedDefaultDict(collections.defaultdict):
+    """
+    A defaultdict that remembers if it was modified since its model was loaded or last saved.
+    This lets DirtyTrackingMixin skip serializing and writing JSON blobs that didn't change.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed = False
+
+    def __missing__(self, key):
+        # Reading a missing key inserts its default value, which doesn't need saving: it's the default on load too.
+        if self.default_factory is None:
+            raise KeyError(key)
+        value = self.default_factory()
+        super().__setitem__(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        self.changed = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.changed = True
+        super().__delitem__(key)
+
+    def __ior__(self, other):
+        self.changed = True
+        return super().__ior__(other)
+
+    def pop(self, *args):
+        self.changed = True
+        return super().pop(*args)
+
+    def popitem(self):
+        self.changed = True
+        return super().popitem()
+
+    def setdefault(self, *args):
+        self.changed = True
+        return super().setdefault(*args)
+
+    def update(self, *args, **kwargs):
+        self.changed = True
+        super().update(*args, **kwargs)
+
+    def clear(self):
+        self.changed = True
+        super().clear()
+
 
 class DefaultDictJSONField(fields.JSONField):
     def __init__(self, default_factory: typing.Callable = int, **kwargs: typing.Any):
         def make_default():
-            return collections.defaultdict(default_factory)
+            return TrackedDefaultDict(default_factory)
 
         self.default_factory = default_factory
         kwargs["default"] = make_default
@@ -37,7 +158,7 @@ class DefaultDictJSONField(fields.JSONField):
         self, value: typing.Optional[typing.Union[str, dict, list]]
     ) -> typing.Optional[collections.defaultdict]:
         ret = super().to_python_value(value)
-        return collections.defaultdict(self.default_factory, ret)
+        return TrackedDefaultDict(self.default_factory, ret)
 
     def to_db_value(
         self,
@@ -48,6 +169,168 @@ class DefaultDictJSONField(fields.JSONField):
         return super().to_db_value(value, instance)
 
 
+class _PendingSaves:
+    """
+    Saves deferred by write_behind(), at most one per model instance.
+    """
+
+    def __init__(self):
+        self.instances: typing.Dict[int, Model] = {}
+        self.closed = False
+
+    def add(self, instance: Model) -> bool:
+        if self.closed:
+            return False
+
+        if id(instance) in self.instances:
+            SAVES_STATS["coalesced"] += 1
+        self.instances[id(instance)] = instance
+        return True
+
+    async def flush(self):
+        instances = list(self.instances.values())
+        self.instances.clear()
+
+        was_closed, self.closed = self.closed, True
+        try:
+            for instance in instances:
+                await instance.save()
+        finally:
+            self.closed = was_closed
+
+
+_PENDING_SAVES: contextvars.ContextVar[
+    typing.Optional[_PendingSaves]
+] = contextvars.ContextVar("pending_saves", default=None)
+
+
+@contextlib.asynccontextmanager
+async def write_behind():
+    """
+    Defer the saves of dirty-tracked models made inside this block (and the tasks it spawns), so that saving the same
+    row many times only issues one UPDATE, when the block exits. Saves made after the block exit are not deferred.
+    """
+    pending_saves = _PendingSaves()
+    token = _PENDING_SAVES.set(pending_saves)
+    try:
+        yield pending_saves
+    finally:
+        _PENDING_SAVES.reset(token)
+        pending_saves.closed = True
+        await pending_saves.flush()
+
+
+async def flush_pending_saves():
+    """
+    Write the saves deferred by the current write_behind() block. Call this before reading rows from the database
+    that may have a pending save, so that what's read is up-to-date.
+    """
+    pending_saves = _PENDING_SAVES.get()
+    if pending_saves:
+        await pending_saves.flush()
+
+
+class DirtyTrackingMixin:
+    """
+    Remember the fields values when a model is loaded or saved, so that save() only UPDATEs the columns that changed.
+
+    Fields are compared by value, except DefaultDictJSONFields that track their own changes, and other JSON fields
+    that are always considered changed since they can be modified in place.
+    Saves can also be deferred and coalesced with write_behind().
+    """
+
+    _snapshot: typing.Optional[typing.Dict[str, typing.Any]] = None
+
+    @classmethod
+    def _init_from_db(cls, **kwargs):
+        self = super()._init_from_db(**kwargs)
+        self._take_snapshot()
+        return self
+
+    def _take_snapshot(self, field_names: typing.Optional[typing.Iterable[str]] = None):
+        if self._partial:
+            self._snapshot = None
+            return
+
+        if field_names is None:
+            snapshot = {}
+            field_names = self._meta.fields_db_projection.keys()
+        elif self._snapshot is None:
+            return
+        else:
+            snapshot = self._snapshot
+
+        for field_name in field_names:
+            value = getattr(self, field_name)
+            if isinstance(value, TrackedDefaultDict):
+                value.changed = False
+            snapshot[field_name] = value
+
+        self._snapshot = snapshot
+
+    def get_dirty_fields(self) -> typing.Optional[typing.List[str]]:
+        """
+        Return the names of the fields changed since the model was loaded or last saved,
+        or None if we don't know (for new or partial models).
+        """
+        if self._snapshot is None:
+            return None
+
+        meta = self._meta
+        dirty_fields = []
+
+        for field_name, old_value in self._snapshot.items():
+            field_object = meta.fields_map[field_name]
+            if field_object.pk:
+                continue
+
+            value = getattr(self, field_name)
+
+            if isinstance(value, TrackedDefaultDict):
+                if value is not old_value or value.changed:
+                    dirty_fields.append(field_name)
+            elif isinstance(field_object, fields.JSONField):
+                dirty_fields.append(field_name)
+            elif value != old_value:
+                dirty_fields.append(field_name)
+
+        return dirty_fields
+
+    async def save(
+        self,
+        using_db=None,
+        update_fields: typing.Optional[typing.Iterable[str]] = None,
+        force_create: bool = False,
+        force_update: bool = False,
+    ) -> None:
+        if self._saved_in_db and not (update_fields or force_create or force_update):
+            pending_saves = _PENDING_SAVES.get()
+            if pending_saves is not None and pending_saves.add(self):
+                return
+
+            update_fields = self.get_dirty_fields()
+            if update_fields is not None:
+                if not update_fields:
+                    # Nothing changed since the last save.
+                    SAVES_STATS["skipped"] += 1
+                    return
+
+                # Sorted, so that tortoise can reuse the cached UPDATE query.
+                update_fields = sorted(update_fields)
+                SAVES_STATS["partial"] += 1
+            else:
+                SAVES_STATS["full"] += 1
+
+            await super().save(using_db, update_fields, force_create, force_update)
+            self._take_snapshot()
+        else:
+            await super().save(using_db, update_fields, force_create, force_update)
+            if update_fields and not force_create:
+                self._take_snapshot(update_fields)
+            else:
+                self._take_snapshot()
+
+
 class PercentageField(fields.SmallIntField):
     # TODO: Use constraints when they go out :)
     def to_db_value(
@@ -125,9 +408,71 @@ class SunState(IntEnum):
     NIGHT = 1
 
 
+def night_seconds_left(night_start_at: int, night_end_at: int, now: int) -> int:
+    """
+    Seconds of night left from now to midnight, for a night between night_start_at and night_end_at (in seconds from
+    midnight UTC).
+    """
+    now = now % DAY
+
+    if night_start_at == night_end_at:
+        # Nothing set
+        return 0
+    elif night_start_at < night_end_at:
+        # Simple case: everything is the same day
+        # 16:00            < 23:00
+        if night_start_at < now <= night_end_at:
+            # During the night
+            return night_end_at - now
+        elif night_end_at < now:
+            # After the night
+            return 0
+        elif now <= night_start_at:
+            # Before the night
+            return night_end_at - night_start_at
+        else:
+            # This shouldn't be happening
+            raise ArithmeticError(
+                f"Error calculating simpler case in night_seconds_left, debugging follow\n"
+                f"{now=}, {night_start_at=}, {night_end_at=}"
+            )
+    else:
+        # Harder case: night starts in a day and end the next day
+        # 21:00            > 06:00
+        #       v Time until next day      + v Time left at the start of the day
+        if now <= night_end_at:
+            # During the first night of the day
+            # Seconds left during the first night + seconds in the second night
+            return (night_end_at - now) + (DAY - night_start_at)
+        elif night_end_at < now <= night_start_at:
+            # During the day
+            return DAY - night_start_at
+        elif night_start_at < now:
+            # During the second night, until midnight
+            return DAY - now
+        else:
+            # This shouldn't be happening
+            raise ArithmeticError(
+                f"Error calculating harder case in night_seconds_left, debugging follow\n"
+                f"{now=}, {night_start_at=}, {night_end_at=}"
+            )
+
+
+def night_ranges(night_start_at: int, night_end_at: int) -> typing.List[range]:
+    """
+    The seconds of the day that are part of the night, with the same boundaries as DiscordChannel.day_status.
+    """
+    if night_start_at == night_end_at:
+        return []
+    elif night_start_at < night_end_at:
+        return [range(night_start_at + 1, night_end_at + 1)]
+    else:
+        return [range(0, night_end_at + 1), range(night_start_at + 1, DAY)]
+
+
 class DucksLeft:
     """
-    This class stores the state of a channel, counting the ducks left.
+    This class stores the state of a channel, counting the ducks left, and planning when they'll spawn.
     """
 
     def __init__(self, channel, day_ducks=None, night_ducks=None):
@@ -135,25 +480,26 @@ class DucksLeft:
         self.db_channel: typing.Optional[DiscordChannel] = None
         self.day_ducks: int = day_ducks
         self.night_ducks: int = night_ducks
+        self.day_spawns: typing.Optional[SpawnsSchedule] = None
+        self.night_spawns: typing.Optional[SpawnsSchedule] = None
 
-    async def compute_ducks_count(self, db_channel=None, now=None):
-        if not db_channel:
-            db_channel: DiscordChannel = await get_from_db(self.channel)
-
-        self.db_channel = db_channel
-
-        if not now:
-            now = int(time.time())
-
+    @staticmethod
+    def compute_budget(
+        ducks_per_day: int, night_start_at: int, night_end_at: int, now: int
+    ) -> typing.Tuple[int, int]:
+        """
+        Return how many ducks are left to spawn today, during the day and during the night.
+        This only depends on the channel settings, so channels that share them can share the result.
+        """
         now = now % DAY
 
         total_seconds_left = DAY - now
-        total_night_seconds = db_channel.night_seconds_left(0)
-        night_seconds_left = db_channel.night_seconds_left(now)
+        total_night_seconds = night_seconds_left(night_start_at, night_end_at, 0)
+        night_seconds_remaining = night_seconds_left(night_start_at, night_end_at, now)
         total_day_seconds = DAY - total_night_seconds
-        day_seconds_left = total_seconds_left - night_seconds_left
+        day_seconds_left = total_seconds_left - night_seconds_remaining
 
-        total_ducks_today = db_channel.ducks_per_day
+        total_ducks_today = ducks_per_day
 
         day_ducks_count = int(total_ducks_today * 9 / 10)
         night_ducks_count = int(total_ducks_today * 1 / 10)
@@ -163,7 +509,7 @@ class DucksLeft:
 
         # The min() here is protecting against having more than a duck every 5 seconds.
         if total_day_seconds:
-            self.day_ducks = int(
+            day_ducks = int(
                 min(
                     (day_seconds_left * day_ducks_count) / total_day_seconds,
                     total_day_seconds / 5,
@@ -171,43 +517,127 @@ class DucksLeft:
             )
         else:
             # Prevent ZeroDivisionError
-            self.day_ducks = 0
+            day_ducks = 0
 
         if total_night_seconds:
-            self.night_ducks = int(
+            night_ducks = int(
                 min(
-                    (night_seconds_left * night_ducks_count) / total_night_seconds,
+                    (night_seconds_remaining * night_ducks_count) / total_night_seconds,
                     total_night_seconds / 5,
                 )
             )
         else:
             # Prevent ZeroDivisionError
-            self.night_ducks = 0
+            night_ducks = 0
 
-        return self
+        return day_ducks, night_ducks
 
-    async def maybe_spawn_type(self, now=None) -> typing.Optional[SunState]:
-        if not self.db_channel:
-            self.db_channel: DiscordChannel = await get_from_db(self.channel)
+    async def compute_ducks_count(self, db_channel=None, now=None):
+        if not db_channel:
+            db_channel: DiscordChannel = await get_from_db(self.channel)
 
-        db_channel = self.db_channel
+        self.db_channel = db_channel
 
         if not now:
             now = int(time.time())
 
+        self.plan(
+            now,
+            self.compute_ranges(db_channel.night_start_at, db_channel.night_end_at, now),
+            self.compute_budget(
+                db_channel.ducks_per_day,
+                db_channel.night_start_at,
+                db_channel.night_end_at,
+                now,
+            ),
+        )
+
+        return self
+
+    @staticmethod
+    def compute_ranges(
+        night_start_at: int, night_end_at: int, now: int
+    ) -> typing.Tuple[typing.List[range], typing.List[range]]:
+        """
+        Return the seconds of the day left from now to midnight, during the day and during the night.
+        Like compute_budget, this can be shared by channels with the same settings.
+        """
         now = now % DAY
 
-        sun_state = db_channel.day_status(now)
+        night = night_ranges(night_start_at, night_end_at)
+        day = []
+        previous_end = 0
+        for night_range in night:
+            day.append(range(previous_end, night_range.start))
+            previous_end = night_range.stop
+        day.append(range(previous_end, DAY))
+
+        def left_from_now(ranges):
+            return [range(max(r.start, now), r.stop) for r in ranges if r.stop > now]
+
+        return left_from_now(day), left_from_now(night)
+
+    def plan(
+        self,
+        now: int,
+        ranges: typing.Tuple[typing.List[range], typing.List[range]],
+        budget: typing.Tuple[int, int],
+    ):
+        """
+        Plan the spawns of the ducks left today (see compute_budget) in the seconds left (see compute_ranges).
+        Each second left in the day/night is equally likely to get a duck, which is what rolling a dice every second
+        used to do.
+        """
+        midnight = now - (now % DAY)
+        day_ranges, night_ranges_ = ranges
+        day_ducks, night_ducks = budget
+
+        self.day_spawns = SpawnsSchedule(midnight, day_ranges, day_ducks)
+        self.night_spawns = SpawnsSchedule(midnight, night_ranges_, night_ducks)
+        self.day_ducks = self.day_spawns.left
+        self.night_ducks = self.night_spawns.left
+
+    def _next_schedule(self) -> typing.Optional[SpawnsSchedule]:
+        day_at, night_at = self.day_spawns.next_at, self.night_spawns.next_at
+        if day_at is None and night_at is None:
+            return None
+        elif night_at is None or (day_at is not None and day_at <= night_at):
+            return self.day_spawns
+        else:
+            return self.night_spawns
+
+    @property
+    def next_spawn_at(self) -> typing.Optional[int]:
+        if self.day_spawns is None:
+            return None
+
+        schedule = self._next_schedule()
+        if schedule is None:
+            return None
+        else:
+            return schedule.next_at
+
+    def pop_due_spawns(self, now=None) -> typing.List[SunState]:
+        """
+        Return the sun states of the ducks that should have spawned by now, and forget them.
+        """
+        if not now:
+            now = int(time.time())
+
+        due = []
+        while True:
+            next_spawn_at = self.next_spawn_at
+            if next_spawn_at is None or next_spawn_at > now:
+                return due
 
-        if sun_state == SunState.DAY:
-            if random.randint(0, db_channel.day_seconds_left(now)) < self.day_ducks:
+            schedule = self._next_schedule()
+            schedule.pop()
+            if schedule is self.day_spawns:
                 self.day_ducks -= 1
-                return SunState.DAY
-        elif sun_state == SunState.NIGHT:
-            if random.randint(0, db_channel.night_seconds_left(now)) < self.night_ducks:
+                due.append(SunState.DAY)
+            else:
                 self.night_ducks -= 1
-                return SunState.NIGHT
-        return None
+                due.append(SunState.NIGHT)
 
     @property
     def ducks_left(self):
@@ -282,6 +712,11 @@ class DiscordChannel(Model):
     spawn_weight_sleeping_ducks = fields.SmallIntField(default=5)
     spawn_weight_cartographer_ducks = fields.SmallIntField(default=3)
 
+    # Compiled spawn weights, see get_spawn_sampler
+    _spawn_samplers: typing.Optional[
+        typing.Dict[typing.Hashable, typing.Optional[AliasSampler]]
+    ] = None
+
     # Duck settings
     ducks_time_to_live = fields.SmallIntField(default=660)  # Seconds
     super_ducks_min_life = fields.SmallIntField(default=2)
@@ -328,49 +763,7 @@ class DiscordChannel(Model):
         if now is None:
             now = int(time.time())
 
-        now = now % DAY
-
-        if self.night_start_at == self.night_end_at:
-            # Nothing set
-            return 0
-        elif self.night_start_at < self.night_end_at:
-            # Simple case: everything is the same day
-            # 16:00            < 23:00
-            if self.night_start_at < now <= self.night_end_at:
-                # During the night
-                return self.night_end_at - now
-            elif self.night_end_at < now:
-                # After the night
-                return 0
-            elif now <= self.night_start_at:
-                # Before the night
-                return self.night_end_at - self.night_start_at
-            else:
-                # This shouldn't be happening
-                raise ArithmeticError(
-                    f"Error calculating simpler case in night_seconds_left, debugging follow\n"
-                    f"{now=}, {self.night_start_at=}, {self.night_end_at=}, {self=}"
-                )
-        else:
-            # Harder case: night starts in a day and end the next day
-            # 21:00            > 06:00
-            #       v Time until next day      + v Time left at the start of the day
-            if now <= self.night_end_at:
-                # During the first night of the day
-                # Seconds left during the first night + seconds in the second night
-                return (self.night_end_at - now) + (DAY - self.night_start_at)
-            elif self.night_end_at < now <= self.night_start_at:
-                # During the day
-                return DAY - self.night_start_at
-            elif self.night_start_at < now:
-                # During the second night, until midnight
-                return DAY - now
-            else:
-                # This shouldn't be happening
-                raise ArithmeticError(
-                    f"Error calculating harder case in night_seconds_left, debugging follow\n"
-                    f"{now=}, {self.night_start_at=}, {self.night_end_at=}, {self=}"
-                )
+        return night_seconds_left(self.night_start_at, self.night_end_at, now)
 
     def day_status(self, now=None):
         if now is None:
@@ -397,6 +790,40 @@ class DiscordChannel(Model):
             else:
                 return SunState.NIGHT
 
+    def get_spawn_sampler(
+        self,
+        key: typing.Hashable,
+        categories: typing.Sequence[str],
+        multipliers: typing.Optional[typing.Mapping[str, float]] = None,
+    ) -> typing.Optional[AliasSampler]:
+        """
+        Get a sampler returning the index, in categories, of the duck to spawn. Multipliers are applied to the
+        weights of some categories, for events. The sampler is built on first use, and cached under `key` until the
+        channel is saved again. Returns None if no duck can spawn with these settings.
+        """
+        if self._spawn_samplers is None:
+            self._spawn_samplers = {}
+
+        try:
+            return self._spawn_samplers[key]
+        except KeyError:
+            pass
+
+        multipliers = multipliers or {}
+        weights = [
+            max(0, getattr(self, f"spawn_weight_{category}_ducks", 0))
+            * multipliers.get(category, 1)
+            for category in categories
+        ]
+
+        if sum(weights) <= 0:
+            sampler = None
+        else:
+            sampler = AliasSampler(weights)
+
+        self._spawn_samplers[key] = sampler
+        return sampler
+
     def day_seconds_left(self, now=None):
         if now is None:
             now = int(time.time())
@@ -462,27 +889,32 @@ class AccessLevel(IntEnum):
                 raise commands.BadArgument(_("Can't set such a high level"))
 
 
-def get_valid_words(message_content) -> typing.List[str]:
-    allowed_chars = string.ascii_letters + string.digits + string.whitespace
+# Everything that's not an ASCII letter, digit or whitespace
+_INVALID_WORD_CHARACTERS = re.compile(f"[^{re.escape(string.ascii_letters + string.digits + string.whitespace)}]+")
 
-    cleaned_content = "".join(
-        filter(lambda character: character in allowed_chars, message_content)
+
+@functools.lru_cache(maxsize=1024)
+def _valid_words(message_content: str) -> typing.Tuple[str, ...]:
+    cleaned_content = _INVALID_WORD_CHARACTERS.sub("", message_content)
+
+    return tuple(
+        word
+        for word in set(cleaned_content.lower().split())
+        if 3 <= len(word) <= 40 and (len(word) > 25 or len(word) < 15 or not word.isdigit())
     )
 
-    words = []
 
-    for word in set(cleaned_content.lower().split()):
-        if 3 <= len(word) <= 40 and (
-            len(word) > 25
-            or len(word) < 15
-            or not set(word).issubset(set(string.digits))
-        ):
-            words.append(word)
+def get_valid_words(message_content) -> typing.List[str]:
+    """
+    The distinct words of a message that count for landmines: 3 to 40 lowercase ASCII letters and digits, other
+    characters being removed, and not long numbers (15 to 25 digits, like Discord IDs).
 
-    return words
+    Results are cached by message, since the points and the landmines both need them for every message.
+    """
+    return list(_valid_words(message_content))
 
 
-class LandminesUserData(Model):
+class LandminesUserData(DirtyTrackingMixin, Model):
     landmines_bought: fields.ReverseRelation["LandminesPlaced"]
     landmines_stopped: fields.ReverseRelation["LandminesPlaced"]
 
@@ -525,10 +957,23 @@ class LandminesUserData(Model):
 
             self.points_acquired += earned
             self.points_current += earned
+            LANDMINES_POINTS.add(
+                self,
+                messages_sent=1,
+                words_sent=words_count,
+                points_acquired=earned,
+                points_current=earned,
+            )
             return True
         else:
             return False
 
+    async def save(self, *args, **kwargs) -> None:
+        if LANDMINES_POINTS.accrued_by(self):
+            # Write the points accrued by messages first, or this save would write them a second time.
+            await LANDMINES_POINTS.flush_member(self.pk)
+        await super().save(*args, **kwargs)
+
     def __str__(self):
         return f"@{self.member} landmines data"
 
@@ -713,7 +1158,7 @@ class DiscordUser(Model):
         return f"<User name={self.name}#{self.discriminator}>"
 
 
-class Player(Model):
+class Player(DirtyTrackingMixin, Model):
     id = fields.IntField(pk=True)
     first_seen = fields.DatetimeField(auto_now_add=True)
 
@@ -999,7 +1444,11 @@ class Player(Model):
                 e.title = _("You leveled down!")
                 e.color = discord.Colour.red()
 
-            asyncio.ensure_future(ctx.send(embed=e))
+            if isinstance(ctx, discord.TextChannel) and bot is not None:
+                # Queued after the messages of the duck that was just killed.
+                await bot.outbound.send(ctx, embed=e)
+            else:
+                asyncio.ensure_future(ctx.send(embed=e))
             asyncio.ensure_future(self.change_roles(bot))
 
     async def change_roles(self, bot):
@@ -1373,15 +1822,159 @@ async def get_tag(name, increment_uses=True) -> typing.Optional[Tag]:
             return None
 
 
+def _identity_key(db_obj: Model) -> typing.Tuple[typing.Type[Model], typing.Hashable]:
+    if isinstance(db_obj, DiscordMember):
+        return DiscordMember, (db_obj.guild_id, db_obj.user_id)
+    else:
+        return type(db_obj), db_obj.pk
+
+
+def _share_identity(db_obj: Model) -> Model:
+    """
+    Return the instance already cached for that database row, or cache this one.
+    Used for prefetched objects so that every caller sees the same DiscordUser/DiscordGuild instance.
+    """
+    key = _identity_key(db_obj)
+    cached = IDENTITY_CACHE.peek(key)
+    if cached is None:
+        IDENTITY_CACHE.set(key, db_obj)
+        return db_obj
+    else:
+        return cached
+
+
+@post_save(DiscordGuild, DiscordChannel, DiscordUser, DiscordMember)
+async def _identity_cache_on_save(sender, instance, created, using_db, update_fields):
+    key = _identity_key(instance)
+    cached = IDENTITY_CACHE.peek(key)
+    if cached is instance:
+        # Write-through: the cached instance is what's in the database now.
+        IDENTITY_CACHE.set(key, instance)
+    elif cached is not None:
+        # Somebody saved another copy of that row, ours is stale.
+        IDENTITY_CACHE.pop(key)
+
+
+@post_save(DiscordGuild)
+async def _guild_prefixes_on_save(sender, instance, created, using_db, update_fields):
+    GUILD_PREFIXES[instance.discord_id] = instance.prefix
+
+
+@post_delete(DiscordGuild)
+async def _guild_prefixes_on_delete(sender, instance, using_db):
+    GUILD_PREFIXES.pop(instance.discord_id, None)
+
+
+@post_save(DiscordChannel)
+async def _spawn_samplers_on_save(sender, instance, created, using_db, update_fields):
+    # Spawn weights may have changed.
+    instance._spawn_samplers = None
+
+
+@post_delete(DiscordGuild, DiscordChannel, DiscordUser, DiscordMember)
+async def _identity_cache_on_delete(sender, instance, using_db):
+    IDENTITY_CACHE.pop(_identity_key(instance))
+
+
+@post_save(Player)
+async def _players_cache_on_save(sender, instance, created, using_db, update_fields):
+    key = _player_cache_key(instance)
+    if key is None:
+        # Member not fetched, look for that row by ID.
+        PLAYERS_CACHE.pop_player(instance.pk, keep=instance)
+        return
+
+    cached = PLAYERS_CACHE.peek(key)
+    if cached is not None and cached is not instance:
+        # Another copy of that player was saved, ours is stale.
+        PLAYERS_CACHE.pop(key)
+
+
+@post_delete(Player)
+async def _players_cache_on_delete(sender, instance, using_db):
+    PLAYERS_CACHE.pop_player(instance.pk)
+
+
+@post_save(Player)
+async def _leaderboards_on_save(sender, instance, created, using_db, update_fields):
+    leaderboard: typing.Optional[ChannelLeaderboard] = LEADERBOARDS.peek(instance.channel_id)
+    if leaderboard is None:
+        return
+
+    if update_fields and "experience" not in update_fields and "killed" not in update_fields:
+        return
+
+    kills = sum(instance.killed.values())
+    if leaderboard.update(instance.pk, instance.experience, kills):
+        return
+
+    # A new player on this channel
+    user_row = await DiscordMember.filter(id=instance.member_id).first().values_list(
+        "user__discord_id", "user__name", "user__discriminator"
+    )
+    if user_row is not None:
+        leaderboard.add(LeaderboardEntry(instance.pk, *user_row, instance.experience, kills))
+
+
+@post_delete(Player)
+async def _leaderboards_on_delete(sender, instance, using_db):
+    leaderboard: typing.Optional[ChannelLeaderboard] = LEADERBOARDS.peek(instance.channel_id)
+    if leaderboard is not None:
+        leaderboard.remove(instance.pk)
+
+
+@post_save(LandminesUserData)
+async def _landmines_data_cache_on_save(sender, instance, created, using_db, update_fields):
+    cached = LANDMINES_DATA_CACHE.peek(instance.member_id)
+    if cached is not None and cached is not instance:
+        # Another copy of that row was saved, ours is stale.
+        LANDMINES_DATA_CACHE.pop(instance.member_id)
+
+
+@post_delete(LandminesUserData)
+async def _landmines_data_cache_on_delete(sender, instance, using_db):
+    LANDMINES_DATA_CACHE.pop(instance.member_id)
+
+
+@post_save(LandminesPlaced)
+async def _landmines_index_on_save(sender, instance, created, using_db, update_fields):
+    if instance.tripped or instance.disarmed:
+        LANDMINES_INDEX._remove(instance.pk)
+    elif created:
+        guild_id = await DiscordMember.filter(
+            landmines__id=instance.placed_by_id
+        ).first().values_list("guild_id", flat=True)
+        if guild_id is not None:
+            LANDMINES_INDEX._add(guild_id, instance.word, instance.pk)
+
+
+@post_delete(LandminesPlaced)
+async def _landmines_index_on_delete(sender, instance, using_db):
+    LANDMINES_INDEX._remove(instance.pk)
+
+
+def _get_from_db_lock_key(discord_object, as_user) -> typing.Tuple:
+    if isinstance(discord_object, discord.Member) and not as_user:
+        return DiscordMember, discord_object.guild.id, discord_object.id
+    elif isinstance(discord_object, (discord.User, discord.ClientUser, discord.Member)):
+        return DiscordUser, discord_object.id
+    else:
+        return type(discord_object), getattr(discord_object, "id", None)
+
+
 async def get_from_db(discord_object, as_user=False):
-    async with DB_LOCKS[(discord_object, as_user)]:
+    async with DB_LOCKS[_get_from_db_lock_key(discord_object, as_user)]:
         if isinstance(discord_object, discord.Guild):
-            db_obj = await DiscordGuild.filter(discord_id=discord_object.id).first()
+            key = (DiscordGuild, discord_object.id)
+            db_obj = IDENTITY_CACHE.get(key)
             if not db_obj:
-                db_obj = DiscordGuild(
-                    discord_id=discord_object.id, name=discord_object.name
-                )
-                await db_obj.save()
+                db_obj = await DiscordGuild.filter(discord_id=discord_object.id).first()
+                if not db_obj:
+                    db_obj = DiscordGuild(
+                        discord_id=discord_object.id, name=discord_object.name
+                    )
+                    await db_obj.save()
+                IDENTITY_CACHE.set(key, db_obj)
             if discord_object.name != db_obj.name:
                 db_obj.name = discord_object.name
                 await db_obj.save()
@@ -1390,14 +1983,20 @@ async def get_from_db(discord_object, as_user=False):
         elif isinstance(discord_object, discord.TextChannel) or isinstance(
             discord_object, discord.VoiceChannel
         ):
-            db_obj = await DiscordChannel.filter(discord_id=discord_object.id).first()
+            key = (DiscordChannel, discord_object.id)
+            db_obj = IDENTITY_CACHE.get(key)
             if not db_obj:
-                db_obj = DiscordChannel(
-                    discord_id=discord_object.id,
-                    name=discord_object.name,
-                    guild=await get_from_db(discord_object.guild),
-                )
-                await db_obj.save()
+                db_obj = await DiscordChannel.filter(
+                    discord_id=discord_object.id
+                ).first()
+                if not db_obj:
+                    db_obj = DiscordChannel(
+                        discord_id=discord_object.id,
+                        name=discord_object.name,
+                        guild=await get_from_db(discord_object.guild),
+                    )
+                    await db_obj.save()
+                IDENTITY_CACHE.set(key, db_obj)
 
             if discord_object.name != db_obj.name:
                 db_obj.name = discord_object.name
@@ -1405,34 +2004,45 @@ async def get_from_db(discord_object, as_user=False):
 
             return db_obj
         elif isinstance(discord_object, discord.Member) and not as_user:
-            db_obj = (
-                await DiscordMember.filter(
-                    user__discord_id=discord_object.id,
-                    guild__discord_id=discord_object.guild.id,
-                )
-                .first()
-                .prefetch_related("user", "guild")
-            )
+            key = (DiscordMember, (discord_object.guild.id, discord_object.id))
+            db_obj = IDENTITY_CACHE.get(key)
             if not db_obj:
-                db_obj = DiscordMember(
-                    guild=await get_from_db(discord_object.guild),
-                    user=await get_from_db(discord_object, as_user=True),
+                db_obj = (
+                    await DiscordMember.filter(
+                        user__discord_id=discord_object.id,
+                        guild__discord_id=discord_object.guild.id,
+                    )
+                    .first()
+                    .prefetch_related("user", "guild")
                 )
-                await db_obj.save()
+                if not db_obj:
+                    db_obj = DiscordMember(
+                        guild=await get_from_db(discord_object.guild),
+                        user=await get_from_db(discord_object, as_user=True),
+                    )
+                    await db_obj.save()
+                else:
+                    db_obj.user = _share_identity(db_obj.user)
+                    db_obj.guild = _share_identity(db_obj.guild)
+                IDENTITY_CACHE.set(key, db_obj)
             return db_obj
         elif (
             isinstance(discord_object, discord.User)
             or isinstance(discord_object, discord.ClientUser)
             or (isinstance(discord_object, discord.Member) and as_user)
         ):
-            db_obj = await DiscordUser.filter(discord_id=discord_object.id).first()
+            key = (DiscordUser, discord_object.id)
+            db_obj = IDENTITY_CACHE.get(key)
             if not db_obj:
-                db_obj = DiscordUser(
-                    discord_id=discord_object.id,
-                    name=discord_object.name,
-                    discriminator=discord_object.discriminator,
-                )
-                await db_obj.save()
+                db_obj = await DiscordUser.filter(discord_id=discord_object.id).first()
+                if not db_obj:
+                    db_obj = DiscordUser(
+                        discord_id=discord_object.id,
+                        name=discord_object.name,
+                        discriminator=discord_object.discriminator,
+                    )
+                    await db_obj.save()
+                IDENTITY_CACHE.set(key, db_obj)
 
             if (
                 discord_object.name != db_obj.name
@@ -1458,29 +2068,134 @@ async def get_random_player(channel: typing.Union[DiscordChannel, discord.TextCh
     else:
         db_channel = channel
 
+    await flush_pending_saves()
+
     return random.choice(
         await Player.filter(channel=db_channel).prefetch_related("member__user")
     )
 
 
+def _player_cache_key(db_player: "Player") -> typing.Optional[typing.Tuple[int, int]]:
+    db_member = getattr(db_player, "_member", None)
+    if isinstance(db_member, DiscordMember):
+        return db_member.user_id, db_player.channel_id
+    else:
+        return None
+
+
+def _player_is_unsaved(db_player: "Player") -> bool:
+    """
+    Whether a cached player was modified but not saved, nor queued for a save in the current write_behind() block.
+    That happens when a command fails half-way (for instance during a prestige reset): the instance is then
+    thrown away, like it would have been without a cache.
+    """
+    if not db_player.get_dirty_fields():
+        return False
+
+    pending_saves = _PENDING_SAVES.get()
+    return pending_saves is None or id(db_player) not in pending_saves.instances
+
+
+async def get_guild_prefix(guild: discord.Guild) -> typing.Optional[str]:
+    """
+    The custom prefix of a guild, without a database query once the guild has been seen.
+    """
+    try:
+        return GUILD_PREFIXES[guild.id]
+    except KeyError:
+        pass
+
+    db_guild = await get_from_db(guild)
+    GUILD_PREFIXES[guild.id] = db_guild.prefix
+    return db_guild.prefix
+
+
+def forget_players(channel_id: typing.Optional[int] = None) -> int:
+    """
+    Drop players from the get_player cache and the leaderboards, for one channel or for every channel.
+    Call this after deleting or updating Player rows in bulk, since that doesn't go through the signals.
+    """
+    if channel_id is None:
+        count = len(PLAYERS_CACHE)
+        PLAYERS_CACHE.clear()
+        LEADERBOARDS.clear()
+        return count
+    else:
+        LEADERBOARDS.pop(channel_id)
+        return PLAYERS_CACHE.pop_where(lambda key, _db_player: key[1] == channel_id)
+
+
+async def get_channel_leaderboard(channel_id: int) -> ChannelLeaderboard:
+    """
+    The leaderboard of a channel, loaded with a single query the first time it's needed, and kept up to date by the
+    Player signals.
+    """
+    async with DB_LOCKS[(ChannelLeaderboard, channel_id)]:
+        leaderboard = LEADERBOARDS.get(channel_id)
+        if leaderboard is not None:
+            return leaderboard
+
+        await flush_pending_saves()
+
+        # Cached before querying, so that players saved meanwhile are not missed.
+        leaderboard = ChannelLeaderboard(channel_id)
+        LEADERBOARDS.set(channel_id, leaderboard)
+
+        rows = await Player.filter(channel_id=channel_id).values_list(
+            "id",
+            "member__user__discord_id",
+            "member__user__name",
+            "member__user__discriminator",
+            "experience",
+            "killed",
+        )
+        leaderboard.load(
+            LeaderboardEntry(
+                player_id, user_id, name, discriminator, experience, sum((killed or {}).values())
+            )
+            for player_id, user_id, name, discriminator, experience, killed in rows
+        )
+
+        return leaderboard
+
+
 async def get_player(
     member: discord.Member, channel: discord.TextChannel, giveback=False
 ):
-    async with DB_LOCKS[(member, channel)]:
-        db_obj = (
-            await Player.filter(
-                member__user__discord_id=member.id, channel__discord_id=channel.id
-            )
-            .prefetch_related("member__user")
-            .first()
-        )
-        if not db_obj:
-            db_obj = Player(
-                channel=await get_from_db(channel),
-                member=await get_from_db(member, as_user=False),
+    key = (member.id, channel.id)
+    shard_stats = PLAYERS_CACHE_SHARD_STATS[getattr(channel.guild, "shard_id", None)]
+
+    # Commands waiting here for the same player share the query made by the first one.
+    async with DB_LOCKS[(Player, member.id, channel.id)]:
+        db_obj = PLAYERS_CACHE.get(key)
+        if db_obj is not None and _player_is_unsaved(db_obj):
+            PLAYERS_CACHE.pop(key)
+            db_obj = None
+
+        created = False
+        if db_obj is not None:
+            shard_stats["hits"] += 1
+        else:
+            shard_stats["misses"] += 1
+            await flush_pending_saves()
+            db_obj = (
+                await Player.filter(
+                    member__user__discord_id=member.id, channel__discord_id=channel.id
+                )
+                .prefetch_related("member__user")
+                .first()
             )
-            await db_obj.save()
-        elif giveback:
+            if not db_obj:
+                db_obj = Player(
+                    channel=await get_from_db(channel),
+                    member=await get_from_db(member, as_user=False),
+                )
+                await db_obj.save()
+                created = True
+            PLAYERS_CACHE.set(key, db_obj)
+
+        # New players have nothing to give back.
+        if giveback and not created:
             await db_obj.maybe_giveback()
 
         return db_obj
@@ -1494,7 +2209,7 @@ async def get_user_inventory(
     else:
         db_user = user
 
-    async with DB_LOCKS[(db_user,)]:
+    async with DB_LOCKS[(UserInventory, db_user.discord_id)]:
         inventory, created = await UserInventory.get_or_create(
             user_id=db_user.discord_id
         )
@@ -1510,10 +2225,16 @@ async def get_member_landminesdata(
     else:
         db_member = member
 
-    async with DB_LOCKS[(db_member,)]:
-        eventdata, created = await LandminesUserData.get_or_create(
-            member_id=db_member.pk
-        )
+    async with DB_LOCKS[(LandminesUserData, db_member.pk)]:
+        eventdata = LANDMINES_DATA_CACHE.get(db_member.pk)
+        if eventdata is None:
+            async with LANDMINES_POINTS.settled():
+                eventdata, created = await LandminesUserData.get_or_create(
+                    member_id=db_member.pk
+                )
+                # Points may still be pending for an instance that was since forgotten.
+                LANDMINES_POINTS.adopt(eventdata)
+            LANDMINES_DATA_CACHE.set(db_member.pk, eventdata)
 
     return eventdata
 
@@ -1523,19 +2244,21 @@ async def get_landmine(
     message_content: str,
     as_list: bool = False,
 ) -> typing.Union[typing.Optional[LandminesPlaced], typing.List[LandminesPlaced]]:
-    if not isinstance(guild, DiscordGuild):
-        db_guild = await get_from_db(guild)
+    if isinstance(guild, DiscordGuild):
+        guild_id = guild.discord_id
     else:
-        db_guild = guild
+        guild_id = guild.id
 
     words = get_valid_words(message_content)
     if words:
-        qs = (
-            LandminesPlaced.filter(tripped=False, disarmed=False)
-            .order_by("placed")
-            .filter(word__in=words)
-            .filter(placed_by__member__guild=db_guild)
-        )
+        landmines_ids = await LANDMINES_INDEX.match(guild_id, words)
+    else:
+        landmines_ids = None
+
+    if landmines_ids:
+        qs = LandminesPlaced.filter(
+            id__in=landmines_ids, tripped=False, disarmed=False
+        ).order_by("placed")
         if as_list:
             return await qs
         else:
@@ -1552,12 +2275,46 @@ async def get_enabled_channels():
     return await DiscordChannel.filter(enabled=True).all()
 
 
+async def get_enabled_channels_planning():
+    """
+    Return (discord_id, guild_id, ducks_per_day, night_start_at, night_end_at) for every enabled channel,
+    which is all that's needed to plan the ducks spawns.
+    """
+    return await DiscordChannel.filter(enabled=True).values_list(
+        "discord_id", "guild_id", "ducks_per_day", "night_start_at", "night_end_at"
+    )
+
+
+async def disable_channels(discord_ids: typing.Collection[int], chunk_size=1000) -> int:
+    """
+    Disable many channels at once, with an UPDATE per chunk of IDs. Returns the number of channels updated.
+    """
+    discord_ids = list(discord_ids)
+    updated = 0
+
+    for i in range(0, len(discord_ids), chunk_size):
+        chunk = discord_ids[i : i + chunk_size]
+        updated += await DiscordChannel.filter(discord_id__in=chunk).update(
+            enabled=False
+        )
+
+        # Cached instances would still say they're enabled, and enable them back when saved.
+        for discord_id in chunk:
+            db_channel = IDENTITY_CACHE.peek((DiscordChannel, discord_id))
+            if db_channel is not None:
+                db_channel.enabled = False
+
+    return updated
+
+
 async def init_db_connection(config, create_dbs=False):
+    QUERIES.slow_query_threshold = config.get("slow_query_threshold", QUERIES.slow_query_threshold)
+
     tortoise_config = {
         "connections": {
             # Dict format for connection
             "default": {
-                "engine": "tortoise.backends.asyncpg",
+                "engine": "utils.instrumented_asyncpg",
                 "credentials": {
                     "host": config["host"],
                     "port": config["port"],
@@ -0,0 +1,352 @@
+"""
+Outbound messages queues, one per channel.
+
+The messages the bot sends on its own (ducks spawning, getting hurt, killed, leaving, level ups...) go through the
+channel queue, so that they are sent in order, one at a time, without piling up in discord.py HTTP rate limiter.
+"""
+import asyncio
+import collections
+import contextlib
+import time
+import typing
+
+import discord
+
+if typing.TYPE_CHECKING:
+    # Prevent circular imports
+    from utils.bot_class import MyBot
+
+MESSAGE_MAX_LENGTH = 2000
+
+
+class RouteBucket:
+    """
+    What we know of a Discord rate-limit bucket: at most `limit` requests every `per` seconds, and nothing at all for a
+    while after a 429. discord.py doesn't expose the rate-limit headers, so this is a conservative estimate.
+    """
+
+    __slots__ = ("limit", "per", "sent", "blocked_until", "rate_limited")
+
+    def __init__(self, limit: int = 5, per: float = 5.0):
+        self.limit = limit
+        self.per = per
+        self.sent: typing.Deque[float] = collections.deque(maxlen=limit)
+        self.blocked_until = 0.0
+        self.rate_limited = 0
+
+    def delay(self, now: float) -> float:
+        """
+        How long to wait, in seconds, before the next request on this route.
+        """
+        delay = max(0.0, self.blocked_until - now)
+        if len(self.sent) >= self.limit:
+            delay = max(delay, self.sent[0] + self.per - now)
+        return delay
+
+    def record_send(self, now: float):
+        self.sent.append(now)
+
+    def record_rate_limit(self, now: float):
+        self.rate_limited += 1
+        self.blocked_until = now + self.per
+
+    def is_idle(self, now: float) -> bool:
+        """
+        Whether forgetting the bucket wouldn't allow more requests than it does.
+        """
+        return self.blocked_until <= now and (not self.sent or self.sent[-1] + self.per <= now)
+
+
+class OutboundMessage:
+    """
+    A message waiting in a channel queue.
+
+    `deliver(queue, message)` actually sends it. Messages with the same, non-None, coalesce_key are merged with the
+    message queued right before them, if they fit in a single Discord message.
+    """
+
+    __slots__ = ("content", "kwargs", "deliver", "coalesce_key", "enqueued_at", "parts")
+
+    def __init__(
+        self,
+        content: typing.Optional[str],
+        kwargs: dict,
+        deliver: typing.Callable[["OutboundQueue", "OutboundMessage"], typing.Awaitable],
+        coalesce_key: typing.Optional[typing.Hashable] = None,
+    ):
+        self.content = content
+        self.kwargs = kwargs
+        self.deliver = deliver
+        self.coalesce_key = coalesce_key
+        self.enqueued_at = 0.0
+        self.parts = 1
+
+    def can_merge(self, other: "OutboundMessage") -> bool:
+        return (
+            self.coalesce_key is not None
+            and self.coalesce_key == other.coalesce_key
+            and not self.kwargs
+            and not other.kwargs
+            and self.content is not None
+            and other.content is not None
+            and len(self.content) + 1 + len(other.content) <= MESSAGE_MAX_LENGTH
+        )
+
+    def merge(self, other: "OutboundMessage"):
+        self.content += "\n" + other.content
+        self.parts += other.parts
+
+
+def deliver_to_channel(channel: discord.abc.Messageable):
+    async def deliver(queue: "OutboundQueue", message: OutboundMessage):
+        async with queue.route(("channel", channel.id)):
+            await channel.send(message.content, **message.kwargs)
+
+    return deliver
+
+
+class OutboundQueue:
+    """
+    The messages waiting to be sent in a channel, in order.
+
+    A worker task sends them one by one, and stops as soon as the queue is empty. When the queue is full, put() waits
+    for some room (backpressure) for at most PUT_TIMEOUT seconds, then drops the message. put_nowait() drops it right
+    away, for the code that can't wait on a channel, like the ducks spawning loop.
+    """
+
+    MAX_PENDING = 25
+    PUT_TIMEOUT = 5
+    # How long a message that can be merged waits for others before being sent, in seconds
+    COALESCE_WINDOW = 0.5
+
+    def __init__(self, bot: "MyBot", channel_id: int):
+        self.bot = bot
+        self.channel_id = channel_id
+        self.pending: typing.Deque[OutboundMessage] = collections.deque()
+        self.routes: typing.Dict[typing.Hashable, RouteBucket] = {}
+        self._worker: typing.Optional[asyncio.Task] = None
+        self._room = asyncio.Event()
+        self._room.set()
+
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.failed = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def __len__(self):
+        return len(self.pending)
+
+    async def put(self, message: OutboundMessage) -> bool:
+        """
+        Queue a message, and return whether it was accepted.
+        """
+        deadline = time.monotonic() + self.PUT_TIMEOUT
+        while len(self.pending) >= self.MAX_PENDING:
+            self._room.clear()
+            try:
+                await asyncio.wait_for(
+                    self._room.wait(), max(0.0, deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                self._drop()
+                return False
+
+        self._enqueue(message)
+        return True
+
+    def put_nowait(self, message: OutboundMessage) -> bool:
+        """
+        Queue a message if there is room, else drop it. Return whether it was accepted.
+        """
+        if len(self.pending) >= self.MAX_PENDING:
+            self._drop()
+            return False
+
+        self._enqueue(message)
+        return True
+
+    def _drop(self):
+        self.dropped += 1
+        self.bot.logger.warning(
+            "Outbound queue of channel %d is full (%d messages), dropping a message.",
+            self.channel_id,
+            len(self.pending),
+        )
+
+    def _enqueue(self, message: OutboundMessage):
+        message.enqueued_at = time.monotonic()
+        if self.pending and self.pending[-1].can_merge(message):
+            self.pending[-1].merge(message)
+            self.merged += 1
+        else:
+            self.pending.append(message)
+            self.max_depth = max(self.max_depth, len(self.pending))
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._work())
+
+    def clear(self) -> int:
+        """
+        Drop every pending message, when the channel can't be used anymore.
+        """
+        dropped = len(self.pending)
+        self.pending.clear()
+        self.dropped += dropped
+        self._room.set()
+        return dropped
+
+    async def _work(self):
+        while self.pending:
+            message = self.pending[0]
+
+            if message.coalesce_key is not None:
+                wait = message.enqueued_at + self.COALESCE_WINDOW - time.monotonic()
+                if wait > 0:
+                    # Give other messages a chance to be merged in this one.
+                    await asyncio.sleep(wait)
+                    continue
+
+            self.pending.popleft()
+            if len(self.pending) < self.MAX_PENDING:
+                self._room.set()
+
+            try:
+                await message.deliver(self, message)
+            except Exception:
+                self.failed += 1
+                self.bot.logger.exception(
+                    f"Ignoring exception while sending a queued message in channel {self.channel_id}"
+                )
+            else:
+                latency = time.monotonic() - message.enqueued_at
+                self.sent += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    @contextlib.asynccontextmanager
+    async def route(self, key: typing.Hashable):
+        """
+        Wait until the route bucket allows a request, and record the request outcome.
+        """
+        bucket = self.routes.get(key)
+        if bucket is None:
+            bucket = self.routes[key] = RouteBucket()
+
+        delay = bucket.delay(time.monotonic())
+        if delay > 0:
+            self.throttled += 1
+            await asyncio.sleep(delay)
+
+        bucket.record_send(time.monotonic())
+        try:
+            yield
+        except discord.HTTPException as e:
+            if e.status == 429:
+                bucket.record_rate_limit(time.monotonic())
+                self.rate_limited += 1
+            raise
+
+    def prune_routes(self, now: float):
+        for key, bucket in list(self.routes.items()):
+            if bucket.is_idle(now):
+                del self.routes[key]
+
+    def is_idle(self, now: float) -> bool:
+        """
+        Whether the queue has nothing to send, and nothing to remember about rate limits.
+        """
+        self.prune_routes(now)
+        return not self.pending and (self._worker is None or self._worker.done()) and not self.routes
+
+    @property
+    def average_latency(self) -> float:
+        if self.sent:
+            return self.total_latency / self.sent
+        else:
+            return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self.pending),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited,
+            "average_latency": round(self.average_latency, 3),
+            "max_latency": round(self.max_latency, 3),
+        }
+
+
+class OutboundQueues:
+    """
+    The outbound queues of the channels the bot sent messages to recently. Idle queues are dropped every
+    SWEEP_INTERVAL seconds, their counters are kept in the totals.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    COUNTERS = ("sent", "merged", "dropped", "failed", "throttled", "rate_limited")
+
+    def __init__(self, bot: "MyBot"):
+        self.bot = bot
+        self._queues: typing.Dict[int, OutboundQueue] = {}
+        # Counters of the dropped queues
+        self._dropped_queues_totals = collections.Counter()
+        self._next_sweep = time.monotonic() + self.SWEEP_INTERVAL
+
+    def get(self, channel_id: int) -> OutboundQueue:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = OutboundQueue(self.bot, channel_id)
+        return queue
+
+    def sweep(self, now: float) -> int:
+        """
+        Drop the idle queues, and return how many were dropped.
+        """
+        self._next_sweep = now + self.SWEEP_INTERVAL
+
+        idle_channel_ids = [channel_id for channel_id, queue in self._queues.items() if queue.is_idle(now)]
+        for channel_id in idle_channel_ids:
+            queue = self._queues.pop(channel_id)
+            for key in self.COUNTERS:
+                self._dropped_queues_totals[key] += getattr(queue, key)
+
+        return len(idle_channel_ids)
+
+    async def send(
+        self,
+        channel: discord.abc.Messageable,
+        content: typing.Optional[str] = None,
+        **kwargs,
+    ) -> bool:
+        """
+        Queue a message to be sent in a channel, after the messages already queued there.
+        """
+        return await self.get(channel.id).put(
+            OutboundMessage(content, kwargs, deliver=deliver_to_channel(channel))
+        )
+
+    def queues(self) -> typing.List[OutboundQueue]:
+        return list(self._queues.values())
+
+    def stats(self) -> dict:
+        totals = collections.Counter(self._dropped_queues_totals)
+        for queue in self._queues.values():
+            totals["depth"] += len(queue)
+            for key in self.COUNTERS:
+                totals[key] += getattr(queue, key)
+        totals["queues"] = len(self._queues)
+        return dict(totals)
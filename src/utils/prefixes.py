@@ -0,0 +1,104 @@
+import re
+import typing
+
+import discord
+
+from utils.models import get_guild_prefix
+
+if typing.TYPE_CHECKING:
+    # Prevent circular imports
+    from utils.bot_class import MyBot
+
+
+class CompiledPrefixes:
+    """
+    A set of prefixes, in the order discord.py tries them, compiled in a single anchored regex.
+    """
+
+    __slots__ = ("prefixes", "pattern")
+
+    def __init__(self, prefixes: typing.List[str]):
+        self.prefixes = prefixes
+        # re.match is anchored at the start of the string, and alternatives are tried in order, like discord.py does.
+        self.pattern = re.compile("|".join(re.escape(prefix) for prefix in prefixes))
+
+    def match(self, content: str) -> typing.Optional[str]:
+        match = self.pattern.match(content)
+        if match:
+            return match.group(0)
+        else:
+            return None
+
+
+class PrefixResolver:
+    """
+    Compile the prefixes the bot answers to, once per distinct guild prefix.
+
+    Guild prefixes come from models.get_guild_prefix, that only hits the database the first time a guild is seen.
+    Call clear() when the configuration is reloaded, since the global prefixes may have changed.
+    """
+
+    def __init__(self):
+        # (in DMs, guild prefix) -> compiled prefixes
+        self._compiled: typing.Dict[
+            typing.Tuple[bool, typing.Optional[str]], CompiledPrefixes
+        ] = {}
+
+        self.matched = 0
+        self.rejected = 0
+
+    def clear(self):
+        self._compiled.clear()
+
+    def _compile(
+        self, bot: "MyBot", in_dms: bool, guild_prefix: typing.Optional[str]
+    ) -> CompiledPrefixes:
+        key = (in_dms, guild_prefix)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            forced_prefixes = bot.config["bot"]["prefixes"]
+            # Same as commands.when_mentioned_or
+            prefixes = [f"<@{bot.user.id}> ", f"<@!{bot.user.id}> "]
+            if guild_prefix is not None:
+                prefixes.append(guild_prefix)
+            prefixes += [p + " " for p in forced_prefixes] + forced_prefixes
+            if in_dms:
+                # Need no prefix when in DMs
+                prefixes.append("")
+
+            compiled = self._compiled[key] = CompiledPrefixes(prefixes)
+
+        return compiled
+
+    async def resolve(self, bot: "MyBot", message: discord.Message) -> CompiledPrefixes:
+        if not message.guild:
+            return self._compile(bot, True, None)
+
+        if bot.config["database"]["enable"]:
+            guild_prefix = await get_guild_prefix(message.guild)
+        else:
+            guild_prefix = None
+
+        return self._compile(bot, False, guild_prefix)
+
+    async def matches(self, bot: "MyBot", message: discord.Message) -> bool:
+        """
+        Whether the message starts with one of the prefixes. Most messages don't, and can be ignored right away.
+        """
+        compiled = await self.resolve(bot, message)
+        if compiled.match(message.content) is None:
+            self.rejected += 1
+            return False
+        else:
+            self.matched += 1
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "compiled": len(self._compiled),
+            "matched": self.matched,
+            "rejected": self.rejected,
+        }
+
+
+PREFIXES = PrefixResolver()
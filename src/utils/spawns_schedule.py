@@ -0,0 +1,43 @@
+import random
+import typing
+
+
+class SpawnsSchedule:
+    """
+    Random spawn times for some ducks, spread uniformly over some seconds of the day, generated in order and one at a
+    time. This way, planning a channel costs the same whatever the number of ducks.
+    """
+
+    __slots__ = ("midnight", "ranges", "seconds_count", "left", "position", "next_at")
+
+    def __init__(self, midnight: int, ranges: typing.List[range], ducks_count: int):
+        self.midnight = midnight
+        self.ranges = ranges
+        self.seconds_count = sum(len(r) for r in ranges)
+        # Can't fit more than a duck per second.
+        self.left = min(ducks_count, self.seconds_count)
+        self.position = 0.0
+        self.next_at: typing.Optional[int] = None
+
+        self._advance()
+
+    def _advance(self):
+        if self.left <= 0:
+            self.next_at = None
+            return
+
+        # The smallest of n uniform random values in [x, L) is x + (L - x) * (1 - U ** (1/n))
+        self.position += (self.seconds_count - self.position) * (
+            1 - random.random() ** (1 / self.left)
+        )
+        index = min(int(self.position), self.seconds_count - 1)
+
+        for r in self.ranges:
+            if index < len(r):
+                self.next_at = self.midnight + r[index]
+                return
+            index -= len(r)
+
+    def pop(self):
+        self.left -= 1
+        self._advance()
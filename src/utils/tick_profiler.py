@@ -0,0 +1,132 @@
+"""
+Where the time of a periodic loop goes: every iteration (tick) is recorded with the time spent in each of its phases,
+in a fixed-size history.
+"""
+import collections
+import contextlib
+import time
+import typing
+
+SPARKLINE_CHARACTERS = "▁▂▃▄▅▆▇█"
+
+
+def percentile(sorted_values: typing.Sequence[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[round(percentile / 100 * (len(sorted_values) - 1))]
+
+
+def sparkline(values: typing.Sequence[float], width: int = 60) -> str:
+    """
+    The values, as a line of block characters. When there are more values than `width`, each character shows the
+    maximum of a group of consecutive values, so that spikes stay visible.
+    """
+    if not values:
+        return ""
+
+    group_size = max(1, -(-len(values) // width))
+    maximums = [max(values[i : i + group_size]) for i in range(0, len(values), group_size)]
+
+    highest = max(maximums)
+    if highest <= 0:
+        return SPARKLINE_CHARACTERS[0] * len(maximums)
+
+    last = len(SPARKLINE_CHARACTERS) - 1
+    return "".join(SPARKLINE_CHARACTERS[round(value / highest * last)] for value in maximums)
+
+
+class Tick:
+    __slots__ = ("iteration", "lag", "started_at", "duration", "phases")
+
+    def __init__(self, iteration: int, lag: float, phases: typing.Iterable[str]):
+        self.iteration = iteration
+        self.lag = lag
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+        self.phases: typing.Dict[str, float] = dict.fromkeys(phases, 0.0)
+
+    def serialize(self) -> dict:
+        return {
+            "iteration": self.iteration,
+            "lag": self.lag,
+            "duration": self.duration,
+            "phases": self.phases,
+        }
+
+
+class TickProfiler:
+    """
+    Call start() at the beginning of each iteration, add the time spent in the phases with add() or phase(), and
+    end() at the end. The last `size` ticks are kept.
+    """
+
+    def __init__(self, phases: typing.Sequence[str], size: int = 3600):
+        self.phases = tuple(phases)
+        self.history: typing.Deque[Tick] = collections.deque(maxlen=size)
+        self.current: typing.Optional[Tick] = None
+
+        self.ticks = 0
+        # Iterations that were given up on, to catch up with a loop running too late.
+        self.skipped_iterations = 0
+
+    def start(self, iteration: int, lag: float) -> Tick:
+        self.current = Tick(iteration, lag, self.phases)
+        return self.current
+
+    def add(self, phase: str, duration: float):
+        if self.current is not None:
+            self.current.phases[phase] += duration
+
+    @contextlib.contextmanager
+    def phase(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def skip(self, iterations: int):
+        self.skipped_iterations += iterations
+
+    def end(self) -> typing.Optional[Tick]:
+        tick = self.current
+        if tick is None:
+            return None
+
+        tick.duration = time.perf_counter() - tick.started_at
+        self.history.append(tick)
+        self.current = None
+        self.ticks += 1
+        return tick
+
+    def last(self, count: typing.Optional[int] = None) -> typing.List[Tick]:
+        ticks = list(self.history)
+        if count is not None:
+            ticks = ticks[-count:]
+        return ticks
+
+    def summary(self, count: typing.Optional[int] = None) -> dict:
+        """
+        Percentiles of the ticks duration, lag and phases, over the last `count` ticks (or the whole history).
+        """
+        ticks = self.last(count)
+
+        def percentiles(values: typing.List[float]) -> dict:
+            values.sort()
+            return {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1] if values else 0.0,
+            }
+
+        return {
+            "ticks": len(ticks),
+            "total_ticks": self.ticks,
+            "skipped_iterations": self.skipped_iterations,
+            "duration": percentiles([tick.duration for tick in ticks]),
+            "lag": percentiles([tick.lag for tick in ticks]),
+            "phases": {
+                phase: percentiles([tick.phases[phase] for tick in ticks]) for phase in self.phases
+            },
+        }
@@ -1,8 +1,13 @@
+import copy
 import gettext
-from typing import Optional
+import os
+import time
+from typing import Dict, Optional
 
 import polib
 
+LOCALES_DIRECTORY = "locales/"
+
 # Oldest first
 TRANSLATORS = {
     "ar": {
@@ -74,18 +79,113 @@ TRANSLATORS = {
 }
 
 
+def normalize_language_code(language_code: str) -> str:
+    if language_code == "zh-Hans":
+        return "zh"  # Babel don't know about Simplified Chinese
+    else:
+        return language_code.replace("-", "_")
+
+
+class CatalogsRegistry:
+    """
+    The compiled (.mo) catalogs found in the locales directory, loaded once so that translating a message is only a
+    couple of dict lookups, instead of gettext.translation() looking for the files on every call.
+    """
+
+    def __init__(self, localedir: str = LOCALES_DIRECTORY):
+        self.localedir = localedir
+        # .mo file path -> catalog
+        self.catalogs: Dict[str, gettext.GNUTranslations] = {}
+        # Language code, as asked -> catalog, or the fallback
+        self.languages: Dict[str, gettext.NullTranslations] = {}
+        self.fallback = gettext.NullTranslations()
+
+        self.loaded = False
+        self.load_duration: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+
+    def load(self) -> Dict[str, gettext.GNUTranslations]:
+        """
+        (Re)load every catalog. The new catalogs replace the old ones at once, and only if they were all read
+        successfully, so a broken file pushed by mistake doesn't break the translations that are already loaded.
+        """
+        start = time.perf_counter()
+
+        catalogs = {}
+        for language_directory in sorted(os.listdir(self.localedir)):
+            mo_file = os.path.join(
+                self.localedir, language_directory, "LC_MESSAGES", "messages.mo"
+            )
+            if os.path.isfile(mo_file):
+                with open(mo_file, "rb") as f:
+                    catalogs[os.path.abspath(mo_file)] = gettext.GNUTranslations(f)
+
+        self.catalogs, self.languages = catalogs, {}
+        self.loaded = True
+        self.load_duration = time.perf_counter() - start
+        self.loaded_at = time.time()
+
+        return catalogs
+
+    def _resolve(self, language_code: str) -> gettext.NullTranslations:
+        # Same lookup as gettext.translation(), done once per language code: the most specific catalog (pt_BR),
+        # falling back on the more generic ones (pt) for the messages it doesn't translate.
+        mo_files = gettext.find(
+            "messages",
+            localedir=self.localedir,
+            languages=[normalize_language_code(language_code)],
+            all=True,
+        )
+
+        translation = None
+        for mo_file in mo_files:
+            catalog = self.catalogs.get(os.path.abspath(mo_file))
+            if catalog is None:
+                continue
+            # Copied, like gettext.translation() does, since add_fallback() changes the catalog.
+            catalog = copy.copy(catalog)
+            if translation is None:
+                translation = catalog
+            else:
+                translation.add_fallback(catalog)
+
+        return translation or self.fallback
+
+    def get(self, language_code: str) -> gettext.NullTranslations:
+        try:
+            return self.languages[language_code]
+        except KeyError:
+            pass
+
+        if not self.loaded:
+            self.load()
+
+        translation = self.languages[language_code] = self._resolve(language_code)
+        return translation
+
+    def measure_lookup(self, language_code: str = "fr", iterations: int = 10000) -> float:
+        """
+        Return the average time, in seconds, to translate a message.
+        """
+        start = time.perf_counter()
+        for _ in range(iterations):
+            translate("Hello", language_code)
+        return (time.perf_counter() - start) / iterations
+
+
+CATALOGS = CatalogsRegistry()
+
+
 def get_translation(language_code):
-    return gettext.translation(
-        "messages", localedir="locales/", languages=[language_code], fallback=True
-    )
+    return CATALOGS.get(language_code)
 
 
 def translate(message, language_code):
-    return get_translation(language_code).gettext(message)
+    return CATALOGS.get(language_code).gettext(message)
 
 
 def ntranslate(singular, plural, n, language_code):
-    return get_translation(language_code).ngettext(singular, plural, n)
+    return CATALOGS.get(language_code).ngettext(singular, plural, n)
 
 
 def get_translate_function(bot_or_ctx, language_code, additional_kwargs=None):
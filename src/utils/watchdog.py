@@ -0,0 +1,166 @@
+"""
+Find what blocks the event loop.
+
+A thread pings the event loop at a fixed interval. When the loop takes longer than a threshold to answer, something
+is running on it without yielding (file I/O, parsing, image processing...): the thread captures the stack of the
+loop thread, and the stall is counted by code location once the loop answers again.
+"""
+import asyncio
+import pathlib
+import sys
+import threading
+import time
+import traceback
+import typing
+
+from utils.metrics import METRICS
+
+EVENT_LOOP_STALLS = METRICS.counter(
+    "duckhunt_event_loop_stalls_total",
+    "Times the event loop didn't answer the watchdog before the stall threshold.",
+)
+EVENT_LOOP_STALL_DURATION = METRICS.histogram(
+    "duckhunt_event_loop_stall_duration_seconds",
+    "How long the event loop was blocked, for the stalls detected by the watchdog.",
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent.resolve()
+
+
+def format_frame(frame: traceback.FrameSummary) -> str:
+    try:
+        filename = pathlib.Path(frame.filename).resolve().relative_to(SRC_DIRECTORY)
+    except ValueError:
+        filename = pathlib.Path(frame.filename).name
+    return f"{filename}:{frame.lineno} in {frame.name}"
+
+
+def is_bot_code(frame: traceback.FrameSummary) -> bool:
+    path = pathlib.Path(frame.filename).resolve()
+    return SRC_DIRECTORY in path.parents and "site-packages" not in path.parts
+
+
+def stack_location(stack: traceback.StackSummary) -> str:
+    """
+    Where the loop was stuck: the innermost frame of the bot code, and the innermost frame if it is in a library.
+    """
+    innermost = stack[-1]
+    for frame in reversed(stack):
+        if is_bot_code(frame):
+            if frame is innermost:
+                return format_frame(frame)
+            return f"{format_frame(frame)} → {format_frame(innermost)}"
+    return format_frame(innermost)
+
+
+class StallLocation:
+    __slots__ = ("location", "count", "total_duration", "max_duration", "last_seen", "stack")
+
+    def __init__(self, location: str):
+        self.location = location
+        self.count = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_seen = 0.0
+        self.stack: typing.List[str] = []
+
+    def add(self, duration: float, stack: typing.List[str]):
+        self.count += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        self.last_seen = time.time()
+        self.stack = stack
+
+
+class LoopWatchdog:
+    """
+    start() must be called from the event loop thread.
+    """
+
+    # Locations beyond this are counted together.
+    MAX_LOCATIONS = 500
+    # Frames kept from the captured stacks
+    STACK_DEPTH = 15
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = 1.0, threshold: float = 0.5):
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+
+        self.locations: typing.Dict[str, StallLocation] = {}
+        self.stalls = 0
+        self.total_duration = 0.0
+
+        self._loop_thread_id: typing.Optional[int] = None
+        self._thread: typing.Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="event-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            answered = threading.Event()
+            # The stack, if the loop is stalled. Filled by this thread, read by the loop.
+            captured: typing.List[traceback.StackSummary] = []
+            try:
+                self.loop.call_soon_threadsafe(self._answer, answered, captured, time.perf_counter())
+            except RuntimeError:
+                # Loop closed
+                return
+
+            if not answered.wait(self.threshold):
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    captured.append(traceback.extract_stack(frame))
+                    del frame
+
+                while not answered.wait(self.interval):
+                    if self._stopping.is_set() or self.loop.is_closed():
+                        return
+
+            self._stopping.wait(self.interval)
+
+    def _answer(self, answered: threading.Event, captured: typing.List[traceback.StackSummary], sent_at: float):
+        # Runs on the event loop.
+        duration = time.perf_counter() - sent_at
+        answered.set()
+
+        if duration >= self.threshold:
+            if captured:
+                self.record(duration, captured[0])
+            else:
+                # The loop answered while the stack was being captured.
+                self.record(duration, None)
+
+    def record(self, duration: float, stack: typing.Optional[traceback.StackSummary]):
+        if stack:
+            location = stack_location(stack)
+            formatted_stack = [format_frame(frame) for frame in stack[-self.STACK_DEPTH :]]
+        else:
+            location = "(unknown)"
+            formatted_stack = []
+
+        stall_location = self.locations.get(location)
+        if stall_location is None:
+            if len(self.locations) >= self.MAX_LOCATIONS:
+                location = "(other locations)"
+                stall_location = self.locations.get(location)
+            if stall_location is None:
+                stall_location = self.locations[location] = StallLocation(location)
+        stall_location.add(duration, formatted_stack)
+
+        self.stalls += 1
+        self.total_duration += duration
+        EVENT_LOOP_STALLS.inc()
+        EVENT_LOOP_STALL_DURATION.observe(duration)
+
+    def top_locations(self, count: int = 10) -> typing.List[StallLocation]:
+        return sorted(self.locations.values(), key=lambda location: location.total_duration, reverse=True)[:count]